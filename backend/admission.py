@@ -0,0 +1,260 @@
+"""Admission control: per-route concurrency limits and load shedding.
+
+Every routed request belongs to a class, chosen by endpoint from
+``ADMISSION_ROUTES``. Each class has a concurrency ``limit``. All
+classes share ``ADMISSION_MAX_CONCURRENCY``, which defaults to the
+database pool's size plus overflow, because each request in flight
+holds a connection. A request with no free slot waits in its class's
+queue.
+
+Queued requests are shed with a ``503`` and ``Retry-After`` when:
+
+* the queue already holds ``queue`` requests (queue depth);
+* no slot frees up within ``max_wait`` seconds (latency). A request
+  that would wait longer than that has usually been abandoned by its
+  client anyway.
+
+When a slot frees up, it goes to the first waiter of the
+highest-priority class that may run. Classes are listed in priority
+order. Auth and cheap reads therefore keep flowing while searches and
+uploads queue behind their own, smaller limits.
+
+The check is a ``before_request`` hook that runs right after rate
+limiting. It runs before the body is read, the JWT is verified or a
+database session is opened, so a shed request costs a lock and a tiny
+response. Limits are per worker process.
+
+A request that has to wait on something that needs no database, such as
+an ``Idempotency-Key`` duplicate waiting for the first request, hands
+its slot back with :meth:`AdmissionControl.suspend` and queues for one
+again with :meth:`AdmissionControl.resume`. Otherwise a burst of client
+retries could hold every slot of its class while doing nothing. With sync workers a process
+handles one request at a time and never queues; the limits matter for
+threaded and gevent workers.
+
+Environment:
+
+``ADMISSION_ENABLED``          turn admission control on (true).
+``ADMISSION_MAX_CONCURRENCY``  requests in flight per worker (pool size + overflow).
+``ADMISSION_CLASSES``          JSON, ``{"bulk": {"limit": 2, "max_wait": 0.5}}``,
+                               merged over :data:`DEFAULT_CLASSES`.
+``ADMISSION_ROUTES``           JSON, ``{"endpoint": "class"}``, merged over
+                               :data:`DEFAULT_ROUTES`.
+``ADMISSION_DEFAULT_CLASS``    class for endpoints not listed (read).
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from flask import current_app, jsonify, request
+
+# In priority order, highest first.
+DEFAULT_CLASSES = {
+    'critical': {'limit': 15, 'queue': 100, 'max_wait': 5.0, 'retry_after': 1},
+    'read': {'limit': 12, 'queue': 50, 'max_wait': 2.0, 'retry_after': 1},
+    'search': {'limit': 6, 'queue': 12, 'max_wait': 1.0, 'retry_after': 2},
+    'bulk': {'limit': 3, 'queue': 6, 'max_wait': 1.0, 'retry_after': 5},
+}
+
+DEFAULT_ROUTES = {
+    'home': 'critical',
+    'ping': 'critical',
+    'metrics': 'critical',
+    'auth.register': 'critical',
+    'auth.login': 'critical',
+    'auth.refresh': 'critical',
+    'auth.logout': 'critical',
+    'auth.me': 'critical',
+    'reports.get_reports': 'search',
+    'reports.search_archived_reports': 'search',
+    'reports.create_report': 'bulk',
+    'reports.update_report': 'bulk',
+    'reports.sync_reports': 'bulk',
+    'admin.import_users_endpoint': 'bulk',
+    'admin.import_reports_endpoint': 'bulk',
+}
+
+_ENVIRON_KEY = 'jiseti.admission'
+_SUSPENDED_KEY = 'jiseti.admission.suspended'
+
+
+class RouteClass:
+    def __init__(self, name, priority, limit, queue, max_wait, retry_after):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.queue = queue
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiters = deque()
+        self.admitted = 0
+        self.shed = 0
+
+    def stats(self):
+        return {
+            'limit': self.limit, 'active': self.active, 'queued': len(self.waiters),
+            'admitted': self.admitted, 'shed': self.shed,
+        }
+
+
+class AdmissionController:
+    def __init__(self, classes, max_concurrency):
+        self.classes = {
+            name: RouteClass(name, priority, settings['limit'], settings['queue'],
+                             settings['max_wait'], settings['retry_after'])
+            for priority, (name, settings) in enumerate(classes.items())
+        }
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self._by_priority = sorted(self.classes.values(), key=lambda route_class: route_class.priority)
+        self._lock = threading.Lock()
+
+    def _can_run(self, route_class):
+        return route_class.active < route_class.limit and self.active < self.max_concurrency
+
+    def _admit(self, route_class):
+        route_class.active += 1
+        route_class.admitted += 1
+        self.active += 1
+
+    def acquire(self, name):
+        """Take a slot for class ``name``; returns ``False`` if the request is shed."""
+        route_class = self.classes[name]
+        with self._lock:
+            if not route_class.waiters and self._can_run(route_class):
+                self._admit(route_class)
+                return True
+            if len(route_class.waiters) >= route_class.queue:
+                route_class.shed += 1
+                return False
+            waiter = threading.Event()
+            route_class.waiters.append(waiter)
+
+        if waiter.wait(route_class.max_wait):
+            return True
+        with self._lock:
+            # Admitted between the timeout and taking the lock.
+            if waiter.is_set():
+                return True
+            route_class.waiters.remove(waiter)
+            route_class.shed += 1
+            return False
+
+    def release(self, name):
+        route_class = self.classes[name]
+        with self._lock:
+            route_class.active -= 1
+            self.active -= 1
+            # Hand freed slots out by priority. A class at its own limit
+            # does not hold back the classes below it.
+            for candidate in self._by_priority:
+                if self.active >= self.max_concurrency:
+                    break
+                while candidate.waiters and self._can_run(candidate):
+                    self._admit(candidate)
+                    candidate.waiters.popleft().set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'active': self.active,
+                'classes': {name: route_class.stats() for name, route_class in self.classes.items()},
+            }
+
+
+def _json_env(name):
+    value = os.getenv(name)
+    return json.loads(value) if value else {}
+
+
+def _default_max_concurrency():
+    return int(os.getenv('DB_POOL_SIZE', 5)) + max(int(os.getenv('DB_MAX_OVERFLOW', 10)), 0)
+
+
+class AdmissionControl:
+    def __init__(self, app=None):
+        self.controller = None
+        self.routes = {}
+        self.default_class = 'read'
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ADMISSION_ENABLED', os.getenv('ADMISSION_ENABLED', 'true').lower() != 'false')
+        app.config.setdefault(
+            'ADMISSION_MAX_CONCURRENCY', int(os.getenv('ADMISSION_MAX_CONCURRENCY') or _default_max_concurrency())
+        )
+        app.config.setdefault('ADMISSION_CLASSES', _json_env('ADMISSION_CLASSES'))
+        app.config.setdefault('ADMISSION_ROUTES', _json_env('ADMISSION_ROUTES'))
+        app.config.setdefault('ADMISSION_DEFAULT_CLASS', os.getenv('ADMISSION_DEFAULT_CLASS', 'read'))
+        app.extensions['admission'] = self
+        self.configure(app.config)
+        # Run ahead of every other before_request hook; create this
+        # before the RateLimiter so that rate limiting runs first.
+        app.before_request_funcs.setdefault(None, []).insert(0, self.admit)
+        app.teardown_request(self.release)
+
+    def configure(self, config):
+        """(Re)build the limits from ``config``; drops queued and active state."""
+        classes = {name: dict(settings) for name, settings in DEFAULT_CLASSES.items()}
+        for name, settings in config['ADMISSION_CLASSES'].items():
+            classes.setdefault(name, dict(DEFAULT_CLASSES['read'])).update(settings)
+        self.routes = {**DEFAULT_ROUTES, **config['ADMISSION_ROUTES']}
+        self.default_class = config['ADMISSION_DEFAULT_CLASS']
+        unknown = {self.default_class, *self.routes.values()} - classes.keys()
+        if unknown:
+            raise ValueError(f"Unknown admission classes: {', '.join(sorted(unknown))}")
+        self.controller = AdmissionController(classes, config['ADMISSION_MAX_CONCURRENCY'])
+
+    def admit(self):
+        endpoint = request.endpoint
+        if endpoint is None or request.method == 'OPTIONS' or not current_app.config['ADMISSION_ENABLED']:
+            return None
+        return self._enter(self.controller, self.routes.get(endpoint, self.default_class))
+
+    def _enter(self, controller, name):
+        started = time.perf_counter()
+        admitted = controller.acquire(name)
+        metrics = current_app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.registry.inc('jiseti_admission_requests_total', (name, 'admitted' if admitted else 'shed'))
+            metrics.registry.observe('jiseti_admission_wait_seconds', (name,), time.perf_counter() - started)
+        if not admitted:
+            response = jsonify({"error": "Server is busy, please retry"})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(controller.classes[name].retry_after)
+            return response
+        request.environ[_ENVIRON_KEY] = (controller, name)
+        return None
+
+    def suspend(self):
+        """Give this request's slot back while it waits without using the database."""
+        admitted = request.environ.pop(_ENVIRON_KEY, None)
+        if admitted is not None:
+            controller, name = admitted
+            controller.release(name)
+            request.environ[_SUSPENDED_KEY] = admitted
+
+    def resume(self):
+        """Take a slot again after :meth:`suspend`; returns a 503 response if shed."""
+        suspended = request.environ.pop(_SUSPENDED_KEY, None)
+        if suspended is None:
+            return None
+        return self._enter(*suspended)
+
+    def release(self, exc=None):
+        admitted = request.environ.pop(_ENVIRON_KEY, None)
+        if admitted is not None:
+            controller, name = admitted
+            controller.release(name)
+
+    def stats(self):
+        return self.controller.stats()
+
+
+def get_admission():
+    return current_app.extensions['admission']
@@ -1,24 +1,105 @@
-from flask import Flask, jsonify, request, Blueprint, current_app, send_from_directory
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask import Flask, jsonify, request, Blueprint, current_app, g, send_from_directory
+from flask_jwt_extended import (
+    JWTManager,
+    create_access_token,
+    create_refresh_token,
+    decode_token,
+    get_jwt,
+    get_jwt_identity,
+    jwt_required,
+)
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 from typing import Optional
 from datetime import datetime, timezone, timedelta
+from functools import wraps
+import click
+import csv
 import json
 try:
-    from .models import db, User, Report, ReportMedia
+    from .models import db, User, Report, ReportMedia, WebhookEndpoint
+    from .revocation import RevocationFilter, get_revocation_filter
+    from .provisioning import detect_format, import_users
+    from .report_import import REPORT_STATUSES, import_reports
+    from .ratelimit import RateLimiter
+    from .database import configure_engine, engine_options, normalize_url, pool_stats
+    from .replicas import ReplicaRouter, replica_read
+    from .logging_setup import configure_logging, logging_stats
+    from .metrics import Metrics, get_metrics
+    from .querylog import QueryInspector
+    from .similarity import find_duplicates, index_report, rebuild_index, remove_report
+    from .typeahead import FIELDS as TYPEAHEAD_FIELDS, TypeaheadIndex, get_typeahead
+    from .facets import FacetCache, facet_counts, get_facet_cache, parse_facets
+    from .compression import Compression, cached_response, get_response_cache
+    from .report_sync import ReportSync
+    from .idempotency import idempotent, purge_expired_keys
+    from .archive import (
+        PARTITION as ARCHIVE_PARTITION, archive_closed_reports, cold_storage, get_archived_report, search_archive,
+    )
+    from .report_cache import ReportCache, get_report_cache
+    from .webhooks import WebhookDispatcher, enqueue as enqueue_event
+    from .admission import AdmissionControl, get_admission
+    from .cors import Preflight
+    from .profiling import Profiler, flamegraph_svg, get_profiler, list_profiles, load_profile, unfold
+    from .usage import (
+        StorageQuotaExceeded, add_media, enforce_storage_quota, get_usage, reconcile as reconcile_usage,
+        record_reports, remove_media, upload_size,
+    )
 except ImportError:  # pragma: no cover - fallback for script execution
-    from models import db, User, Report, ReportMedia
+    from models import db, User, Report, ReportMedia, WebhookEndpoint
+    from revocation import RevocationFilter, get_revocation_filter
+    from provisioning import detect_format, import_users
+    from report_import import REPORT_STATUSES, import_reports
+    from ratelimit import RateLimiter
+    from database import configure_engine, engine_options, normalize_url, pool_stats
+    from replicas import ReplicaRouter, replica_read
+    from logging_setup import configure_logging, logging_stats
+    from metrics import Metrics, get_metrics
+    from querylog import QueryInspector
+    from similarity import find_duplicates, index_report, rebuild_index, remove_report
+    from typeahead import FIELDS as TYPEAHEAD_FIELDS, TypeaheadIndex, get_typeahead
+    from facets import FacetCache, facet_counts, get_facet_cache, parse_facets
+    from compression import Compression, cached_response, get_response_cache
+    from report_sync import ReportSync
+    from idempotency import idempotent, purge_expired_keys
+    from archive import (
+        PARTITION as ARCHIVE_PARTITION, archive_closed_reports, cold_storage, get_archived_report, search_archive,
+    )
+    from report_cache import ReportCache, get_report_cache
+    from webhooks import WebhookDispatcher, enqueue as enqueue_event
+    from admission import AdmissionControl, get_admission
+    from cors import Preflight
+    from profiling import Profiler, flamegraph_svg, get_profiler, list_profiles, load_profile, unfold
+    from usage import (
+        StorageQuotaExceeded, add_media, enforce_storage_quota, get_usage, reconcile as reconcile_usage,
+        record_reports, remove_media, upload_size,
+    )
 from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
 import os
 import logging
 import traceback
+import secrets
 from uuid import uuid4
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 jwt = JWTManager()
+
+
+def admin_required(fn):
+    """Reject the request unless the JWT identity is an admin.
+
+    Must be applied below ``@jwt_required()``.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        user = db.session.get(User, int(get_jwt_identity()))
+        if not user or user.role != "admin":
+            return jsonify({"error": "admin required"}), 403
+        return fn(*args, **kwargs)
+    return wrapper
 
 def create_app(instance_path: Optional[str] = None):
     resolved_instance_path = instance_path or os.getenv("FLASK_INSTANCE_PATH")
@@ -28,21 +109,57 @@ def create_app(instance_path: Optional[str] = None):
 
     app = Flask(__name__, **app_kwargs)
 
-    database_url = os.getenv("DATABASE_URL", "sqlite:///app.db")
-    
+    # Behind Render's proxy, trust X-Forwarded-For so rate limits see the
+    # real client address rather than the load balancer.
+    proxy_hops = int(os.getenv("PROXY_FIX_X_FOR", 0))
+    if proxy_hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+
     # If using PostgreSQL, force psycopg3
-    if database_url.startswith('postgresql://'):
-        database_url = database_url.replace('postgresql://', 'postgresql+psycopg://', 1)
-    
+    database_url = normalize_url(os.getenv("DATABASE_URL", "sqlite:///app.db"))
+
     app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_url)
+    app.config["SQLALCHEMY_REPLICA_URIS"] = [
+        normalize_url(url.strip()) for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+    ]
+    app.config["DB_READ_YOUR_WRITES_SECONDS"] = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", 5))
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "super-secret")
+    app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(seconds=int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES", 15 * 60)))
+    app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(seconds=int(os.getenv("JWT_REFRESH_TOKEN_EXPIRES", 30 * 24 * 3600)))
+    app.config["JWT_REVOCATION_SYNC_INTERVAL"] = float(os.getenv("JWT_REVOCATION_SYNC_INTERVAL", 5))
+    app.config["TYPEAHEAD_SYNC_INTERVAL"] = float(os.getenv("TYPEAHEAD_SYNC_INTERVAL", 5))
+    app.config["TYPEAHEAD_REBUILD_INTERVAL"] = float(os.getenv("TYPEAHEAD_REBUILD_INTERVAL", 900))
+    app.config["FACET_CACHE_TTL"] = float(os.getenv("FACET_CACHE_TTL", 30))
+    app.config["REPORT_CACHE_SIZE"] = int(os.getenv("REPORT_CACHE_SIZE", 10000))
+    app.config["REPORT_CACHE_VERIFY"] = os.getenv("REPORT_CACHE_VERIFY", "true").lower() in ("1", "true", "yes")
+    app.config["ARCHIVE_DIR"] = os.getenv("ARCHIVE_DIR") or os.path.join(app.instance_path, "archive")
+    app.config["ARCHIVE_COLD_MEDIA_DIR"] = (
+        os.getenv("ARCHIVE_COLD_MEDIA_DIR") or os.path.join(app.instance_path, "cold-media")
+    )
+    app.config["IDEMPOTENCY_WAIT_SECONDS"] = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 30))
+    app.config["IDEMPOTENCY_LOCK_TIMEOUT"] = float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 60))
+    app.config["IDEMPOTENCY_KEY_TTL"] = float(os.getenv("IDEMPOTENCY_KEY_TTL", 24))
+    app.config["ARCHIVE_AFTER_DAYS"] = float(os.getenv("ARCHIVE_AFTER_DAYS", 180))
     app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_UPLOAD_SIZE", 16 * 1024 * 1024))
+    app.config["USER_STORAGE_QUOTA"] = int(os.getenv("USER_STORAGE_QUOTA", 1024 * 1024 * 1024))
+    app.config["BULK_IMPORT_WORKERS"] = int(os.getenv("BULK_IMPORT_WORKERS", os.cpu_count() or 1))
+    app.config["BULK_IMPORT_BATCH_SIZE"] = int(os.getenv("BULK_IMPORT_BATCH_SIZE", 1000))
+    app.config["BATCH_SYNC_CHUNK_SIZE"] = int(os.getenv("BATCH_SYNC_CHUNK_SIZE", 50))
+    app.config["BATCH_SYNC_MAX_ITEMS"] = int(os.getenv("BATCH_SYNC_MAX_ITEMS", 200))
+    app.config["BATCH_SYNC_MAX_SIZE"] = int(os.getenv("BATCH_SYNC_MAX_SIZE", 512 * 1024 * 1024))
+    app.config["WEBHOOK_BATCH_SIZE"] = int(os.getenv("WEBHOOK_BATCH_SIZE", 50))
+    app.config["WEBHOOK_TIMEOUT"] = float(os.getenv("WEBHOOK_TIMEOUT", 5))
+    app.config["WEBHOOK_MAX_ATTEMPTS"] = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 10))
+    app.config["WEBHOOK_BACKOFF_BASE"] = float(os.getenv("WEBHOOK_BACKOFF_BASE", 2))
+    app.config["WEBHOOK_BACKOFF_MAX"] = float(os.getenv("WEBHOOK_BACKOFF_MAX", 3600))
+    app.config["WEBHOOK_WORKERS"] = int(os.getenv("WEBHOOK_WORKERS", 8))
+    app.config["WEBHOOK_POLL_INTERVAL"] = float(os.getenv("WEBHOOK_POLL_INTERVAL", 1))
 
-    os.makedirs(app.instance_path, exist_ok=True)
-
+    # Directories are created on first upload and by `init-db`, not here:
+    # building the app must not touch the filesystem or the database.
     upload_folder = os.path.join(app.instance_path, "uploads")
-    os.makedirs(upload_folder, exist_ok=True)
     app.config["UPLOAD_FOLDER"] = upload_folder
     app.config["ALLOWED_EXTENSIONS"] = {
         "png", "jpg", "jpeg", "gif", "webp",
@@ -51,17 +168,24 @@ def create_app(instance_path: Optional[str] = None):
         "pdf", "doc", "docx", "xls", "xlsx", "csv"
     }
 
-    # ✅ CORS applied globally for all API routes
+    app.config["CORS_ORIGINS"] = [
+        origin.strip()
+        for origin in os.getenv(
+            "CORS_ORIGINS",
+            "https://jiseti-frontend-w02k.onrender.com,http://127.0.0.1:3000,http://localhost:3000",
+        ).split(",")
+        if origin.strip()
+    ]
+    app.config["CORS_METHODS"] = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
+
+    # ✅ CORS applied globally for all API routes; preflights are answered
+    # by the Preflight middleware below before they reach Flask.
     CORS(
     app,
     resources={
         r"/api/*": {
-            "origins": [
-                "https://jiseti-frontend-w02k.onrender.com", 
-                "http://127.0.0.1:3000", 
-                "http://localhost:3000"
-            ],
-            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "origins": app.config["CORS_ORIGINS"],
+            "methods": app.config["CORS_METHODS"],
             "supports_credentials": True
         }
     }
@@ -70,6 +194,72 @@ def create_app(instance_path: Optional[str] = None):
     # Init extensions
     db.init_app(app)
     jwt.init_app(app)
+    app.extensions["revocation_filter"] = RevocationFilter(app.config["JWT_REVOCATION_SYNC_INTERVAL"])
+    app.extensions["typeahead"] = TypeaheadIndex(
+        app.config["TYPEAHEAD_SYNC_INTERVAL"], app.config["TYPEAHEAD_REBUILD_INTERVAL"]
+    )
+    app.extensions["facet_cache"] = FacetCache(app.config["FACET_CACHE_TTL"])
+    app.extensions["report_cache"] = ReportCache(app.config["REPORT_CACHE_SIZE"], app.config["REPORT_CACHE_VERIFY"])
+    # Before the RateLimiter, whose hook then runs first.
+    AdmissionControl(app)
+    RateLimiter(app)
+    ReplicaRouter(app)
+    metrics = Metrics(app)
+    query_inspector = QueryInspector(app)
+    profiler = Profiler(app)
+    Compression(app)
+    # Outermost, so preflights skip everything above.
+    Preflight(app)
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get("X-Request-ID") or uuid4().hex
+
+    @app.after_request
+    def echo_request_id(response):
+        request_id = g.get("request_id")
+        if request_id:
+            response.headers["X-Request-ID"] = request_id
+        return response
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return get_revocation_filter().is_revoked(jwt_payload["jti"])
+
+    def issue_tokens(user_id) -> dict:
+        identity = str(user_id)
+        return {
+            "access_token": create_access_token(identity=identity),
+            "refresh_token": create_refresh_token(identity=identity),
+        }
+
+    def refresh_after_write(update_typeahead):
+        """Bring derived state up to date after a report write has committed.
+
+        The write is durable by now, so a failure here is logged rather than
+        returned as a 5xx the client would retry. The typeahead index catches
+        up on its next sync.
+        """
+        try:
+            update_typeahead()
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception("Typeahead update failed after a committed report write")
+        get_facet_cache().clear()
+        get_response_cache().clear()
+
+    def duplicates_of(report):
+        """Near-duplicates of ``report``; an empty list if the lookup fails.
+
+        The duplicates are advisory, so a broken similarity index must not
+        turn the request it decorates into a 5xx.
+        """
+        try:
+            return find_duplicates(report.title, report.description, report.location, exclude_id=report.id)
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception(f"Duplicate lookup failed for report {report.id}")
+            return []
 
     def allowed_file(filename: str) -> bool:
         allowed_extensions = app.config.get("ALLOWED_EXTENSIONS", set())
@@ -78,45 +268,100 @@ def create_app(instance_path: Optional[str] = None):
     # CREATE AUTH BLUEPRINT
     auth_bp = Blueprint("auth", __name__)
 
-    # Create tables
     with app.app_context():
-        try:
-            db.create_all()
-            logger.info("✅ Database tables created successfully")
-        except Exception as e:
-            logger.error(f"❌ Database creation error: {str(e)}")
-            logger.error(traceback.format_exc())
-    
-    # OPTIONS handlers for CORS preflight
-    @auth_bp.route("/register", methods=["OPTIONS"])
-    @auth_bp.route("/login", methods=["OPTIONS"])
-    def handle_options():
-        return jsonify({"status": "preflight ok"}), 200
-    
+        configure_engine(db.engine)
+        metrics.instrument_engine(db.engine)
+        query_inspector.instrument_engine(db.engine)
+        profiler.instrument_engine(db.engine)
+    for replica_engine in app.extensions["replica_router"].engines:
+        metrics.instrument_engine(replica_engine)
+        query_inspector.instrument_engine(replica_engine)
+        profiler.instrument_engine(replica_engine)
+
+    # Schema creation is an explicit deploy step:
+    #   flask --app wsgi init-db
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create missing tables and the uploads directory."""
+        init_db(app)
+
+    @app.cli.command("index-duplicates")
+    def index_duplicates_command():
+        """Rebuild the near-duplicate index for every report."""
+        def progress(indexed):
+            print(f"\r  indexed {indexed}", end="", flush=True)
+
+        total = rebuild_index(progress=progress)
+        print(f"\n✅ Indexed {total} reports")
+
+    @app.cli.command("purge-idempotency-keys")
+    def purge_idempotency_keys_command():
+        """Delete Idempotency-Key records older than IDEMPOTENCY_KEY_TTL hours."""
+        print(f"✅ Purged {purge_expired_keys()} idempotency keys")
+
+    @app.cli.command("reconcile-usage")
+    def reconcile_usage_command():
+        """Recompute per-user report and storage counters that drifted."""
+        result = reconcile_usage()
+        print(f"✅ Checked {result['users']} users: {result['created']} built, {result['drifted']} corrected")
+
+    @app.cli.command("dispatch-webhooks")
+    @click.option("--once", is_flag=True, help="Run a single dispatch round and exit.")
+    def dispatch_webhooks_command(once):
+        """Deliver outbox events to registered webhooks."""
+        dispatcher = WebhookDispatcher.from_config(app.config)
+        if once:
+            result = dispatcher.run_once()
+            print(f"✅ {result['events']} events, {result['delivered']} delivered, {result['failed']} failed attempts")
+            return
+        dispatcher.run(app.config["WEBHOOK_POLL_INTERVAL"])
+
+    @app.cli.command("archive-reports")
+    @click.option("--older-than-days", type=float, default=None,
+                  help="Archive reports closed at least this many days ago (default: ARCHIVE_AFTER_DAYS).")
+    @click.option("--batch-size", type=int, default=5000, show_default=True)
+    def archive_reports_command(older_than_days, batch_size):
+        """Move closed reports and their media into the archive tier.
+
+        Runs in its own process, so web workers' caches are not cleared:
+        counts and lists catch up within FACET_CACHE_TTL and
+        RESPONSE_CACHE_TTL, and typeahead at its next rebuild.
+        """
+        days = app.config["ARCHIVE_AFTER_DAYS"] if older_than_days is None else older_than_days
+        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+
+        def progress(totals):
+            print(f"\r  archived {totals['reports']} reports", end="", flush=True)
+
+        totals = archive_closed_reports(cutoff, batch_size=batch_size, progress=progress)
+        print(
+            f"\n✅ Archived {totals['reports']} reports and {totals['media']} media files "
+            f"into {totals['segments']} segments ({totals['compressed_bytes']} bytes)"
+        )
     
     @auth_bp.route("/register", methods=["POST"])
     def register():
         try:
             data = request.get_json() or {}
-            logger.info(f"Registration attempt: {data}")
+            logger.info("Registration attempt", extra={"username": data.get("username")})
 
             # Validate required fields
             required_fields = ['username', 'email', 'password']
             for field in required_fields:
                 if not data.get(field):
-                    logger.warning(f"Missing field: {field}")
+                    logger.warning("Registration missing field", extra={"field": field})
                     return jsonify({"error": f"Missing field: {field}"}), 400
             
             # Check if email already exists
             existing_user_email = User.query.filter_by(email=data['email']).first()
             if existing_user_email:
-                logger.warning(f"Email already registered: {data['email']}")
+                logger.warning("Registration with an existing email")
                 return jsonify({"error": "Email address already registered"}), 400
             
             # Check if username already exists
             existing_user_username = User.query.filter_by(username=data['username']).first()
             if existing_user_username:
-                logger.warning(f"Username already taken: {data['username']}")
+                logger.warning("Registration with a taken username", extra={"username": data['username']})
                 return jsonify({"error": "Username already taken"}), 400
             
             # Validate email format
@@ -127,27 +372,26 @@ def create_app(instance_path: Optional[str] = None):
             if len(data['password']) < 6:
                 return jsonify({"error": "Password must be at least 6 characters long"}), 400
             
-            logger.info("Creating new user...")
+            logger.debug("Creating new user...")
             user = User(
                 username=data['username'],
                 email=data['email'],
                 role='user'
             )
 
-            logger.info("Setting password...")
+            logger.debug("Setting password...")
             user.set_password(data['password'])
 
-            logger.info("Saving to database...")
+            logger.debug("Saving to database...")
             db.session.add(user)
             db.session.commit()
-            logger.info("User saved successfully")
+            logger.info("User registered", extra={"user_id": user.id})
             
-            # Create access token
-            access_token = create_access_token(identity=str(user.id))
-            logger.info("Access token created")
+            # Create access and refresh tokens
+            tokens = issue_tokens(user.id)
             
             return jsonify({
-                "access_token": access_token,
+                **tokens,
                 "user": user.to_dict(),
                 "message": "Registration successful"
             }), 201
@@ -170,7 +414,7 @@ def create_app(instance_path: Optional[str] = None):
     def login():
         try:
             data = request.get_json() or {}
-            logger.info(f"Login attempt for: {data.get('email')}")
+            logger.debug("Login attempt")
             
             if not data.get('email') or not data.get('password'):
                 return jsonify({"error": "Missing email or password"}), 400
@@ -179,11 +423,11 @@ def create_app(instance_path: Optional[str] = None):
             if not user or not user.check_password(data['password']):
                 return jsonify({"error": "Invalid credentials"}), 401
             
-            # Create access token
-            access_token = create_access_token(identity=str(user.id))
+            # Create access and refresh tokens
+            tokens = issue_tokens(user.id)
             
             return jsonify({
-                "access_token": access_token,
+                **tokens,
                 "user": user.to_dict(),
                 "message": "Login successful"
             }), 200
@@ -191,15 +435,56 @@ def create_app(instance_path: Optional[str] = None):
         except Exception as e:
             logger.error(f"LOGIN ERROR: {str(e)}")
             return jsonify({"error": "Internal server error"}), 500
+
+    @auth_bp.route("/refresh", methods=["POST"])
+    @jwt_required(refresh=True)
+    def refresh():
+        # Refresh tokens are single use: revoke the presented one before
+        # handing out a new pair. A failed revoke means another request
+        # already rotated this token, so treat it as replayed.
+        try:
+            if not get_revocation_filter().revoke(get_jwt()):
+                return jsonify({"error": "Refresh token has already been used"}), 401
+
+            return jsonify(issue_tokens(get_jwt_identity())), 200
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"REFRESH ERROR: {str(e)}")
+            return jsonify({"error": "Internal server error"}), 500
+
+    @auth_bp.route("/logout", methods=["POST"])
+    @jwt_required(verify_type=False)
+    def logout():
+        try:
+            revocation_filter = get_revocation_filter()
+            revocation_filter.revoke(get_jwt())
+
+            # Optionally revoke the paired refresh token in the same call.
+            data = request.get_json(silent=True) or {}
+            refresh_token = data.get("refresh_token")
+            if refresh_token:
+                try:
+                    refresh_payload = decode_token(refresh_token)
+                except Exception:
+                    return jsonify({"error": "Invalid refresh token"}), 400
+                if refresh_payload.get("sub") != get_jwt_identity():
+                    return jsonify({"error": "Invalid refresh token"}), 400
+                revocation_filter.revoke(refresh_payload)
+
+            return jsonify({"message": "Logout successful"}), 200
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"LOGOUT ERROR: {str(e)}")
+            return jsonify({"error": "Internal server error"}), 500
     
     @auth_bp.route("/me", methods=["GET"])
+    @jwt_required()
     def me():
-        return jsonify({
-            "id": 1,
-            "username": "testuser",
-            "email": "test@example.com",
-            "role": "user"
-        }), 200
+        user = User.query.get_or_404(int(get_jwt_identity()))
+        usage = get_usage(user.id)
+        # Keeps the counter row if this was the first read.
+        db.session.commit()
+        return jsonify({**user.to_dict(), "usage": usage}), 200
 
     @auth_bp.route('/users/<int:user_id>', methods=['PUT'])
     @jwt_required()
@@ -238,10 +523,6 @@ def create_app(instance_path: Optional[str] = None):
             logger.error(f"Error updating user: {str(e)}")
             return jsonify({"message": "Failed to update user"}), 500
 
-    
-    @auth_bp.route("/users/<int:user_id>", methods=["OPTIONS"])
-    def handle_user_options(user_id=None):
-        return jsonify({"status": "preflight ok"}), 200
 
     # Register the auth blueprint
     app.register_blueprint(auth_bp, url_prefix="/api/v1/auth")
@@ -249,11 +530,10 @@ def create_app(instance_path: Optional[str] = None):
     # CREATE REPORTS BLUEPRINT
     reports_bp = Blueprint("reports", __name__)
 
-    @reports_bp.route("/reports", methods=["GET", "OPTIONS"])
+    @reports_bp.route("/reports", methods=["GET"])
+    @cached_response
+    @replica_read
     def get_reports():
-        if request.method == 'OPTIONS':
-            return jsonify({"status": "preflight ok"}), 200
-
         try:
             page = request.args.get('page', 1, type=int)
             per_page = request.args.get('limit', 10, type=int)
@@ -263,17 +543,22 @@ def create_app(instance_path: Optional[str] = None):
             date_from = request.args.get('from', type=str)
             date_to = request.args.get('to', type=str)
 
-            query = Report.query
+            try:
+                facet_fields = parse_facets(request.args.get('facets'))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            criteria = []
 
             if status:
-                query = query.filter(Report.status == status)
+                criteria.append(Report.status == status)
 
             if report_type:
-                query = query.filter(Report.type == report_type)
+                criteria.append(Report.type == report_type)
 
             if search:
                 like_pattern = f"%{search}%"
-                query = query.filter(or_(Report.title.ilike(like_pattern), Report.description.ilike(like_pattern)))
+                criteria.append(or_(Report.title.ilike(like_pattern), Report.description.ilike(like_pattern)))
 
             if date_from:
                 try:
@@ -282,7 +567,7 @@ def create_app(instance_path: Optional[str] = None):
                         start = start.replace(tzinfo=timezone.utc)
                     else:
                         start = start.astimezone(timezone.utc)
-                    query = query.filter(Report.created_at >= start)
+                    criteria.append(Report.created_at >= start)
                 except ValueError:
                     logger.warning(f"Invalid 'from' date provided: {date_from}")
 
@@ -294,10 +579,14 @@ def create_app(instance_path: Optional[str] = None):
                     else:
                         end = end.astimezone(timezone.utc)
                     end = end + timedelta(days=1)
-                    query = query.filter(Report.created_at < end)
+                    criteria.append(Report.created_at < end)
                 except ValueError:
                     logger.warning(f"Invalid 'to' date provided: {date_to}")
 
+            # to_dict() walks media_files; load them in one extra query
+            # rather than one per report.
+            query = Report.query.options(selectinload(Report.media_files)).filter(*criteria)
+
             sort = request.args.get('sort', 'newest')
             if sort == 'oldest':
                 query = query.order_by(Report.created_at.asc())
@@ -314,13 +603,48 @@ def create_app(instance_path: Optional[str] = None):
                 "page": page
             }
 
+            if facet_fields:
+                cache = get_facet_cache()
+                cache_key = (status, report_type, search, date_from, date_to, facet_fields)
+                facets = cache.get(cache_key)
+                if facets is None:
+                    facets = facet_counts(criteria, facet_fields)
+                    cache.set(cache_key, facets)
+                response_payload["facets"] = facets
+
             return jsonify(response_payload), 200
         except Exception as e:
             logger.error(f"Error fetching reports: {str(e)}")
             return jsonify({"error": "Internal server error"}), 500
 
+    @reports_bp.route('/reports/<int:report_id>', methods=['GET'])
+    def get_report(report_id):
+        # Not replica-routed: a lagging replica could refill the cache
+        # with a copy older than the write that just evicted it.
+        cache = get_report_cache()
+        epoch = cache.epoch
+        body = cache.get(report_id)
+        if body is None:
+            report = Report.query.options(selectinload(Report.media_files)).filter_by(id=report_id).first()
+            if report is None:
+                return jsonify({"error": "Report not found"}), 404
+            body = json.dumps(report.to_dict())
+            cache.put(report_id, report.updated_at, body, epoch)
+        return current_app.response_class(body, mimetype="application/json")
+
+    @reports_bp.route('/reports/suggest', methods=['GET'])
+    def suggest_reports():
+        field = request.args.get('field', 'location')
+        if field not in TYPEAHEAD_FIELDS:
+            return jsonify({"error": f"field must be one of: {', '.join(TYPEAHEAD_FIELDS)}"}), 400
+        limit = max(1, min(request.args.get('limit', 8, type=int), 20))
+        suggestions = get_typeahead().complete(field, request.args.get('q', ''), limit)
+        return jsonify({"field": field, "suggestions": suggestions}), 200
+
     @reports_bp.route('/reports', methods=['POST'])
     @jwt_required()
+    @enforce_storage_quota
+    @idempotent
     def create_report():
         try:
             content_type = request.content_type or ""
@@ -347,6 +671,7 @@ def create_app(instance_path: Optional[str] = None):
 
             db.session.add(report)
             db.session.flush()
+            record_reports(report.created_by, {report.status: 1})
 
             saved_files = []
 
@@ -354,6 +679,11 @@ def create_app(instance_path: Optional[str] = None):
                 upload_folder = current_app.config['UPLOAD_FOLDER']
                 os.makedirs(upload_folder, exist_ok=True)
                 files = request.files.getlist('media')
+                add_media(
+                    report.created_by,
+                    [upload_size(f) for f in files if f and f.filename],
+                    current_app.config['USER_STORAGE_QUOTA'],
+                )
 
                 for uploaded_file in files:
                     if not uploaded_file or not uploaded_file.filename:
@@ -384,11 +714,13 @@ def create_app(instance_path: Optional[str] = None):
                         file_size=os.path.getsize(absolute_path)
                     )
                     db.session.add(media_record)
+                    get_metrics().record_upload(media_record.file_size)
 
+            index_report(report)
             db.session.commit()
-
-            return jsonify(report.to_dict()), 201
-
+        except StorageQuotaExceeded as e:
+            db.session.rollback()
+            return e.response()
         except ValueError as ve:
             db.session.rollback()
             current_app.logger.warning(f"Validation error creating report: {str(ve)}")
@@ -413,12 +745,64 @@ def create_app(instance_path: Optional[str] = None):
 
             return jsonify({'message': 'Failed to create report'}), 500
 
+        refresh_after_write(get_typeahead().report_created)
+        return jsonify({**report.to_dict(), "possible_duplicates": duplicates_of(report)}), 201
+
+    @reports_bp.route('/reports/batch', methods=['POST'])
+    @jwt_required()
+    def sync_reports():
+        boundary = request.mimetype_params.get('boundary')
+        if request.mimetype != 'multipart/form-data' or not boundary:
+            return jsonify({'message': 'Send the reports as multipart/form-data'}), 400
+
+        # A batch carries many reports' media, so it gets its own size cap;
+        # MAX_UPLOAD_SIZE still applies to each file.
+        request.max_content_length = current_app.config['BATCH_SYNC_MAX_SIZE']
+        sync = ReportSync(
+            owner_id=int(get_jwt_identity()),
+            upload_folder=current_app.config['UPLOAD_FOLDER'],
+            instance_path=current_app.instance_path,
+            allowed_extensions=current_app.config['ALLOWED_EXTENSIONS'],
+            chunk_size=current_app.config['BATCH_SYNC_CHUNK_SIZE'],
+            max_items=current_app.config['BATCH_SYNC_MAX_ITEMS'],
+            max_file_size=current_app.config['MAX_CONTENT_LENGTH'],
+            on_upload=get_metrics().record_upload,
+            storage_quota=current_app.config['USER_STORAGE_QUOTA'],
+        )
+        try:
+            summary = sync.run(request.stream, boundary.encode())
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'message': f'Could not parse batch: {str(e)}', 'results': sync.results}), 400
+        finally:
+            # Chunks commit as they go, so even a failed batch may have
+            # created reports.
+            if any(result['status'] == 'created' for result in sync.results):
+                get_typeahead().report_created()
+                get_facet_cache().clear()
+                get_response_cache().clear()
+
+        logger.info(
+            "Report batch synced",
+            extra={'reports_created': summary['created'], 'failed': summary['failed']},
+        )
+        return jsonify(summary), 200
+
     @reports_bp.route('/reports/<int:report_id>', methods=['PUT'])
     @jwt_required()
+    @enforce_storage_quota
+    @idempotent
     def update_report(report_id):
         saved_files = []
         try:
             current_user_id = get_jwt_identity()
+
+            # Read the (possibly slow) upload before taking a pooled
+            # database connection for the lookup.
+            content_type = request.content_type or ""
+            is_multipart = 'multipart/form-data' in content_type
+            data = request.form if is_multipart else (request.get_json() or {})
+
             report = Report.query.get_or_404(report_id)
 
             if str(report.created_by) != str(current_user_id):
@@ -427,10 +811,6 @@ def create_app(instance_path: Optional[str] = None):
             if report.status != 'pending':
                 return jsonify({'message': 'Only pending reports can be modified'}), 403
 
-            content_type = request.content_type or ""
-            is_multipart = 'multipart/form-data' in content_type
-            data = request.form if is_multipart else (request.get_json() or {})
-
             editable_fields = {
                 'title': 'title',
                 'description': 'description',
@@ -438,9 +818,12 @@ def create_app(instance_path: Optional[str] = None):
                 'type': 'type'
             }
 
+            before = {field: getattr(report, field) for field in TYPEAHEAD_FIELDS}
+            text_changed = False
             for payload_key, attr in editable_fields.items():
                 if payload_key in data and data[payload_key] is not None:
                     setattr(report, attr, data[payload_key])
+                    text_changed = text_changed or payload_key != 'type'
 
             remove_media_ids = data.get('remove_media_ids')
             parsed_remove_ids = []
@@ -477,11 +860,17 @@ def create_app(instance_path: Optional[str] = None):
                     except OSError:
                         current_app.logger.warning(f"Failed to remove media file {media_path}")
                     db.session.delete(media)
+                remove_media(report.created_by, [media.file_size for media in media_to_remove])
 
             if is_multipart:
                 upload_folder = current_app.config['UPLOAD_FOLDER']
                 os.makedirs(upload_folder, exist_ok=True)
                 files = request.files.getlist('media')
+                add_media(
+                    report.created_by,
+                    [upload_size(f) for f in files if f and f.filename],
+                    current_app.config['USER_STORAGE_QUOTA'],
+                )
 
                 for uploaded_file in files:
                     if not uploaded_file or not uploaded_file.filename:
@@ -512,11 +901,14 @@ def create_app(instance_path: Optional[str] = None):
                         file_size=os.path.getsize(absolute_path)
                     )
                     db.session.add(media_record)
+                    get_metrics().record_upload(media_record.file_size)
 
+            if text_changed:
+                index_report(report)
             db.session.commit()
-
-            return jsonify(report.to_dict()), 200
-
+        except StorageQuotaExceeded as e:
+            db.session.rollback()
+            return e.response()
         except ValueError as ve:
             db.session.rollback()
             current_app.logger.warning(f"Validation error updating report {report_id}: {str(ve)}")
@@ -539,6 +931,10 @@ def create_app(instance_path: Optional[str] = None):
                     current_app.logger.exception("Failed to cleanup uploaded file during update")
             return jsonify({'message': 'Failed to update report'}), 500
 
+        after = {field: getattr(report, field) for field in TYPEAHEAD_FIELDS}
+        refresh_after_write(lambda: get_typeahead().report_changed(report.id, before, after))
+        return jsonify(report.to_dict()), 200
+
     @reports_bp.route('/reports/<int:report_id>', methods=['DELETE'])
     @jwt_required()
     def delete_report(report_id):
@@ -562,23 +958,301 @@ def create_app(instance_path: Optional[str] = None):
                 except OSError:
                     current_app.logger.warning(f"Failed to remove media file {media_path}")
 
+            indexed_values = {field: getattr(report, field) for field in TYPEAHEAD_FIELDS}
+            remove_report(report.id)
+            record_reports(report.created_by, {report.status: -1})
+            remove_media(report.created_by, [media.file_size for media in report.media_files])
             db.session.delete(report)
             db.session.commit()
-
-            return jsonify({'message': 'Report deleted successfully'}), 200
-
         except Exception as e:
             db.session.rollback()
             current_app.logger.error(f"Failed to delete report {report_id}: {str(e)}")
             return jsonify({'message': 'Failed to delete report'}), 500
 
+        refresh_after_write(lambda: get_typeahead().report_deleted(report_id, indexed_values))
+        return jsonify({'message': 'Report deleted successfully'}), 200
+
     @reports_bp.route('/media/<path:filename>', methods=['GET'])
     def get_report_media(filename):
         upload_folder = current_app.config['UPLOAD_FOLDER']
         return send_from_directory(upload_folder, filename)
 
+    @reports_bp.route('/archive/reports/<int:report_id>', methods=['GET'])
+    @jwt_required()
+    def get_archived_report_endpoint(report_id):
+        record = get_archived_report(report_id)
+        if record is None:
+            return jsonify({'error': 'Archived report not found'}), 404
+        return jsonify(record), 200
+
+    @reports_bp.route('/archive/reports', methods=['GET'])
+    @jwt_required()
+    def search_archived_reports():
+        # Searching the archive decompresses whole segments; callers bound
+        # the cost with from/to (closure months) and a small limit.
+        closed_from = request.args.get('from')
+        closed_to = request.args.get('to')
+        for value in (closed_from, closed_to):
+            if value and not (len(value) == 7 and value[4] == '-' and value.replace('-', '').isdigit()):
+                return jsonify({'error': 'from/to must be YYYY-MM'}), 400
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        created_by = request.args.get('created_by', type=int)
+        items, scanned = search_archive(
+            search=request.args.get('search', ''),
+            status=request.args.get('status'),
+            closed_from=closed_from,
+            closed_to=closed_to,
+            created_by=created_by,
+            limit=limit,
+        )
+        return jsonify({'items': items, 'segments_scanned': scanned}), 200
+
+    @reports_bp.route('/archive/media/<partition>/<path:filename>', methods=['GET'])
+    def get_archived_media(partition, filename):
+        # The partition is user input too: only serve real months, and let
+        # safe_join check the whole relative path.
+        if not ARCHIVE_PARTITION.match(partition):
+            return jsonify({'error': 'Archived media not found'}), 404
+        return send_from_directory(cold_storage().root, f"{partition}/{filename}")
+
     # Register the reports blueprint
     app.register_blueprint(reports_bp, url_prefix="/api/v1")
+
+    # CREATE ADMIN BLUEPRINT
+    admin_bp = Blueprint("admin", __name__)
+
+    @admin_bp.route("/users/import", methods=["POST"])
+    @jwt_required()
+    @admin_required
+    def import_users_endpoint():
+        uploaded_file = request.files.get('file')
+        if uploaded_file and uploaded_file.filename:
+            stream = uploaded_file.stream
+            fmt = detect_format(uploaded_file.filename, uploaded_file.mimetype)
+        elif request.content_length and 'multipart/form-data' not in (request.content_type or ''):
+            stream = request.stream
+            fmt = detect_format(content_type=request.content_type)
+        else:
+            return jsonify({"error": "Upload a CSV or NDJSON file"}), 400
+
+        fmt = request.args.get('format', fmt)
+        if fmt not in ('csv', 'ndjson'):
+            return jsonify({"error": "format must be csv or ndjson"}), 400
+
+        try:
+            summary = import_users(
+                stream,
+                fmt=fmt,
+                batch_size=current_app.config["BULK_IMPORT_BATCH_SIZE"],
+                workers=current_app.config["BULK_IMPORT_WORKERS"],
+            )
+        except (UnicodeDecodeError, csv.Error) as e:
+            db.session.rollback()
+            return jsonify({"error": f"Could not parse upload: {str(e)}"}), 400
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"USER IMPORT ERROR: {str(e)}")
+            return jsonify({"error": "User import failed"}), 500
+
+        logger.info(f"User import: {summary['created']} created, {summary['failed']} failed")
+        return jsonify(summary), 200
+
+    @admin_bp.route("/reports/<int:report_id>", methods=["GET"])
+    @jwt_required()
+    @admin_required
+    def admin_get_report(report_id):
+        report = Report.query.get_or_404(report_id)
+        return jsonify({**report.to_dict(), "possible_duplicates": duplicates_of(report)}), 200
+
+    @admin_bp.route("/reports/<int:report_id>/status", methods=["PUT"])
+    @jwt_required()
+    @admin_required
+    def update_status(report_id):
+        data = request.get_json(silent=True) or {}
+        status = data.get("status")
+        if status not in REPORT_STATUSES:
+            return jsonify({"error": f"status must be one of: {', '.join(sorted(REPORT_STATUSES))}"}), 400
+
+        report = Report.query.get_or_404(report_id)
+        previous = report.status
+        if status != previous:
+            report.status = status
+            record_reports(report.created_by, {previous: -1, status: 1})
+            # Same transaction as the change; the dispatcher delivers it.
+            enqueue_event("report.status_changed", {
+                "report_id": report.id,
+                "title": report.title,
+                "type": report.type,
+                "location": report.location,
+                "previous_status": previous,
+                "status": status,
+                "note": data.get("note"),
+                "changed_by": int(get_jwt_identity()),
+            })
+            db.session.commit()
+            get_facet_cache().clear()
+            get_response_cache().clear()
+        return jsonify(report.to_dict()), 200
+
+    @admin_bp.route("/webhooks", methods=["GET"])
+    @jwt_required()
+    @admin_required
+    def list_webhooks():
+        endpoints = WebhookEndpoint.query.order_by(WebhookEndpoint.id).all()
+        return jsonify({"webhooks": [endpoint.to_dict() for endpoint in endpoints]}), 200
+
+    @admin_bp.route("/webhooks", methods=["POST"])
+    @jwt_required()
+    @admin_required
+    def create_webhook():
+        data = request.get_json(silent=True) or {}
+        url = (data.get("url") or "").strip()
+        if not url.startswith(("https://", "http://")) or len(url) > 500:
+            return jsonify({"error": "url must be an http(s) URL"}), 400
+        events = data.get("events") or ["*"]
+        if not isinstance(events, list) or not all(isinstance(event, str) and event for event in events):
+            return jsonify({"error": "events must be a list of event types"}), 400
+        max_concurrency = data.get("max_concurrency", 2)
+        if not isinstance(max_concurrency, int) or not 1 <= max_concurrency <= 16:
+            return jsonify({"error": "max_concurrency must be between 1 and 16"}), 400
+
+        endpoint = WebhookEndpoint(
+            url=url, secret=secrets.token_hex(32), events=",".join(events), max_concurrency=max_concurrency
+        )
+        db.session.add(endpoint)
+        db.session.commit()
+        # The secret is only shown once.
+        return jsonify({**endpoint.to_dict(), "secret": endpoint.secret}), 201
+
+    @admin_bp.route("/webhooks/<int:webhook_id>", methods=["DELETE"])
+    @jwt_required()
+    @admin_required
+    def delete_webhook(webhook_id):
+        endpoint = WebhookEndpoint.query.get_or_404(webhook_id)
+        endpoint.active = False
+        db.session.commit()
+        return "", 204
+
+    @admin_bp.route("/reports/import", methods=["POST"])
+    @jwt_required()
+    @admin_required
+    def import_reports_endpoint():
+        source = (request.args.get('source') or '').strip()
+        if not source or len(source) > 100:
+            return jsonify({"error": "source is required (the agency the dump came from)"}), 400
+
+        uploaded_file = request.files.get('file')
+        if uploaded_file and uploaded_file.filename:
+            stream = uploaded_file.stream
+            fmt = detect_format(uploaded_file.filename, uploaded_file.mimetype)
+        elif request.content_length and 'multipart/form-data' not in (request.content_type or ''):
+            stream = request.stream
+            fmt = detect_format(content_type=request.content_type)
+        else:
+            return jsonify({"error": "Upload a CSV or NDJSON file"}), 400
+
+        fmt = request.args.get('format', fmt)
+        if fmt not in ('csv', 'ndjson'):
+            return jsonify({"error": "format must be csv or ndjson"}), 400
+
+        try:
+            summary = import_reports(
+                stream,
+                source=source,
+                owner_id=int(get_jwt_identity()),
+                fmt=fmt,
+                batch_size=current_app.config["BULK_IMPORT_BATCH_SIZE"],
+            )
+        except (UnicodeDecodeError, csv.Error) as e:
+            db.session.rollback()
+            return jsonify({"error": f"Could not parse upload: {str(e)}"}), 400
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"REPORT IMPORT ERROR: {str(e)}")
+            return jsonify({"error": "Report import failed"}), 500
+
+        get_typeahead().report_created()
+        get_facet_cache().clear()
+        get_response_cache().clear()
+
+        logger.info(
+            "Report import finished",
+            extra={"source": source, "reports_created": summary['created'],
+                   "duplicates": summary['duplicates'], "failed": summary['failed']},
+        )
+        return jsonify(summary), 200
+
+    @admin_bp.route("/db/pool", methods=["GET"])
+    @jwt_required()
+    @admin_required
+    def database_pool_stats():
+        stats = pool_stats(db.engine)
+        stats["replicas"] = [pool_stats(engine) for engine in current_app.extensions["replica_router"].engines]
+        return jsonify(stats), 200
+
+    @admin_bp.route("/logging/stats", methods=["GET"])
+    @jwt_required()
+    @admin_required
+    def logging_pipeline_stats():
+        return jsonify(logging_stats()), 200
+
+    @admin_bp.route("/admission", methods=["GET"])
+    @jwt_required()
+    @admin_required
+    def admission_stats():
+        return jsonify({"pid": os.getpid(), **get_admission().stats()}), 200
+
+    @admin_bp.route("/profiles", methods=["GET"])
+    @jwt_required()
+    @admin_required
+    def list_request_profiles():
+        limit = min(request.args.get("limit", 50, type=int), 200)
+        return jsonify({"profiles": list_profiles(current_app.config["PROFILE_DIR"], limit)}), 200
+
+    @admin_bp.route("/profiles/<profile_id>", methods=["GET"])
+    @jwt_required()
+    @admin_required
+    def get_request_profile(profile_id):
+        profile = load_profile(current_app.config["PROFILE_DIR"], profile_id)
+        if profile is None:
+            return jsonify({"error": "Profile not found"}), 404
+        return jsonify(profile), 200
+
+    @admin_bp.route("/profiles/<profile_id>/flamegraph.svg", methods=["GET"])
+    @jwt_required()
+    @admin_required
+    def get_request_flamegraph(profile_id):
+        profile = load_profile(current_app.config["PROFILE_DIR"], profile_id)
+        if profile is None:
+            return jsonify({"error": "Profile not found"}), 404
+        title = f"{profile['method']} {profile['path']} {profile['duration_ms']} ms"
+        return flamegraph_svg(unfold(profile["folded"]), title), 200, {"Content-Type": "image/svg+xml"}
+
+    @admin_bp.route("/profiles/capture", methods=["GET"])
+    @jwt_required()
+    @admin_required
+    def list_profile_captures():
+        captures = [capture.to_dict() for capture in list(get_profiler().captures.values())]
+        return jsonify({"pid": os.getpid(), "captures": captures}), 200
+
+    @admin_bp.route("/profiles/capture", methods=["POST"])
+    @jwt_required()
+    @admin_required
+    def arm_profile_capture():
+        if not current_app.config["PROFILING_ENABLED"]:
+            return jsonify({"error": "Profiling is disabled"}), 409
+        data = request.get_json(silent=True) or {}
+        endpoint = data.get("endpoint")
+        if endpoint not in current_app.view_functions:
+            return jsonify({"error": "endpoint must be a view name such as reports.get_reports"}), 400
+        rank, window = data.get("rank", 1), data.get("window", 100)
+        if not isinstance(rank, int) or not isinstance(window, int) or not 1 <= rank <= window <= 10000:
+            return jsonify({"error": "rank and window must satisfy 1 <= rank <= window <= 10000"}), 400
+        capture = get_profiler().arm(endpoint, rank, window)
+        # Captures live in this worker only.
+        return jsonify({"pid": os.getpid(), **capture.to_dict()}), 202
+
+    app.register_blueprint(admin_bp, url_prefix="/api/v1/admin")
        
     @app.route("/")
     def home():
@@ -588,16 +1262,24 @@ def create_app(instance_path: Optional[str] = None):
     def ping(): 
             return {"msg": "pong"}, 200
 
-        # Global OPTIONS handler
-    @app.route('/', methods=['OPTIONS'])
-    @app.route('/<path:path>', methods=['OPTIONS'])
-    def options_handler(path=None):
-            return jsonify({"status": "preflight ok"}), 200
-
     return app  
 
-# Create app instance
-app = create_app()
+
+def init_db(app):
+    """Create missing tables and instance directories for ``app``."""
+    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+    with app.app_context():
+        try:
+            db.create_all()
+            logger.info("✅ Database tables created successfully")
+        except Exception as e:
+            logger.error(f"❌ Database creation error: {str(e)}")
+            logger.error(traceback.format_exc())
+            raise
+
 
 if __name__ == "__main__":
+    configure_logging()
+    app = create_app()
+    init_db(app)
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,284 @@
+"""Archival tier for closed reports.
+
+``archive_closed_reports`` moves resolved and rejected reports that have
+not changed since a cutoff out of ``reports`` and ``report_media``. They
+go into gzip-compressed NDJSON segments, partitioned by the month they
+were closed in::
+
+    <ARCHIVE_DIR>/reports/2025-06/segment-20251201T020000-000001.ndjson.gz
+
+Their media files move to cold storage under ``<partition>/<filename>``.
+Segment files are written and media copied before the database
+transaction that deletes the hot rows. If that transaction fails, the
+copies are removed again. The original files are only deleted once it
+has committed. A segment only becomes visible once its
+``archive_segments`` row exists, so a crash can leave an orphaned file
+but never a lost report.
+
+Reading:
+
+* :func:`get_archived_report` finds the report's segment through
+  ``archived_reports`` and scans that one file;
+* :func:`search_archive` streams the segments of the requested months
+  and matches text before parsing JSON, so it only costs what it reads.
+
+Environment:
+
+``ARCHIVE_DIR``             segment root (``<instance>/archive``).
+``ARCHIVE_COLD_MEDIA_DIR``  cold media root (``<instance>/cold-media``).
+``ARCHIVE_AFTER_DAYS``      archive reports closed this long ago (180).
+"""
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+
+from flask import current_app
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import selectinload
+
+try:
+    from .models import (
+        db, ArchivedReport, ArchiveSegment, Report, ReportImportKey, ReportMedia, ReportSimilarityBucket,
+    )
+    from .usage import record_reports, remove_media
+except ImportError:  # pragma: no cover - fallback for script execution
+    from models import (
+        db, ArchivedReport, ArchiveSegment, Report, ReportImportKey, ReportMedia, ReportSimilarityBucket,
+    )
+    from usage import record_reports, remove_media
+
+logger = logging.getLogger(__name__)
+
+CLOSED_STATUSES = ('resolved', 'rejected')
+PARTITION = re.compile(r'^\d{4}-\d{2}$')
+
+
+class LocalColdStorage:
+    """Cold media on a local or mounted filesystem (e.g. an object store
+    mounted with s3fs, or a cheaper disk)."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def put(self, source, key):
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy2(source, target)
+        return key
+
+    def remove(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+def archive_dir(app=None):
+    app = app or current_app
+    return app.config.get('ARCHIVE_DIR') or os.path.join(app.instance_path, 'archive')
+
+
+def cold_storage(app=None):
+    app = app or current_app
+    return LocalColdStorage(app.config.get('ARCHIVE_COLD_MEDIA_DIR') or os.path.join(app.instance_path, 'cold-media'))
+
+
+def _as_utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _partition(report):
+    return _as_utc(report.updated_at).strftime('%Y-%m')
+
+
+def _record(report, partition, archived_at):
+    record = report.to_dict()
+    record['closed_at'] = _as_utc(report.updated_at).isoformat()
+    record['archived_at'] = archived_at.isoformat()
+    record['archived'] = True
+    for media, attachment, row in zip(record['media'], record['attachments'], report.media_files):
+        media['url'] = attachment['url'] = f"/api/v1/archive/media/{partition}/{row.filename}"
+    return record
+
+
+def _write_segment(path, records):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as handle:
+        for record in records:
+            # "id" first, so lookups can match a line without parsing it.
+            handle.write(json.dumps({'id': record['id'], **record}, separators=(',', ':'), ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def _media_source(app, media):
+    path = media.file_path
+    return path if os.path.isabs(path) else os.path.join(app.instance_path, path)
+
+
+def archive_closed_reports(cutoff=None, batch_size=5000, progress=None, app=None):
+    """Archive reports closed before ``cutoff``; returns counts.
+
+    ``cutoff`` defaults to ``ARCHIVE_AFTER_DAYS`` before now. Must be
+    called inside an application context.
+    """
+    app = app or current_app._get_current_object()
+    if cutoff is None:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=app.config.get('ARCHIVE_AFTER_DAYS', 180))
+    root = archive_dir(app)
+    storage = cold_storage(app)
+    totals = {'reports': 0, 'media': 0, 'segments': 0, 'compressed_bytes': 0}
+
+    while True:
+        batch = (
+            Report.query.options(selectinload(Report.media_files))
+            .filter(Report.status.in_(CLOSED_STATUSES), Report.updated_at < cutoff)
+            .order_by(Report.updated_at, Report.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        _archive_batch(app, batch, root, storage, totals)
+        if progress:
+            progress(totals)
+    return totals
+
+
+def _archive_batch(app, batch, root, storage, totals):
+    archived_at = datetime.now(timezone.utc)
+    stamp = archived_at.strftime('%Y%m%dT%H%M%S%f')
+    written, copied = [], []
+    segments = []
+    try:
+        for index, (partition, reports) in enumerate(groupby(batch, key=_partition)):
+            reports = list(reports)
+            relative = os.path.join('reports', partition, f'segment-{stamp}-{index:06d}.ndjson.gz')
+            size = _write_segment(os.path.join(root, relative), (_record(r, partition, archived_at) for r in reports))
+            written.append(os.path.join(root, relative))
+            media = [m for r in reports for m in r.media_files]
+            for item in media:
+                source = _media_source(app, item)
+                if os.path.exists(source):
+                    copied.append(storage.put(source, f'{partition}/{item.filename}'))
+            segments.append((partition, relative, reports, len(media), size))
+
+        report_ids = [report.id for report in batch]
+        for partition, relative, reports, media_count, size in segments:
+            segment = ArchiveSegment(partition=partition, path=relative, report_count=len(reports),
+                                     media_count=media_count, compressed_bytes=size)
+            db.session.add(segment)
+            db.session.flush()
+            db.session.execute(insert(ArchivedReport), [
+                {'report_id': r.id, 'segment_id': segment.id, 'created_by': r.created_by,
+                 'status': r.status, 'closed_at': _as_utc(r.updated_at)}
+                for r in reports
+            ])
+        sources = [_media_source(app, m) for r in batch for m in r.media_files]
+        for model, column in ((ReportSimilarityBucket, ReportSimilarityBucket.report_id),
+                              (ReportImportKey, ReportImportKey.report_id),
+                              (ReportMedia, ReportMedia.report_id),
+                              (Report, Report.id)):
+            db.session.execute(delete(model).where(column.in_(report_ids)), execution_options={'synchronize_session': False})
+        # Archived reports and their media no longer count towards the
+        # owners' live counters and storage quota.
+        statuses, sizes = defaultdict(Counter), defaultdict(list)
+        for report in batch:
+            statuses[report.created_by][report.status] -= 1
+            sizes[report.created_by].extend(m.file_size for m in report.media_files)
+        for user_id, counts in statuses.items():
+            record_reports(user_id, counts)
+            remove_media(user_id, sizes[user_id])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        for path in written:
+            if os.path.exists(path):
+                os.remove(path)
+        for key in copied:
+            storage.remove(key)
+        raise
+    finally:
+        db.session.expunge_all()
+
+    for source in sources:
+        try:
+            os.remove(source)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.warning("Could not remove archived media file", extra={'path': source})
+
+    totals['reports'] += len(batch)
+    totals['media'] += len(sources)
+    totals['segments'] += len(segments)
+    totals['compressed_bytes'] += sum(size for *_, size in segments)
+    logger.info("Archived report batch", extra={'reports': len(batch), 'segments': len(segments)})
+
+
+def _read_segment(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as handle:
+        yield from handle
+
+
+def get_archived_report(report_id):
+    """The archived record for ``report_id``, or ``None``."""
+    entry = db.session.get(ArchivedReport, report_id)
+    if entry is None:
+        return None
+    segment = db.session.get(ArchiveSegment, entry.segment_id)
+    prefix = f'{{"id":{report_id},'
+    for line in _read_segment(os.path.join(archive_dir(), segment.path)):
+        if line.startswith(prefix):
+            return json.loads(line)
+    logger.error("Archived report missing from its segment", extra={'report_id': report_id, 'segment': segment.path})
+    return None
+
+
+def search_archive(search='', status=None, closed_from=None, closed_to=None, created_by=None, limit=20):
+    """Scan archived reports, newest partitions first.
+
+    ``closed_from``/``closed_to`` are ``YYYY-MM`` partitions and bound
+    the files read. Returns ``(items, segments_scanned)``.
+    """
+    query = ArchiveSegment.query
+    if closed_from:
+        query = query.filter(ArchiveSegment.partition >= closed_from)
+    if closed_to:
+        query = query.filter(ArchiveSegment.partition <= closed_to)
+    segments = query.order_by(ArchiveSegment.partition.desc(), ArchiveSegment.id.desc()).all()
+
+    needle = search.lower()
+    # Raw lines hold JSON-escaped text, and older segments escape every
+    # non-ASCII character; only an ASCII needle can be matched before
+    # parsing.
+    raw_needle = json.dumps(needle)[1:-1] if needle.isascii() else ''
+    items, scanned = [], 0
+    root = archive_dir()
+    for segment in segments:
+        scanned += 1
+        for line in _read_segment(os.path.join(root, segment.path)):
+            # Cheap text test on the raw line before paying for json.loads.
+            if raw_needle and raw_needle not in line.lower():
+                continue
+            record = json.loads(line)
+            if needle and needle not in record['title'].lower() and needle not in record['description'].lower():
+                continue
+            if status and record['status'] != status:
+                continue
+            if created_by is not None and record['created_by'] != created_by:
+                continue
+            items.append(record)
+            if len(items) >= limit:
+                return items, scanned
+    return items, scanned
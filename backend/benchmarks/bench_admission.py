@@ -0,0 +1,107 @@
+"""Goodput under overload, with and without admission control.
+
+A stand-in search route holds one of ``--backend-slots`` "database
+connections" for ``--service-ms`` per request. Closed-loop clients give
+up after ``--deadline-ms``, so a response slower than that is wasted
+work. Shed clients back off ``--backoff-ms`` before retrying, standing in
+for ``Retry-After``.
+
+With admission control, goodput under ``--clients`` stays close to the
+two-client baseline and ``/ping`` stays fast. Without it, requests queue
+behind each other and most of them finish too late.
+
+    python -m benchmarks.bench_admission --clients 48 --seconds 2
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.common import make_app, summarize
+
+
+def run_clients(app, clients, seconds, deadline, backoff):
+    """Closed-loop clients; returns (good, late, shed, Retry-After values)."""
+    results = []
+    stop = time.monotonic() + seconds
+
+    def client():
+        http = app.test_client()
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            response = http.get('/api/v1/bench-search')
+            elapsed = time.perf_counter() - started
+            if response.status_code == 503:
+                results.append(('shed', response.headers.get('Retry-After')))
+                time.sleep(backoff)
+            else:
+                results.append(('good' if elapsed <= deadline else 'late', elapsed))
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (sum(kind == 'good' for kind, _ in results), sum(kind == 'late' for kind, _ in results),
+            [value for kind, value in results if kind == 'shed'])
+
+
+def ping_latency(app, clients, seconds, deadline, backoff):
+    """``/ping`` latencies while ``clients`` keep the search class busy."""
+    load = threading.Thread(target=run_clients, args=(app, clients, seconds, deadline, backoff))
+    load.start()
+    http = app.test_client()
+    samples = []
+    time.sleep(min(0.1, seconds / 4))
+    while load.is_alive():
+        started = time.perf_counter()
+        http.get('/ping')
+        samples.append(time.perf_counter() - started)
+        time.sleep(0.01)
+    load.join()
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=48)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--backend-slots", type=int, default=2)
+    parser.add_argument("--service-ms", type=float, default=20)
+    parser.add_argument("--deadline-ms", type=float, default=200)
+    parser.add_argument("--backoff-ms", type=float, default=100)
+    args = parser.parse_args()
+    deadline, backoff = args.deadline_ms / 1000, args.backoff_ms / 1000
+
+    app = make_app(
+        ADMISSION_ROUTES={'bench_search': 'search'},
+        ADMISSION_CLASSES={'search': {'limit': args.backend_slots, 'queue': 2 * args.backend_slots,
+                                      'max_wait': deadline / 2, 'retry_after': 2}},
+    )
+    backend = threading.Semaphore(args.backend_slots)
+
+    @app.route('/api/v1/bench-search')
+    def bench_search():
+        with backend:
+            time.sleep(args.service_ms / 1000)
+        return {'ok': True}
+
+    with app.app_context():
+        app.extensions['admission'].configure(app.config)
+
+    rows = []
+    for label, enabled, clients in (("baseline", True, 2), ("admission", True, args.clients),
+                                    ("no admission", False, args.clients)):
+        app.config['ADMISSION_ENABLED'] = enabled
+        good, late, shed = run_clients(app, clients, args.seconds, deadline, backoff)
+        ping = ping_latency(app, clients, args.seconds / 2, deadline, backoff)
+        rows.append((label, clients, good / args.seconds, late / args.seconds, len(shed), ping['p95_us'] / 1000))
+
+    print(f"\n{args.backend_slots} backend slots, {args.service_ms:g} ms per search, "
+          f"{args.deadline_ms:g} ms client deadline, {args.seconds:g} s per run")
+    print(f"{'variant':<16}{'clients':>8}{'good/s':>10}{'late/s':>10}{'shed':>8}{'ping p95 ms':>13}")
+    for label, clients, good, late, shed, ping in rows:
+        print(f"{label:<16}{clients:>8}{good:>10.1f}{late:>10.1f}{shed:>8}{ping:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Authenticated request overhead with and without the revocation filter.
+
+Compares three ways of answering "is this token revoked?" on every request:
+
+* ``no revocation`` - the behaviour before refresh tokens existed;
+* ``db lookup per request`` - a naive blocklist that queries ``revoked_tokens``;
+* ``in-memory filter`` - :class:`revocation.RevocationFilter`.
+"""
+import argparse
+import time
+
+from flask_jwt_extended import create_access_token, jwt_required
+
+from benchmarks.common import make_app, print_table, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--revoked", type=int, default=10000, help="revoked tokens already on record")
+    args = parser.parse_args()
+
+    app = make_app()
+
+    @app.route("/bench/protected")
+    @jwt_required()
+    def protected():
+        return {"ok": True}
+
+    from app import jwt
+    from models import db, RevokedToken
+
+    with app.app_context():
+        expires = int(time.time()) + 3600
+        db.session.bulk_insert_mappings(RevokedToken, [
+            {"jti": f"revoked-{i}", "token_type": "access", "expires": expires}
+            for i in range(args.revoked)
+        ])
+        db.session.commit()
+        token = create_access_token(identity="1")
+
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def call():
+        response = client.get("/bench/protected", headers=headers)
+        assert response.status_code == 200, response.get_json()
+
+    filter_callback = jwt._token_in_blocklist_callback
+    variants = {
+        "no revocation": lambda header, payload: False,
+        "db lookup per request": lambda header, payload: db.session.query(
+            RevokedToken.id).filter_by(jti=payload["jti"]).first() is not None,
+        "in-memory filter": filter_callback,
+    }
+
+    results = {}
+    for name, callback in variants.items():
+        jwt._token_in_blocklist_callback = callback
+        results[name] = time_calls(call, args.iterations)
+    jwt._token_in_blocklist_callback = filter_callback
+
+    print_table(f"GET /bench/protected x{args.iterations} ({args.revoked} revoked tokens on record)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Bandwidth and CPU cost of response compression.
+
+Seeds a database with generated reports and, for report list pages of a
+few sizes, prints:
+
+* the bytes on the wire per encoding (gzip, and brotli when the
+  ``Brotli`` package from requirements.txt is installed);
+* the CPU time to compress one page per encoding;
+* ``GET /api/v1/reports`` latency with the response cache off (compress
+  on every request) and on (precompressed hits).
+
+    python -m benchmarks.bench_compression [--reports 2000] [--iterations 300]
+"""
+import argparse
+
+from benchmarks.common import make_app, print_table, time_calls
+from benchmarks.datagen import generate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reports", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args()
+
+    import compression
+    from models import db
+
+    app = make_app(RATELIMIT_ENABLED=False, METRICS_ENABLED=False)
+    with app.app_context():
+        generate(db.engine, users=50, reports=args.reports, media_per_report=0.5, verbose=False)
+    client = app.test_client()
+    encodings = compression.available_encodings()
+    if "br" not in encodings:
+        print("brotli is not installed (pip install Brotli); showing gzip only")
+
+    print(f"{'page':<12}{'identity':>12}" + "".join(f"{e:>12}" for e in encodings))
+    pages = {}
+    for limit in (10, 50):
+        app.config["COMPRESSION_ENABLED"] = False
+        body = client.get(f"/api/v1/reports?limit={limit}").data
+        app.config["COMPRESSION_ENABLED"] = True
+        pages[limit] = body
+        sizes = [len(compression.compress(body, e, app.config)) for e in encodings]
+        print(f"limit={limit:<6}{len(body):>12}" + "".join(f"{size:>12}" for size in sizes))
+
+    cpu = {}
+    for limit, body in pages.items():
+        for encoding in encodings:
+            cpu[f"compress {encoding} limit={limit}"] = time_calls(
+                lambda: compression.compress(body, encoding, app.config), args.iterations
+            )
+    print_table(f"compression CPU x{args.iterations}", cpu)
+
+    results = {}
+    for encoding in (None,) + encodings:
+        headers = {"Accept-Encoding": encoding} if encoding else {}
+        name = encoding or "identity"
+        app.extensions["response_cache"].ttl = 0
+        results[f"{name} uncached"] = time_calls(
+            lambda: client.get("/api/v1/reports?limit=50", headers=headers), args.iterations
+        )
+        app.extensions["response_cache"].ttl = 3600
+        results[f"{name} cached"] = time_calls(
+            lambda: client.get("/api/v1/reports?limit=50", headers=headers), args.iterations
+        )
+    print_table(f"GET /api/v1/reports?limit=50 x{args.iterations}", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Concurrent write throughput with and without the engine profile.
+
+Each worker process stands in for a gunicorn worker: it builds its own app
+and, for ``--seconds``, commits a report and then runs the listing count
+query, the way a user submitting and then viewing reports would. Run it
+against SQLite (default) or a PostgreSQL URL via ``--database-url``.
+
+    python -m benchmarks.bench_db_concurrency --workers 8
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.common import BACKEND_DIR  # noqa: F401  (puts backend on sys.path)
+
+
+def worker(profile, database_url, seconds, results):
+    os.environ["DB_ENGINE_PROFILE"] = profile
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["FLASK_INSTANCE_PATH"] = tempfile.mkdtemp(prefix="jiseti-bench-")
+
+    from sqlalchemy.exc import OperationalError
+
+    from app import create_app
+    from models import db, Report
+
+    app = create_app()
+    committed = locked = 0
+    with app.app_context():
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            try:
+                db.session.add(Report(
+                    type="infrastructure",
+                    title="Pothole",
+                    description="Benchmark write",
+                    location="Downtown",
+                    created_by=1,
+                ))
+                db.session.commit()
+                Report.query.filter_by(status="pending").count()
+                db.session.commit()
+                committed += 1
+            except OperationalError as exc:
+                db.session.rollback()
+                if "locked" not in str(exc):
+                    raise
+                locked += 1
+    results.put((committed, locked))
+
+
+def run(profile, database_url, workers, seconds):
+    os.environ["DB_ENGINE_PROFILE"] = profile
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["FLASK_INSTANCE_PATH"] = tempfile.mkdtemp(prefix="jiseti-bench-")
+    from app import create_app
+    from models import db, User
+
+    with create_app().app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(User(id=1, username="bench", email="bench@example.com", password_hash="x"))
+        db.session.commit()
+        db.engine.dispose()
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(profile, database_url, seconds, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    committed = sum(c for c, _ in totals)
+    locked = sum(l for _, l in totals)
+    return committed / seconds, locked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file per profile")
+    args = parser.parse_args()
+
+    print(f"\n{args.workers} writer processes for {args.seconds}s each")
+    print(f"{'profile':<12}{'writes/s':>12}{'locked errors':>16}")
+    for profile in ("default", "tuned"):
+        url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='jiseti-bench-')}/bench.db"
+        throughput, locked = run(profile, url, args.workers, args.seconds)
+        print(f"{profile:<12}{throughput:>12.1f}{locked:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Caller-side logging latency: synchronous handler vs the queue pipeline.
+
+The sink sleeps ``--sink-delay-us`` per record to stand in for a slow
+stdout pipe or log shipper. With a synchronous handler the request thread
+pays that delay on every call. With the queue pipeline it only pays for
+sampling, redaction and an enqueue, and a full queue drops records rather
+than blocking.
+
+    python -m benchmarks.bench_logging --records 20000
+"""
+import argparse
+import logging
+import logging.handlers
+import queue
+import time
+
+from benchmarks.common import print_table, time_calls  # noqa: F401  (puts backend on sys.path)
+
+from logging_setup import JsonFormatter, NonBlockingQueueHandler, SamplingFilter, stats
+
+
+class SlowSink(logging.Handler):
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.setFormatter(JsonFormatter())
+        self.written = 0
+
+    def emit(self, record):
+        self.format(record)
+        # Blocking I/O releases the GIL, so sleep rather than spin.
+        time.sleep(self.delay)
+        self.written += 1
+
+
+def measure(logger, records):
+    payload = {"username": "ann", "password": "hunter22", "report_id": 42}
+    return time_calls(lambda: logger.info("Registration attempt %s", payload, extra={"user_id": 7}), records, warmup=0)
+
+
+def fresh_logger(name, handler):
+    logger = logging.getLogger(f"bench.{name}")
+    logger.handlers[:] = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--sink-delay-us", type=float, default=50)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    args = parser.parse_args()
+    delay = args.sink_delay_us / 1e6
+
+    results = {}
+    sync_sink = SlowSink(delay)
+    results["synchronous"] = measure(fresh_logger("sync", sync_sink), args.records)
+
+    for label, rate in (("queue", 1.0), (f"queue, sampled {args.sample_rate:g}", args.sample_rate)):
+        sink = SlowSink(delay)
+        handler = NonBlockingQueueHandler(queue.Queue(args.queue_size))
+        handler.addFilter(SamplingFilter({"bench": rate}))
+        listener = logging.handlers.QueueListener(handler.queue, sink)
+        listener.start()
+        before = stats.as_dict()
+        results[label] = measure(fresh_logger(label.replace(" ", "_"), handler), args.records)
+        listener.stop()
+        after = stats.as_dict()
+        results[label]["written"] = sink.written
+        results[label]["dropped"] = after["dropped"] - before["dropped"]
+        results[label]["sampled_out"] = after["sampled_out"] - before["sampled_out"]
+
+    print_table(f"logger.info() x{args.records}, sink {args.sink_delay_us:g}us/record", results)
+    print(f"\n{'variant':<28}{'written':>10}{'dropped':>10}{'sampled out':>13}")
+    print(f"{'synchronous':<28}{sync_sink.written:>10}{0:>10}{0:>13}")
+    for label, row in results.items():
+        if "written" in row:
+            print(f"{label:<28}{row['written']:>10}{row['dropped']:>10}{row['sampled_out']:>13}")
+
+
+if __name__ == "__main__":
+    main()
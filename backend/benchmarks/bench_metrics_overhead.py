@@ -0,0 +1,45 @@
+"""Per-request cost of the metrics instrumentation.
+
+Times ``GET /ping`` through the test client with ``METRICS_ENABLED`` on and
+off, and the registry primitives each request calls on their own.
+
+    python -m benchmarks.bench_metrics_overhead
+"""
+import argparse
+
+from benchmarks.common import make_app, print_table, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    app = make_app(RATELIMIT_ENABLED=False)
+    client = app.test_client()
+    metrics = app.extensions["metrics"]
+
+    results = {}
+    for enabled in (False, True):
+        app.config["METRICS_ENABLED"] = enabled
+        results[f"GET /ping metrics={'on' if enabled else 'off'}"] = time_calls(
+            lambda: client.get("/ping"), args.iterations
+        )
+
+    registry = metrics.registry
+    labels = ("reports", "/api/v1/reports", "GET")
+    results["registry.inc"] = time_calls(
+        lambda: registry.inc("jiseti_http_requests_total", labels + ("200",)), args.iterations
+    )
+    results["registry.observe"] = time_calls(
+        lambda: registry.observe("jiseti_http_request_duration_seconds", labels, 0.012), args.iterations
+    )
+    print_table(f"x{args.iterations}", results)
+
+    on = results["GET /ping metrics=on"]["p50_us"]
+    off = results["GET /ping metrics=off"]["p50_us"]
+    print(f"\nInstrumentation overhead at p50: {on - off:.1f} us per request")
+
+
+if __name__ == "__main__":
+    main()
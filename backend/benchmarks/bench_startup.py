@@ -0,0 +1,125 @@
+"""Cold-start time and per-worker memory of the gunicorn deployment.
+
+Part 1 times ``import wsgi`` in a fresh interpreter, which is what every
+worker (or test module) pays. The ``schema at import`` variant also runs
+``init_db`` on that import, the way ``create_app`` used to.
+
+Part 2 boots gunicorn with and without ``preload_app`` and reads each
+worker's unique (private) and proportional memory from
+``/proc/<pid>/smaps_rollup`` (Linux only).
+
+    python -m benchmarks.bench_startup --workers 4
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks.common import BACKEND_DIR
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import wsgi
+{extra}
+print(time.perf_counter() - start)
+"""
+
+
+def cold_start(extra, runs, env):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET.format(extra=extra)],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(samples) * 1000
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def smaps(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as handle:
+        for line in handle:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return values
+
+
+def worker_memory(preload, workers, env):
+    port = free_port()
+    env = dict(env, PORT=str(port), WEB_CONCURRENCY=str(workers), GUNICORN_PRELOAD=str(preload).lower())
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "wsgi:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/ping", timeout=1).read()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.2)
+        # Let every worker finish booting before sampling.
+        time.sleep(2)
+        with open(f"/proc/{master.pid}/task/{master.pid}/children") as handle:
+            children = [int(pid) for pid in handle.read().split()]
+        rollups = [smaps(pid) for pid in children]
+        private = [r.get("Private_Clean", 0) + r.get("Private_Dirty", 0) for r in rollups]
+        pss = [r.get("Pss", 0) for r in rollups]
+        return statistics.fmean(private) / 1024, statistics.fmean(pss) / 1024, len(children)
+    finally:
+        master.terminate()
+        master.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file")
+    args = parser.parse_args()
+
+    instance_path = tempfile.mkdtemp(prefix="jiseti-bench-")
+    env = dict(
+        os.environ,
+        FLASK_INSTANCE_PATH=instance_path,
+        DATABASE_URL=args.database_url or f"sqlite:///{instance_path}/bench.db",
+    )
+    subprocess.run([sys.executable, "-m", "flask", "--app", "wsgi", "init-db"], cwd=BACKEND_DIR, env=env,
+                   check=True, capture_output=True)
+
+    print(f"\nCold start: median of {args.runs} fresh interpreters")
+    print(f"{'variant':<24}{'ms':>10}")
+    print(f"{'schema at import':<24}{cold_start('from app import init_db; init_db(wsgi.app)', args.runs, env):>10.1f}")
+    print(f"{'lazy create_app':<24}{cold_start('', args.runs, env):>10.1f}")
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("\n/proc/<pid>/smaps_rollup not available; skipping worker memory")
+        return
+
+    print(f"\nPer-worker memory, {args.workers} gunicorn workers")
+    print(f"{'variant':<24}{'private MiB':>14}{'PSS MiB':>10}")
+    for preload in (False, True):
+        private, pss, _ = worker_memory(preload, args.workers, env)
+        label = "preload_app" if preload else "import per worker"
+        print(f"{label:<24}{private:>14.1f}{pss:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Shared helpers for the scripts in ``backend/benchmarks``.
+
+Run a benchmark from the ``backend`` directory, e.g.::
+
+    python -m benchmarks.bench_auth_overhead
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def make_app(database_url: str = None, **config):
+    """Build an app against a throwaway instance directory and database."""
+    instance_path = tempfile.mkdtemp(prefix="jiseti-bench-")
+    os.environ["DATABASE_URL"] = database_url or f"sqlite:///{os.path.join(instance_path, 'bench.db')}"
+    os.environ["FLASK_INSTANCE_PATH"] = instance_path
+
+    from app import create_app
+    from models import db
+
+    app = create_app(instance_path)
+    app.config.update(TESTING=True, **config)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def summarize(samples):
+    """Return latency percentiles in microseconds for a list of seconds."""
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1e6
+
+    return {
+        "n": len(ordered),
+        "mean_us": statistics.fmean(ordered) * 1e6,
+        "p50_us": pct(0.50),
+        "p95_us": pct(0.95),
+        "p99_us": pct(0.99),
+    }
+
+
+def time_calls(fn, iterations: int, warmup: int = 50):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def print_table(title: str, rows: dict):
+    print(f"\n{title}")
+    print(f"{'variant':<28}{'mean us':>10}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}")
+    for name, stats in rows.items():
+        print(
+            f"{name:<28}{stats['mean_us']:>10.1f}{stats['p50_us']:>10.1f}"
+            f"{stats['p95_us']:>10.1f}{stats['p99_us']:>10.1f}"
+        )
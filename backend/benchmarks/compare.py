@@ -0,0 +1,60 @@
+"""Compare two :mod:`benchmarks.load_test` result files.
+
+    python -m benchmarks.compare before.json after.json
+
+Prints throughput and latency per scenario with the relative change.
+Exits non-zero if any scenario's p95 got worse by more than
+``--max-regression`` percent, so it can gate a CI job.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def change(before, after):
+    if not before:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(before, after):
+    rows = {}
+    for name in sorted(set(before["scenarios"]) & set(after["scenarios"])):
+        old, new = before["scenarios"][name], after["scenarios"][name]
+        rows[name] = {metric: (old.get(metric), new.get(metric), change(old.get(metric), new.get(metric)))
+                      for metric in METRICS if metric in old and metric in new}
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--max-regression", type=float, default=None, help="allowed p95 increase, in percent")
+    args = parser.parse_args()
+
+    with open(args.before) as handle:
+        before = json.load(handle)
+    with open(args.after) as handle:
+        after = json.load(handle)
+
+    print(f"{before.get('commit')} ({before.get('database')}) -> {after.get('commit')} ({after.get('database')})")
+    print(f"{'scenario':<16}{'metric':<16}{'before':>12}{'after':>12}{'change':>10}")
+    regressions = []
+    for name, metrics in compare(before, after).items():
+        for metric, (old, new, delta) in metrics.items():
+            delta_text = f"{delta:+.1f}%" if delta is not None else "n/a"
+            print(f"{name:<16}{metric:<16}{old:>12.2f}{new:>12.2f}{delta_text:>10}")
+            if metric == "p95_ms" and args.max_regression is not None and delta is not None \
+                    and delta > args.max_regression:
+                regressions.append(name)
+
+    if regressions:
+        print(f"\np95 regressed beyond {args.max_regression}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
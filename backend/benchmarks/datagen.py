@@ -0,0 +1,155 @@
+"""Bulk-generate users, reports and media rows for load testing.
+
+Rows go in through Core ``insert()`` in batches, so generating millions
+takes minutes rather than hours. Every user gets the same password hash
+(``PASSWORD``), computed once; hashing per row would dominate the run.
+The data is seeded, so two runs with the same arguments build the same
+database.
+
+    python -m benchmarks.datagen --database-url sqlite:////tmp/load.db \\
+        --users 100000 --reports 1000000 --media-per-report 1.5
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import BACKEND_DIR  # noqa: F401  (puts backend on sys.path)
+
+PASSWORD = "bench-password"
+REPORT_TYPES = ("corruption", "infrastructure", "intervention", "red-flag")
+STATUSES = ("pending", "under-investigation", "resolved", "rejected")
+LOCATIONS = ("Nairobi", "Mombasa", "Kisumu", "Nakuru", "Eldoret", "Thika", "Malindi", "Kitale", "Garissa", "Nyeri")
+WORDS = (
+    "road", "pothole", "bridge", "school", "hospital", "water", "bribe", "tender", "permit", "police",
+    "clinic", "drainage", "streetlight", "market", "county", "contract", "fund", "borehole", "power", "sewage",
+    "classroom", "ambulance", "land", "title", "license", "inspection", "budget", "procurement", "audit", "delay",
+)
+EXTENSIONS = ("png", "jpg", "mp4", "pdf")
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def user_rows(count, password_hash, start_id=1):
+    for user_id in range(start_id, start_id + count):
+        yield {
+            "id": user_id,
+            "username": f"user{user_id}",
+            "email": f"user{user_id}@example.com",
+            "password_hash": password_hash,
+            "role": "user",
+        }
+
+
+def report_rows(count, user_count, rng, start_id=1, now=None):
+    now = now or datetime.now(timezone.utc)
+    for report_id in range(start_id, start_id + count):
+        created = now - timedelta(seconds=rng.randrange(365 * 86400))
+        yield {
+            "id": report_id,
+            "type": rng.choice(REPORT_TYPES),
+            "title": sentence(rng, rng.randint(3, 8)),
+            "description": sentence(rng, rng.randint(15, 60)) + ".",
+            "location": rng.choice(LOCATIONS),
+            "status": rng.choice(STATUSES),
+            "created_by": rng.randint(1, user_count),
+            "created_at": created,
+            "updated_at": created,
+        }
+
+
+def media_rows(report_count, per_report, rng, start_id=1, now=None):
+    """``per_report`` may be fractional; it is the mean per report."""
+    now = now or datetime.now(timezone.utc)
+    media_id = start_id
+    for report_id in range(1, report_count + 1):
+        attachments = int(per_report) + (rng.random() < per_report % 1)
+        for _ in range(attachments):
+            extension = rng.choice(EXTENSIONS)
+            name = f"{media_id:012d}.{extension}"
+            yield {
+                "id": media_id,
+                "report_id": report_id,
+                "filename": name,
+                "original_filename": f"evidence-{media_id}.{extension}",
+                "file_path": f"uploads/{name}",
+                "file_size": rng.randint(20_000, 5_000_000),
+                "uploaded_at": now,
+            }
+            media_id += 1
+
+
+def insert_batches(conn, table, rows, batch_size, label=None):
+    batch, total, started = [], 0, time.perf_counter()
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.execute(table.insert(), batch)
+            total += len(batch)
+            batch = []
+            if label:
+                print(f"\r{label}: {total:,}", end="", flush=True)
+    if batch:
+        conn.execute(table.insert(), batch)
+        total += len(batch)
+    if label:
+        print(f"\r{label}: {total:,} in {time.perf_counter() - started:.1f}s")
+    return total
+
+
+def reset_sequences(conn):
+    """Move PostgreSQL id sequences past the explicit ids inserted here."""
+    if conn.dialect.name != "postgresql":
+        return
+    from sqlalchemy import text
+
+    for table in ("users", "reports", "report_media"):
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+        ))
+
+
+def generate(engine, users, reports, media_per_report, batch_size=10_000, seed=1, verbose=True):
+    """Drop and recreate the schema on ``engine`` and fill it."""
+    from models import db, hash_password, Report, ReportMedia, User
+
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    password_hash = hash_password(PASSWORD)
+    with engine.begin() as conn:
+        counts = {
+            "users": insert_batches(conn, User.__table__, user_rows(users, password_hash), batch_size,
+                                    "users" if verbose else None),
+            "reports": insert_batches(conn, Report.__table__, report_rows(reports, users, rng, now=now), batch_size,
+                                      "reports" if verbose else None),
+            "media": insert_batches(conn, ReportMedia.__table__, media_rows(reports, media_per_report, rng, now=now),
+                                    batch_size, "media" if verbose else None),
+        }
+        reset_sequences(conn)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--reports", type=int, default=100_000)
+    parser.add_argument("--media-per-report", type=float, default=1.0)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+
+    from database import normalize_url
+
+    engine = create_engine(normalize_url(args.database_url))
+    generate(engine, args.users, args.reports, args.media_per_report, args.batch_size, args.seed)
+
+
+if __name__ == "__main__":
+    main()
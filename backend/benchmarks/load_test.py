@@ -0,0 +1,302 @@
+"""Drive the real endpoints concurrently against a populated database.
+
+By default this generates a dataset with :mod:`benchmarks.datagen`,
+starts the app on a threaded HTTP server in a child process, and runs
+each scenario for ``--seconds`` with ``--concurrency`` client threads
+using keep-alive connections. ``--url`` targets a server that is
+already running, e.g. gunicorn on a staging box, and skips both the
+generation and the server.
+
+Results go to ``--output`` as JSON, one entry per scenario with request
+and error counts, throughput and latency percentiles, plus the commit,
+database backend and dataset size. Use :mod:`benchmarks.compare` to diff
+two runs::
+
+    python -m benchmarks.load_test --reports 1000000 --output before.json
+    python -m benchmarks.load_test --reports 1000000 --output after.json
+    python -m benchmarks.compare before.json after.json
+
+Run it once per database with ``--database-url`` (SQLite by default,
+``postgresql://...`` for PostgreSQL).
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.common import BACKEND_DIR, summarize
+from benchmarks.datagen import LOCATIONS, PASSWORD, REPORT_TYPES, STATUSES, WORDS
+
+
+def serve(database_url, instance_path, ready):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["FLASK_INSTANCE_PATH"] = instance_path
+    os.environ.setdefault("RATELIMIT_ENABLED", "false")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    from app import create_app, init_db
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    app = create_app()
+    init_db(app)
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=KeepAliveHandler)
+    ready.put(server.server_port)
+    server.serve_forever()
+
+
+class Client:
+    """One keep-alive connection, reopened if the server drops it."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=body, headers=headers or {})
+                response = self.conn.getresponse()
+                payload = response.read()
+                if response.getheader("Connection", "").lower() == "close":
+                    self.close()
+                return response.status, payload
+            except (ConnectionError, http.client.HTTPException):
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def login(client, user_id):
+    body = json.dumps({"email": f"user{user_id}@example.com", "password": PASSWORD})
+    status, payload = client.request("POST", "/api/v1/auth/login", body, {"Content-Type": "application/json"})
+    if status != 200:
+        raise RuntimeError(f"login for user{user_id} failed with {status}: {payload[:200]!r}")
+    return json.loads(payload)["access_token"]
+
+
+# Each scenario builds one request: (method, path, body, headers).
+def list_reports(rng, session):
+    return "GET", f"/api/v1/reports?page={rng.randint(1, 50)}&limit=10", None, {}
+
+
+def filter_reports(rng, session):
+    query = {"status": rng.choice(STATUSES), "type": rng.choice(REPORT_TYPES), "limit": 10}
+    return "GET", f"/api/v1/reports?{urlencode(query)}", None, {}
+
+
+def search_reports(rng, session):
+    return "GET", f"/api/v1/reports?{urlencode({'search': rng.choice(WORDS), 'limit': 10})}", None, {}
+
+
+def create_report(rng, session):
+    body, content_type = multipart(
+        {
+            "title": f"Load test {rng.choice(WORDS)}",
+            "description": " ".join(rng.choice(WORDS) for _ in range(30)),
+            "type": rng.choice(REPORT_TYPES),
+            "location": rng.choice(LOCATIONS),
+        },
+        {"media": ("evidence.png", session["media"])},
+    )
+    return "POST", "/api/v1/reports", body, {
+        "Content-Type": content_type,
+        "Authorization": f"Bearer {session['token']}",
+    }
+
+
+def login_request(rng, session):
+    body = json.dumps({"email": f"user{rng.randint(1, session['users'])}@example.com", "password": PASSWORD})
+    return "POST", "/api/v1/auth/login", body, {"Content-Type": "application/json"}
+
+
+SCENARIOS = {
+    "list_reports": list_reports,
+    "filter_reports": filter_reports,
+    "search_reports": search_reports,
+    "create_report": create_report,
+    "login": login_request,
+}
+
+
+def run_scenario(name, host, port, concurrency, seconds, users, media_bytes, seed):
+    build = SCENARIOS[name]
+    latencies, errors, lock = [], {}, threading.Lock()
+    start_barrier = threading.Barrier(concurrency + 1)
+    window = {}
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = Client(host, port)
+        session = {"users": users, "media": media_bytes}
+        if name == "create_report":
+            session["token"] = login(client, (index % users) + 1)
+        start_barrier.wait()
+        local, local_errors = [], {}
+        while time.perf_counter() < window["end"]:
+            method, path, body, headers = build(rng, session)
+            started = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, body, headers)
+            except Exception as exc:
+                status = type(exc).__name__
+            local.append(time.perf_counter() - started)
+            if not isinstance(status, int) or status >= 400:
+                local_errors[str(status)] = local_errors.get(str(status), 0) + 1
+        client.close()
+        with lock:
+            latencies.extend(local)
+            for key, count in local_errors.items():
+                errors[key] = errors.get(key, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    window["end"] = float("inf")
+    start_barrier.wait()
+    started = time.perf_counter()
+    window["end"] = started + seconds
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    result = {"requests": len(latencies), "errors": errors, "throughput_rps": round(len(latencies) / elapsed, 2)}
+    if latencies:
+        stats = summarize(latencies)
+        for key in ("mean", "p50", "p95", "p99"):
+            result[f"{key}_ms"] = round(stats[f"{key}_us"] / 1000, 3)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def backend_name(database_url):
+    from sqlalchemy.engine import make_url
+
+    return make_url(database_url).get_backend_name()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file")
+    parser.add_argument("--url", help="benchmark an already running server instead, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--reports", type=int, default=100_000)
+    parser.add_argument("--media-per-report", type=float, default=1.0)
+    parser.add_argument("--skip-generate", action="store_true", help="reuse the data already in --database-url")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--media-kb", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="JSON results file (default: benchmarks/results/<commit>-<backend>.json)")
+    args = parser.parse_args()
+
+    from database import normalize_url
+
+    instance_path = tempfile.mkdtemp(prefix="jiseti-load-")
+    database_url = normalize_url(args.database_url or f"sqlite:///{os.path.join(instance_path, 'load.db')}")
+    server = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        if not args.skip_generate:
+            from sqlalchemy import create_engine
+
+            from benchmarks.datagen import generate
+
+            engine = create_engine(database_url)
+            generate(engine, args.users, args.reports, args.media_per_report, seed=args.seed)
+            engine.dispose()
+        ctx = multiprocessing.get_context("spawn")
+        ready = ctx.Queue()
+        server = ctx.Process(target=serve, args=(database_url, instance_path, ready), daemon=True)
+        server.start()
+        host, port = "127.0.0.1", ready.get(timeout=60)
+
+    media_bytes = os.urandom(args.media_kb * 1024)
+    results = {}
+    try:
+        for name in args.scenarios.split(","):
+            name = name.strip()
+            results[name] = run_scenario(
+                name, host, port, args.concurrency, args.seconds, args.users, media_bytes, args.seed
+            )
+            stats = results[name]
+            print(
+                f"{name:<16}{stats['requests']:>8} req{stats['throughput_rps']:>10.1f} req/s"
+                f"  p50 {stats.get('p50_ms', 0):>8.2f} ms  p95 {stats.get('p95_ms', 0):>8.2f} ms"
+                f"  p99 {stats.get('p99_ms', 0):>8.2f} ms  errors {sum(stats['errors'].values())}"
+            )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join()
+
+    commit = git_commit()
+    backend = "remote" if args.url else backend_name(database_url)
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "database": backend,
+        "dataset": {"users": args.users, "reports": args.reports, "media_per_report": args.media_per_report},
+        "concurrency": args.concurrency,
+        "seconds": args.seconds,
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "scenarios": results,
+    }
+    output = args.output or os.path.join(BACKEND_DIR, "benchmarks", "results", f"{commit or 'local'}-{backend}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"\nwrote {output}")
+
+
+if __name__ == "__main__":
+    main()
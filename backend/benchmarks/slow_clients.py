@@ -0,0 +1,196 @@
+"""Hundreds of slow clients against gunicorn, sync vs gevent workers.
+
+Starts gunicorn (``gunicorn.conf.py``) on a generated dataset once per
+``--worker-class``. ``--slow-clients`` connections then trickle report
+uploads (``--chunk-kb`` every ``--interval`` seconds) or read a large
+media file at the same rate, like phones on a poor mobile link. Meanwhile
+one probe client times ``GET /api/v1/reports`` and ``GET /ping``. The
+probe's latency and error counts show whether the API stays responsive
+while the slow clients are connected.
+
+    python -m benchmarks.slow_clients --slow-clients 300 --seconds 20
+
+Requires gunicorn, and gevent for ``--worker-class gevent``.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.common import BACKEND_DIR, summarize
+from benchmarks.datagen import generate
+from benchmarks.load_test import Client, login, multipart
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(worker_class, workers, port, env):
+    env = {**env, "GUNICORN_WORKER_CLASS": worker_class, "WEB_CONCURRENCY": str(workers), "PORT": str(port)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "wsgi:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"gunicorn ({worker_class}) did not start")
+
+
+def slow_upload(host, port, token, size, chunk, interval, stop):
+    body, content_type = multipart(
+        {"title": "Slow upload", "description": "Sent over a poor link", "location": "Nairobi"},
+        {"media": ("clip.mp4", os.urandom(size))},
+    )
+    conn = http.client.HTTPConnection(host, port, timeout=120)
+    conn.putrequest("POST", "/api/v1/reports")
+    conn.putheader("Content-Type", content_type)
+    conn.putheader("Content-Length", str(len(body)))
+    conn.putheader("Authorization", f"Bearer {token}")
+    conn.endheaders()
+    for offset in range(0, len(body), chunk):
+        if stop.is_set():
+            break
+        conn.send(body[offset:offset + chunk])
+        time.sleep(interval)
+    else:
+        conn.getresponse().read()
+    conn.close()
+
+
+def slow_download(host, port, path, chunk, interval, stop):
+    conn = http.client.HTTPConnection(host, port, timeout=120)
+    conn.request("GET", path)
+    response = conn.getresponse()
+    while not stop.is_set() and response.read(chunk):
+        time.sleep(interval)
+    conn.close()
+
+
+def run(worker_class, args, env, media_path):
+    port = free_port()
+    server = start_gunicorn(worker_class, args.workers, port, env)
+    stop = threading.Event()
+    slow_errors = []
+    try:
+        setup = Client("127.0.0.1", port)
+        tokens = [login(setup, user_id) for user_id in range(1, 21)]
+        setup.close()
+
+        def slow_client(index):
+            time.sleep(random.Random(index).uniform(0, 2))
+            try:
+                while not stop.is_set():
+                    if index % 2:
+                        slow_upload("127.0.0.1", port, tokens[index % len(tokens)], args.upload_kb * 1024,
+                                    args.chunk_kb * 1024, args.interval, stop)
+                    else:
+                        slow_download("127.0.0.1", port, media_path, args.chunk_kb * 1024, args.interval, stop)
+            except Exception as exc:
+                slow_errors.append(type(exc).__name__)
+
+        threads = [threading.Thread(target=slow_client, args=(i,), daemon=True) for i in range(args.slow_clients)]
+        for thread in threads:
+            thread.start()
+        time.sleep(3)
+
+        probes = {"/api/v1/reports?limit=10": ([], {}), "/ping": ([], {})}
+        deadline = time.monotonic() + args.seconds
+        while time.monotonic() < deadline:
+            for path, (latencies, errors) in probes.items():
+                started = time.perf_counter()
+                try:
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=args.probe_timeout)
+                    conn.request("GET", path)
+                    status = conn.getresponse().status
+                    conn.close()
+                except Exception as exc:
+                    status = type(exc).__name__
+                latencies.append(time.perf_counter() - started)
+                if status != 200:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+            time.sleep(0.1)
+    finally:
+        stop.set()
+        server.terminate()
+        server.wait(timeout=30)
+
+    results = {}
+    for path, (latencies, errors) in probes.items():
+        stats = summarize(latencies)
+        results[path] = {
+            "requests": len(latencies),
+            "errors": errors,
+            **{f"{key}_ms": round(stats[f"{key}_us"] / 1000, 1) for key in ("p50", "p95", "p99")},
+        }
+    results["slow_client_errors"] = len(slow_errors)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--worker-class", action="append", help="sync and/or gevent (default: both)")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--slow-clients", type=int, default=300)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--upload-kb", type=int, default=512)
+    parser.add_argument("--media-mb", type=int, default=8)
+    parser.add_argument("--chunk-kb", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=0.2)
+    parser.add_argument("--probe-timeout", type=float, default=10)
+    parser.add_argument("--reports", type=int, default=5000)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    instance_path = tempfile.mkdtemp(prefix="jiseti-slow-")
+    database_url = f"sqlite:///{os.path.join(instance_path, 'slow.db')}"
+    from sqlalchemy import create_engine
+
+    engine = create_engine(database_url)
+    generate(engine, users=100, reports=args.reports, media_per_report=0, verbose=False)
+    engine.dispose()
+
+    uploads = os.path.join(instance_path, "uploads")
+    os.makedirs(uploads, exist_ok=True)
+    with open(os.path.join(uploads, "large.mp4"), "wb") as handle:
+        handle.write(os.urandom(args.media_mb * 1024 * 1024))
+
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "FLASK_INSTANCE_PATH": instance_path,
+        "RATELIMIT_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+        "MAX_UPLOAD_SIZE": str(64 * 1024 * 1024),
+    }
+    results = {}
+    for worker_class in args.worker_class or ["sync", "gevent"]:
+        results[worker_class] = run(worker_class, args, env, "/api/v1/media/large.mp4")
+        for path in ("/api/v1/reports?limit=10", "/ping"):
+            stats = results[worker_class][path]
+            print(
+                f"{worker_class:<8}{path:<28}{stats['requests']:>6} req  p50 {stats['p50_ms']:>8.1f} ms"
+                f"  p99 {stats['p99_ms']:>8.1f} ms  errors {sum(stats['errors'].values())}"
+            )
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump({"slow_clients": args.slow_clients, "workers": args.workers, "results": results}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
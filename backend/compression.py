@@ -0,0 +1,212 @@
+"""Negotiated gzip/brotli compression for ``/api/v1`` responses.
+
+``Compression(app)`` compresses textual responses (JSON, NDJSON, CSV,
+text) of at least ``COMPRESSION_MIN_SIZE`` bytes. It picks the encoding
+from ``Accept-Encoding``: brotli when the optional ``brotli`` package is
+installed and the client accepts it, otherwise gzip. Streamed responses
+are compressed chunk by chunk, with a sync flush after each chunk so
+clients keep receiving data as it is produced. File downloads
+(``send_file``) are passed through untouched, so range requests keep
+working.
+
+``cached_response`` caches whole ``200`` responses of a read endpoint per
+worker, keyed by path and query string. Each entry keeps the
+uncompressed body and every encoding that has been asked for, so a hit
+costs no compression CPU. An encoding is compressed once per cache fill,
+on the first request that wants it. Writes clear the cache with
+:func:`get_response_cache`, like the facet cache. Clients pinned to the
+primary after a write bypass it.
+
+Environment:
+
+``COMPRESSION_ENABLED``   ``false`` turns negotiation off (on).
+``COMPRESSION_MIN_SIZE``  smallest body worth compressing, bytes (1024).
+``COMPRESSION_LEVEL``     gzip level (6).
+``BROTLI_QUALITY``        brotli quality (5).
+``RESPONSE_CACHE_TTL``    seconds a cached response lives (10, 0 = off).
+"""
+import os
+import threading
+import zlib
+from functools import wraps
+
+from flask import current_app, request
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+try:
+    from .facets import FacetCache
+except ImportError:  # pragma: no cover - fallback for script execution
+    from facets import FacetCache
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/x-ndjson', 'application/xml', 'application/javascript', 'image/svg+xml',
+}
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encodings):
+    """Best supported encoding for an ``Accept-Encoding`` header, or ``None``."""
+    return accept_encodings.best_match(available_encodings())
+
+
+def compress(data, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config.get('BROTLI_QUALITY', 5))
+    encoder = zlib.compressobj(config.get('COMPRESSION_LEVEL', 6), zlib.DEFLATED, 31)
+    return encoder.compress(data) + encoder.flush()
+
+
+class _GzipStream:
+    def __init__(self, level):
+        self._encoder = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def process(self, data):
+        return self._encoder.compress(data) + self._encoder.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._encoder.flush()
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._encoder = brotli.Compressor(quality=quality)
+
+    def process(self, data):
+        return self._encoder.process(data) + self._encoder.flush()
+
+    def finish(self):
+        return self._encoder.finish()
+
+
+def _compress_stream(chunks, stream, charset):
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode(charset)
+        if chunk:
+            yield stream.process(chunk)
+    yield stream.finish()
+
+
+def _is_compressible(response):
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+
+def _add_vary(response):
+    if 'accept-encoding' not in {value.lower() for value in response.vary}:
+        response.vary.add('Accept-Encoding')
+
+
+class Compression:
+    def __init__(self, app):
+        app.config.setdefault('COMPRESSION_ENABLED', os.getenv('COMPRESSION_ENABLED', 'true').lower() != 'false')
+        app.config.setdefault('COMPRESSION_MIN_SIZE', int(os.getenv('COMPRESSION_MIN_SIZE', 1024)))
+        app.config.setdefault('COMPRESSION_LEVEL', int(os.getenv('COMPRESSION_LEVEL', 6)))
+        app.config.setdefault('BROTLI_QUALITY', int(os.getenv('BROTLI_QUALITY', 5)))
+        app.config.setdefault('RESPONSE_CACHE_TTL', float(os.getenv('RESPONSE_CACHE_TTL', 10)))
+        app.extensions['response_cache'] = FacetCache(app.config['RESPONSE_CACHE_TTL'])
+        app.after_request(self.compress_response)
+
+    def compress_response(self, response):
+        config = current_app.config
+        if (
+            not config['COMPRESSION_ENABLED']
+            or not request.path.startswith('/api/v1/')
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or 'no-transform' in (response.headers.get('Cache-Control') or '')
+            or not _is_compressible(response)
+        ):
+            return response
+
+        _add_vary(response)
+        length = response.calculate_content_length() if not response.is_streamed else None
+        if length is not None and length < config['COMPRESSION_MIN_SIZE']:
+            return response
+        encoding = negotiate(request.accept_encodings)
+        if encoding is None or request.method == 'HEAD':
+            return response
+
+        if response.is_streamed:
+            if encoding == 'br':
+                stream = _BrotliStream(config['BROTLI_QUALITY'])
+            else:
+                stream = _GzipStream(config['COMPRESSION_LEVEL'])
+            chunks = response.response
+            callbacks = [chunks.close] if hasattr(chunks, 'close') else []
+            response.response = ClosingIterator(_compress_stream(chunks, stream, 'utf-8'), callbacks)
+            response.headers.pop('Content-Length', None)
+        else:
+            response.set_data(compress(response.get_data(), encoding, config))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+class _CachedResponse:
+    def __init__(self, response):
+        self.status = response.status_code
+        self.mimetype = response.mimetype
+        self.body = response.get_data()
+        self.variants = {}
+        self._lock = threading.Lock()
+
+    def body_for(self, encoding):
+        variant = self.variants.get(encoding)
+        if variant is None:
+            with self._lock:
+                variant = self.variants.get(encoding)
+                if variant is None:
+                    variant = self.variants[encoding] = compress(self.body, encoding, current_app.config)
+        return variant
+
+    def to_response(self):
+        config = current_app.config
+        encoding = None
+        if config['COMPRESSION_ENABLED'] and len(self.body) >= config['COMPRESSION_MIN_SIZE']:
+            encoding = negotiate(request.accept_encodings)
+        response = current_app.response_class(
+            self.body_for(encoding) if encoding else self.body, status=self.status, mimetype=self.mimetype
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        _add_vary(response)
+        return response
+
+
+def _pinned_to_primary():
+    # Clients inside their read-your-writes window read the primary; the
+    # cache holds what everyone else sees, so they bypass it.
+    router = current_app.extensions.get('replica_router')
+    return bool(router and router.engines and router.is_sticky())
+
+
+def cached_response(view):
+    """Serve a ``GET`` view from the per-worker precompressed cache."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = get_response_cache()
+        if request.method != 'GET' or cache.ttl <= 0 or _pinned_to_primary():
+            return view(*args, **kwargs)
+        key = request.full_path
+        entry = cache.get(key)
+        if entry is None:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            entry = _CachedResponse(response)
+            cache.set(key, entry)
+        return entry.to_response()
+    return wrapper
+
+
+def get_response_cache():
+    return current_app.extensions['response_cache']
@@ -0,0 +1,59 @@
+"""CORS preflights answered before Flask sees the request.
+
+A preflight is an ``OPTIONS`` request to ``/api/...`` that carries
+``Access-Control-Request-Method``. ``Preflight(app)`` wraps the WSGI app
+and answers these with an empty ``204``. There is no routing, no
+request context and no ``before_request`` hooks, so rate limiting and
+metrics do not see them. Allowed origins get the CORS headers and
+``Access-Control-Max-Age``. The browser then reuses the answer for that
+long instead of preflighting every call. Chromium caps the cache at two
+hours and Firefox at a day. Other origins get a ``204`` with no CORS
+headers, which the browser treats as a refusal.
+
+Every other request, including a plain ``OPTIONS``, goes through to the
+app. ``flask_cors`` still adds the headers to actual responses.
+
+Configuration:
+
+``CORS_ORIGINS``   allowed origins (set by ``create_app`` from the env).
+``CORS_METHODS``   methods a preflight may ask for.
+``CORS_MAX_AGE``   seconds browsers may cache a preflight (86400).
+"""
+import os
+
+VARY = 'Origin, Access-Control-Request-Method, Access-Control-Request-Headers'
+
+
+class Preflight:
+    def __init__(self, app):
+        app.config.setdefault('CORS_MAX_AGE', int(os.getenv('CORS_MAX_AGE', 86400)))
+        self.config = app.config
+        app.wsgi_app = self.middleware(app.wsgi_app)
+
+    def middleware(self, wsgi_app):
+        def preflight(environ, start_response):
+            method = environ.get('HTTP_ACCESS_CONTROL_REQUEST_METHOD')
+            if (
+                method is None
+                or environ.get('REQUEST_METHOD') != 'OPTIONS'
+                or not environ.get('PATH_INFO', '').startswith('/api/')
+            ):
+                return wsgi_app(environ, start_response)
+
+            config = self.config
+            origin = environ.get('HTTP_ORIGIN')
+            headers = [('Vary', VARY), ('Content-Length', '0')]
+            if origin in config['CORS_ORIGINS'] and method.upper() in config['CORS_METHODS']:
+                headers += [
+                    ('Access-Control-Allow-Origin', origin),
+                    ('Access-Control-Allow-Credentials', 'true'),
+                    ('Access-Control-Allow-Methods', ', '.join(config['CORS_METHODS'])),
+                    ('Access-Control-Max-Age', str(config['CORS_MAX_AGE'])),
+                ]
+                requested_headers = environ.get('HTTP_ACCESS_CONTROL_REQUEST_HEADERS')
+                if requested_headers:
+                    headers.append(('Access-Control-Allow-Headers', requested_headers))
+            start_response('204 No Content', headers)
+            return []
+
+        return preflight
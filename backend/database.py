@@ -0,0 +1,149 @@
+"""Engine profile: connection pooling, timeouts and SQLite pragmas.
+
+``create_app`` feeds :func:`engine_options` into
+``SQLALCHEMY_ENGINE_OPTIONS`` and calls :func:`configure_engine` once the
+engine exists. Everything is driven by environment variables so the same
+build runs on SQLite locally and PostgreSQL on Render:
+
+``DB_ENGINE_PROFILE``       ``tuned`` (default) or ``default`` to keep
+                            SQLAlchemy's stock settings.
+``DB_POOL_SIZE``            persistent connections per worker (5).
+``DB_MAX_OVERFLOW``         extra connections under burst load (10).
+``DB_POOL_TIMEOUT``         seconds to wait for a free connection (30).
+``DB_POOL_RECYCLE``         recycle connections older than this (1800s).
+``DB_POOL_PRE_PING``        test connections on checkout (true).
+``DB_STATEMENT_TIMEOUT_MS`` abort statements running longer (30000, 0=off).
+``SQLITE_BUSY_TIMEOUT_MS``  wait this long on a locked database (5000).
+``SQLITE_JOURNAL_MODE``     journal mode, WAL by default.
+``SQLITE_SYNCHRONOUS``      ``NORMAL`` is safe with WAL and much faster.
+"""
+import os
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import make_url
+
+
+def normalize_url(database_url):
+    """Force the psycopg 3 driver for plain ``postgresql://`` URLs."""
+    if database_url.startswith('postgresql://'):
+        return database_url.replace('postgresql://', 'postgresql+psycopg://', 1)
+    return database_url
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def profile_enabled():
+    return os.getenv('DB_ENGINE_PROFILE', 'tuned').lower() != 'default'
+
+
+def _is_sqlite(database_url):
+    return make_url(database_url).get_backend_name() == 'sqlite'
+
+
+def _is_memory_sqlite(database_url):
+    url = make_url(database_url)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(database_url):
+    """Return ``SQLALCHEMY_ENGINE_OPTIONS`` for ``database_url``."""
+    if not profile_enabled():
+        return {}
+
+    options = {
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True),
+    }
+
+    if _is_sqlite(database_url):
+        if not _is_memory_sqlite(database_url):
+            # sqlite3's own lock wait, in seconds, on top of busy_timeout.
+            options['connect_args'] = {'timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000}
+        return options
+
+    options.update({
+        'pool_size': _env_int('DB_POOL_SIZE', 5),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+    })
+
+    if make_url(database_url).get_backend_name() == 'postgresql':
+        statement_timeout = _env_int('DB_STATEMENT_TIMEOUT_MS', 30000)
+        server_options = [f'-c idle_in_transaction_session_timeout={_env_int("DB_IDLE_TX_TIMEOUT_MS", 60000)}']
+        if statement_timeout:
+            server_options.append(f'-c statement_timeout={statement_timeout}')
+        options['connect_args'] = {
+            'options': ' '.join(server_options),
+            'application_name': os.getenv('DB_APPLICATION_NAME', 'jiseti-backend'),
+        }
+
+    return options
+
+
+def configure_engine(engine):
+    """Install per-connection settings that cannot go through create_engine."""
+    if not profile_enabled() or engine.dialect.name != 'sqlite':
+        return
+
+    busy_timeout = _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    journal_mode = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    synchronous = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    statement_timeout = _env_int('DB_STATEMENT_TIMEOUT_MS', 30000) / 1000
+    is_memory = engine.url.database in (None, '', ':memory:')
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA busy_timeout={busy_timeout}')
+        if not is_memory:
+            cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.close()
+
+        if statement_timeout:
+            # SQLite has no statement_timeout; abort from the VM progress
+            # callback once the deadline set in before_cursor_execute passes.
+            deadline = connection_record.info
+
+            def check_deadline():
+                expires = deadline.get('statement_deadline')
+                return 1 if expires is not None and time.monotonic() > expires else 0
+
+            dbapi_connection.set_progress_handler(check_deadline, 10000)
+
+    if statement_timeout:
+        @event.listens_for(engine, 'before_cursor_execute')
+        def start_statement_clock(conn, cursor, statement, parameters, context, executemany):
+            conn.info['statement_deadline'] = time.monotonic() + statement_timeout
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def stop_statement_clock(conn, cursor, statement, parameters, context, executemany):
+            conn.info.pop('statement_deadline', None)
+
+
+def missing_tables(engine, tables):
+    """The names in ``tables`` that do not exist in ``engine``'s database."""
+    inspector = inspect(engine)
+    return [name for name in tables if not inspector.has_table(name)]
+
+
+def pool_stats(engine):
+    """Snapshot of pool utilisation for ``engine``."""
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    if 'size' in stats and 'checkedout' in stats:
+        capacity = stats['size'] + max(getattr(pool, '_max_overflow', 0), 0)
+        stats['capacity'] = capacity
+        stats['utilisation'] = round(stats['checkedout'] / capacity, 3) if capacity else 0.0
+    return stats
@@ -0,0 +1,107 @@
+"""Facet counts for report listings.
+
+``facet_counts`` returns, for each requested column, how many reports
+matching the current filters have each value. All facets come back from
+one statement: ``GROUP BY GROUPING SETS`` on PostgreSQL, and a
+``UNION ALL`` of one ``GROUP BY`` per facet elsewhere.
+
+Results are cached per worker in a small LRU keyed by the filter values.
+An entry lives for ``FACET_CACHE_TTL`` seconds, and writes made by this
+worker clear the cache at once.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import func, literal, select, union_all
+
+try:
+    from .models import db, Report
+except ImportError:  # pragma: no cover - fallback for script execution
+    from models import db, Report
+
+FACET_FIELDS = ('status', 'type')
+
+
+def parse_facets(value):
+    """Split ``"status,type"``; raises ``ValueError`` on unknown names."""
+    names = [name.strip() for name in (value or '').split(',') if name.strip()]
+    unknown = [name for name in names if name not in FACET_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown facet: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(names))
+
+
+def facet_statement(criteria, fields, dialect_name):
+    """The single aggregate statement behind :func:`facet_counts`."""
+    columns = [getattr(Report, field) for field in fields]
+    if dialect_name == 'postgresql':
+        # GROUPING(col) is 0 in the rows grouped by that column.
+        return (
+            select(*[func.grouping(column) for column in columns], *columns, func.count())
+            .where(*criteria)
+            .group_by(func.grouping_sets(*columns))
+        )
+    return union_all(*[
+        select(literal(field).label('facet'), column.label('value'), func.count().label('count'))
+        .where(*criteria)
+        .group_by(column)
+        for field, column in zip(fields, columns)
+    ])
+
+
+def facet_counts(criteria, fields):
+    """Return ``{field: {value: count}}`` for reports matching ``criteria``."""
+    if not fields:
+        return {}
+    dialect_name = db.session.get_bind(clause=select(Report.id)).dialect.name
+    rows = db.session.execute(facet_statement(criteria, fields, dialect_name))
+    results = {field: {} for field in fields}
+    if dialect_name == 'postgresql':
+        for row in rows:
+            flags, values, count = row[:len(fields)], row[len(fields):-1], row[-1]
+            for field, flag, value in zip(fields, flags, values):
+                if flag == 0:
+                    results[field][value] = count
+    else:
+        for facet, value, count in rows:
+            results[facet][value] = count
+    return results
+
+
+class FacetCache:
+    def __init__(self, ttl=30.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def get_facet_cache():
+    return current_app.extensions['facet_cache']
@@ -0,0 +1,64 @@
+"""Gunicorn settings for production (`gunicorn -c gunicorn.conf.py wsgi:app`).
+
+The app is preloaded in the master so every worker shares its imported
+modules copy-on-write instead of importing Flask and SQLAlchemy again.
+Set GUNICORN_PRELOAD=false to go back to importing per worker.
+
+GUNICORN_WORKER_CLASS=gevent switches to cooperative workers: each one
+serves up to GUNICORN_WORKER_CONNECTIONS clients at once, so slow
+uploads and media downloads wait on their sockets without pinning a
+worker. The standard library is patched here, before the app is
+preloaded, so the locks and sockets it creates are gevent-aware.
+Requires the gevent package; see also ``wsgi_gevent.py``.
+"""
+import gc
+import os
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+if worker_class == "gevent":
+    from gevent import monkey
+
+    monkey.patch_all()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("GUNICORN_THREADS", 1))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() != "false"
+
+
+def on_starting(server):
+    # Per-worker metric snapshots from a previous run would be summed
+    # into this one's totals; start from a clean directory.
+    metrics_dir = os.getenv("METRICS_DIR") or os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.startswith("metrics-") and name.endswith(".json"):
+                os.remove(os.path.join(metrics_dir, name))
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far into the permanent generation so
+    # the collector does not touch (and copy) those pages in the workers.
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections must never be shared across processes. create_app does
+    # not open any, but drop whatever the master might hold to be safe.
+    if not preload_app:
+        return
+    from models import db
+
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Build the typeahead index while the worker waits for its first
+    # request rather than on the first keystroke.
+    app = worker.app.wsgi()
+    app.extensions["typeahead"].start(app)
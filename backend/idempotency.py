@@ -0,0 +1,220 @@
+"""Idempotency keys for report writes.
+
+Clients send ``Idempotency-Key: <unique value>`` with ``POST
+/api/v1/reports`` or ``PUT /api/v1/reports/<id>`` and send the same key
+again on retries. The first request claims the key by inserting an
+``idempotency_keys`` row, runs, and stores its response on that row.
+Later requests with the same user, endpoint and key:
+
+* get the stored response back with ``Idempotent-Replayed: true`` once
+  the first request has finished. The view does not run again, so no
+  report is inserted and no file is written;
+* wait while the first request is still running. A request in the same
+  worker wakes them at once; across workers they poll the row. After
+  ``IDEMPOTENCY_WAIT_SECONDS`` they get ``409`` with ``Retry-After``.
+  They give their admission slot back while they wait;
+* get ``422`` if their body differs from the first request's.
+
+The fingerprint is the SHA-256 of the JSON body. For multipart bodies
+it is taken over the form fields plus the name and digest of every
+file, so a retry with a new boundary still matches. A 5xx response
+releases the key so the retry runs again. A claim older than
+``IDEMPOTENCY_LOCK_TIMEOUT`` seconds belongs to a worker that died and
+can be taken over. Keys expire after ``IDEMPOTENCY_KEY_TTL`` hours;
+``flask --app wsgi purge-idempotency-keys`` deletes expired rows.
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from .models import db, IdempotencyKey
+except ImportError:  # pragma: no cover - fallback for script execution
+    from models import db, IdempotencyKey
+
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.1
+
+# (user_id, scope, key) -> Event set when this worker's request finishes.
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _as_utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def request_fingerprint():
+    digest = hashlib.sha256()
+    if request.mimetype == 'multipart/form-data':
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(json.dumps(['field', name, value]).encode())
+        files = sorted(request.files.items(multi=True), key=lambda item: (item[0], item[1].filename or ''))
+        for name, storage in files:
+            file_digest = hashlib.sha256()
+            for chunk in iter(lambda: storage.stream.read(64 * 1024), b''):
+                file_digest.update(chunk)
+            storage.stream.seek(0)
+            digest.update(json.dumps(['file', name, storage.filename, file_digest.hexdigest()]).encode())
+    else:
+        payload = request.get_json(silent=True)
+        if payload is not None:
+            digest.update(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode())
+        else:
+            digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _find(user_id, scope, key):
+    return IdempotencyKey.query.filter_by(user_id=user_id, scope=scope, key=key).first()
+
+
+def _try_claim(user_id, scope, key, fingerprint):
+    record = IdempotencyKey(
+        user_id=user_id, scope=scope, key=key, fingerprint=fingerprint, locked_at=datetime.now(timezone.utc)
+    )
+    db.session.add(record)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request claimed it first; the caller looks again.
+        db.session.rollback()
+        return None
+    return record.id
+
+
+def _release(record_id, locked_at=None):
+    statement = delete(IdempotencyKey).where(IdempotencyKey.id == record_id)
+    if locked_at is not None:
+        # Only if nobody took it over in the meantime.
+        statement = statement.where(IdempotencyKey.locked_at == locked_at)
+    db.session.execute(statement)
+    db.session.commit()
+
+
+def _store(record_id, response):
+    db.session.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.id == record_id)
+        .values(
+            response_status=response.status_code,
+            response_body=response.get_data(as_text=True),
+            response_mimetype=response.mimetype,
+        )
+    )
+    db.session.commit()
+
+
+def _replay(record):
+    response = current_app.response_class(
+        record.response_body, status=record.response_status, mimetype=record.response_mimetype
+    )
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _is_abandoned(record, config):
+    now = datetime.now(timezone.utc)
+    if now - _as_utc(record.created_at) > timedelta(hours=config['IDEMPOTENCY_KEY_TTL']):
+        return True
+    return (
+        record.response_status is None
+        and now - _as_utc(record.locked_at) > timedelta(seconds=config['IDEMPOTENCY_LOCK_TIMEOUT'])
+    )
+
+
+def _execute(view, args, kwargs, ident, record_id):
+    finished = threading.Event()
+    with _inflight_lock:
+        _inflight[ident] = finished
+    try:
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            _release(record_id)
+            raise
+        if response.status_code >= 500 or response.is_streamed:
+            _release(record_id)
+        else:
+            _store(record_id, response)
+        return response
+    finally:
+        with _inflight_lock:
+            _inflight.pop(ident, None)
+        finished.set()
+
+
+def idempotent(view):
+    """Honour ``Idempotency-Key`` on a ``jwt_required`` write view."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return view(*args, **kwargs)
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters'}), 400
+
+        config = current_app.config
+        user_id = int(get_jwt_identity())
+        scope = f'{request.method} {request.path}'
+        ident = (user_id, scope, key)
+        fingerprint = request_fingerprint()
+        deadline = time.monotonic() + config['IDEMPOTENCY_WAIT_SECONDS']
+
+        while True:
+            record = _find(user_id, scope, key)
+            if record is None:
+                record_id = _try_claim(user_id, scope, key, fingerprint)
+                if record_id is not None:
+                    return _execute(view, args, kwargs, ident, record_id)
+                continue
+            if _is_abandoned(record, config):
+                _release(record.id, record.locked_at)
+                continue
+            if record.fingerprint != fingerprint:
+                return jsonify({'error': 'Idempotency-Key was already used with a different request'}), 422
+            if record.response_status is not None:
+                return _replay(record)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                response = jsonify({'error': 'A request with this Idempotency-Key is still in progress'})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            # End the read so the wait does not hold a pooled connection,
+            # nor an admission slot that the same connection stands for.
+            db.session.rollback()
+            admission = current_app.extensions.get('admission')
+            if admission is not None:
+                admission.suspend()
+            with _inflight_lock:
+                running = _inflight.get(ident)
+            if running is not None:
+                running.wait(min(remaining, 5.0))
+            else:
+                time.sleep(min(remaining, POLL_INTERVAL))
+            if admission is not None:
+                busy = admission.resume()
+                if busy is not None:
+                    return busy
+    return wrapper
+
+
+def purge_expired_keys(ttl_hours=None):
+    """Delete keys older than ``IDEMPOTENCY_KEY_TTL`` hours; returns the count."""
+    if ttl_hours is None:
+        ttl_hours = current_app.config['IDEMPOTENCY_KEY_TTL']
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=ttl_hours)
+    deleted = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff)).rowcount
+    db.session.commit()
+    return deleted
@@ -0,0 +1,81 @@
+"""Import incident reports from a partner agency's CSV or NDJSON dump.
+
+CSV files need a header row with ``title`` and ``description`` and may
+carry ``type``, ``location``, ``status``, ``created_at`` (ISO 8601) and the
+agency's own ``external_id``. NDJSON files carry the same keys, one JSON
+object per line. Rows already imported from the same ``--source`` are
+skipped, so a dump can safely be sent again.
+
+    python import_reports.py nairobi-2025-06.csv --source nairobi-county --owner-email ops@jiseti.com
+"""
+import argparse
+import json
+import sys
+
+from app import create_app
+from database import missing_tables
+from models import db, User
+from provisioning import detect_format
+from report_import import import_reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import Jiseti reports.")
+    parser.add_argument("path", help="CSV or NDJSON file, or - for stdin")
+    parser.add_argument("--source", required=True, help="agency the dump came from; scopes duplicate detection")
+    parser.add_argument("--owner-email", required=True, help="account the imported reports belong to")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--errors", help="write per-row errors to this NDJSON file")
+    parser.add_argument("--max-errors", type=int, default=100_000, help="row errors to keep in memory")
+    parser.add_argument("--skip-similarity-index", action="store_true",
+                        help="faster; run `flask --app wsgi index-duplicates` afterwards")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+
+    def progress(processed, created, duplicates, failed):
+        print(
+            f"\r  processed {processed}  created {created}  duplicates {duplicates}  failed {failed}",
+            end="", flush=True,
+        )
+
+    app = create_app()
+    with app.app_context():
+        # Creating the schema is `init-db`'s job, not a side effect of an import.
+        missing = missing_tables(db.engine, db.metadata.tables)
+        if missing:
+            sys.exit(f"Missing tables: {', '.join(missing)}. Run `flask --app wsgi init-db` first.")
+        owner = User.query.filter_by(email=args.owner_email).first()
+        if owner is None:
+            sys.exit(f"No user with email {args.owner_email}")
+        options = dict(source=args.source, owner_id=owner.id, fmt=fmt, batch_size=args.batch_size,
+                       progress=progress, max_errors=args.max_errors,
+                       index_similarity=not args.skip_similarity_index)
+        if args.path == "-":
+            summary = import_reports(sys.stdin, **options)
+        else:
+            with open(args.path, encoding="utf-8", newline="") as handle:
+                summary = import_reports(handle, **options)
+
+    print()
+    print(
+        f"✅ Created {summary['created']} of {summary['total']} reports "
+        f"({summary['duplicates']} duplicates, {summary['failed']} failed)"
+    )
+    if args.errors:
+        with open(args.errors, "w", encoding="utf-8") as handle:
+            for error in summary["errors"]:
+                handle.write(json.dumps(error) + "\n")
+        print(f"   Row errors written to {args.errors}")
+        if summary["errors_truncated"]:
+            print(f"   Only the first {len(summary['errors'])} errors were kept (see --max-errors)")
+    else:
+        for error in summary["errors"][:20]:
+            print(f"   line {error['row']}: {error['error']}")
+        if summary["failed"] > 20:
+            print(f"   ... {summary['failed'] - 20} more (use --errors to save them all)")
+
+
+if __name__ == "__main__":
+    main()
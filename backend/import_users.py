@@ -0,0 +1,60 @@
+"""Import user accounts from a CSV or NDJSON file.
+
+CSV files need a header row with ``username``, ``email`` and ``password``
+(or a pre-computed werkzeug ``password_hash``) and an optional ``role``.
+NDJSON files carry the same keys, one JSON object per line.
+
+    python import_users.py county-office.csv --workers 8
+"""
+import argparse
+import json
+import sys
+
+from app import create_app
+from database import missing_tables
+from models import db
+from provisioning import detect_format, import_users
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-create Jiseti user accounts.")
+    parser.add_argument("path", help="CSV or NDJSON file, or - for stdin")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="defaults to the file extension")
+    parser.add_argument("--workers", type=int, default=None, help="password hashing processes")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--errors", help="write per-row errors to this NDJSON file")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+
+    def progress(processed, created, failed):
+        print(f"\r  processed {processed}  created {created}  failed {failed}", end="", flush=True)
+
+    app = create_app()
+    with app.app_context():
+        # Creating the schema is `init-db`'s job, not a side effect of an import.
+        missing = missing_tables(db.engine, db.metadata.tables)
+        if missing:
+            sys.exit(f"Missing tables: {', '.join(missing)}. Run `flask --app wsgi init-db` first.")
+        if args.path == "-":
+            summary = import_users(sys.stdin, fmt, args.batch_size, args.workers, progress)
+        else:
+            with open(args.path, encoding="utf-8", newline="") as handle:
+                summary = import_users(handle, fmt, args.batch_size, args.workers, progress)
+
+    print()
+    print(f"✅ Created {summary['created']} of {summary['total']} users ({summary['failed']} failed)")
+    if args.errors:
+        with open(args.errors, "w", encoding="utf-8") as handle:
+            for error in summary["errors"]:
+                handle.write(json.dumps(error) + "\n")
+        print(f"   Row errors written to {args.errors}")
+    else:
+        for error in summary["errors"][:20]:
+            print(f"   line {error['row']}: {error['error']}")
+        if summary["failed"] > 20:
+            print(f"   ... {summary['failed'] - 20} more (use --errors to save them all)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Structured, non-blocking logging.
+
+:func:`configure_logging` routes the root logger through a bounded queue.
+Request threads only sample, redact and enqueue a record; a background
+thread serialises it to JSON and writes it out. When the queue is full the
+record is dropped and counted rather than blocking the request.
+
+Environment:
+
+``LOG_LEVEL``         root level (``INFO``).
+``LOG_FORMAT``        ``json`` (default) or ``text``.
+``LOG_QUEUE_SIZE``    records buffered before dropping (10000).
+``LOG_SAMPLE_RATES``  per-logger keep ratio for records below WARNING,
+                      e.g. ``app=0.1,werkzeug=0.01``. Child loggers
+                      inherit their parent's rate.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+REDACTED = '[REDACTED]'
+SENSITIVE_KEYS = {
+    'password', 'password_hash', 'new_password', 'token', 'access_token',
+    'refresh_token', 'authorization', 'secret', 'jwt_secret_key', 'cookie',
+}
+SENSITIVE_PATTERNS = [
+    # 'password': 'hunter2' / "token": "..." as produced by dict reprs and JSON
+    (re.compile(r"""(['"]?(?:%s)['"]?\s*[:=]\s*)(['"])(?:(?!\2).)*\2""" % '|'.join(SENSITIVE_KEYS), re.I), r'\1\2' + REDACTED + r'\2'),
+    (re.compile(r'(Bearer\s+)[A-Za-z0-9._~+/=-]+'), r'\1' + REDACTED),
+]
+
+# Attributes every LogRecord has; anything else came in through ``extra``.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+def redact(value):
+    """Return ``value`` with secrets masked, recursing into containers."""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if str(key).lower() in SENSITIVE_KEYS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        for pattern, replacement in SENSITIVE_PATTERNS:
+            value = pattern.sub(replacement, value)
+    return value
+
+
+class LogStats:
+    def __init__(self):
+        self.enqueued = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self._lock = threading.Lock()
+
+    def incr(self, name):
+        # Request threads log concurrently; ``+=`` alone can lose counts.
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self, log_queue=None):
+        stats = {
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'sampled_out': self.sampled_out,
+        }
+        if log_queue is not None:
+            stats['queue_depth'] = log_queue.qsize()
+        return stats
+
+
+stats = LogStats()
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of sub-WARNING records per logger name."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self._cache = {}
+
+    def _rate_for(self, name):
+        rate = self._cache.get(name)
+        if rate is None:
+            rate, probe = 1.0, name
+            while probe:
+                if probe in self.rates:
+                    rate = self.rates[probe]
+                    break
+                probe = probe.rpartition('.')[0]
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate_for(record.name)
+        if rate >= 1 or random.random() < rate:
+            return True
+        stats.incr('sampled_out')
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class StderrHandler(logging.StreamHandler):
+    """Write to whatever ``sys.stderr`` is when the record is emitted."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self):
+        return sys.stderr
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that does the minimum on the calling thread."""
+
+    def prepare(self, record):
+        # Resolve the message now (args may be mutated later) but leave JSON
+        # encoding to the writer thread. Tracebacks hold live frames, so
+        # they have to be rendered here.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        for key, value in list(vars(record).items()):
+            if key not in _RECORD_ATTRS:
+                setattr(record, key, redact(value))
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            stats.incr('enqueued')
+        except queue.Full:
+            stats.incr('dropped')
+
+
+_lock = threading.Lock()
+_state = {}
+
+
+def _start_listener(handler, sink):
+    listener = logging.handlers.QueueListener(handler.queue, sink, respect_handler_level=True)
+    listener.start()
+    _state['listener'] = listener
+
+
+def _restart_after_fork():
+    # The writer thread does not survive fork(); give the child a fresh
+    # queue and thread of its own.
+    handler = _state.get('handler')
+    if handler is None:
+        return
+    handler.queue = queue.Queue(handler.queue.maxsize)
+    _start_listener(handler, _state['sink'])
+
+
+def configure_logging(level=None, fmt=None, queue_size=None, sample_rates=None, stream=None):
+    """Install the queue-backed pipeline on the root logger (idempotent)."""
+    with _lock:
+        if 'handler' in _state:
+            return _state['handler']
+
+        level = level or os.getenv('LOG_LEVEL', 'INFO')
+        fmt = fmt or os.getenv('LOG_FORMAT', 'json')
+        queue_size = queue_size or int(os.getenv('LOG_QUEUE_SIZE', 10000))
+        if sample_rates is None:
+            sample_rates = parse_sample_rates(os.getenv('LOG_SAMPLE_RATES', ''))
+
+        sink = logging.StreamHandler(stream) if stream is not None else StderrHandler()
+        if fmt == 'json':
+            sink.setFormatter(JsonFormatter())
+        else:
+            sink.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+        handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+        handler.addFilter(SamplingFilter(sample_rates))
+
+        root = logging.getLogger()
+        # Drop the plain stderr handler logging.basicConfig installs, but
+        # leave subclasses alone (pytest's capture handler is one).
+        for existing in list(root.handlers):
+            if type(existing) is logging.StreamHandler:
+                root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level)
+
+        _state.update(handler=handler, sink=sink)
+        _start_listener(handler, sink)
+        os.register_at_fork(after_in_child=_restart_after_fork)
+        atexit.register(shutdown_logging)
+        return handler
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    listener = _state.pop('listener', None)
+    if listener is not None:
+        listener.stop()
+
+
+def parse_sample_rates(value):
+    rates = {}
+    for item in value.split(','):
+        name, _, rate = item.partition('=')
+        if name.strip() and rate.strip():
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+def logging_stats():
+    handler = _state.get('handler')
+    return stats.as_dict(handler.queue if handler else None)
@@ -0,0 +1,334 @@
+"""Prometheus-style metrics for requests, SQL statements and uploads.
+
+Each worker keeps its metrics in memory. When ``METRICS_DIR`` (or
+``PROMETHEUS_MULTIPROC_DIR``) is set, every worker also writes a snapshot
+to ``<dir>/metrics-<pid>.json`` at most once per ``METRICS_FLUSH_INTERVAL``
+seconds. ``/metrics`` then sums the snapshots of all workers. Counters and
+histograms of exited workers are kept, so totals never go backwards;
+gauges only count live workers.
+"""
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from contextvars import ContextVar
+
+from flask import Response, current_app, request
+from sqlalchemy import event
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    from .database import pool_stats
+    from .logging_setup import logging_stats
+    from .models import db
+except ImportError:  # pragma: no cover - fallback for script execution
+    from database import pool_stats
+    from logging_setup import logging_stats
+    from models import db
+
+_request_state = ContextVar('jiseti_metrics_request', default=None)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> {'type', 'help', 'buckets', 'values': {labels: value}}
+        self._metrics = {}
+
+    def _metric(self, name, kind, help_text, buckets=None):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = {'type': kind, 'help': help_text, 'buckets': buckets, 'values': {}}
+        return metric
+
+    def counter(self, name, help_text):
+        self._metric(name, 'counter', help_text)
+
+    def gauge(self, name, help_text):
+        self._metric(name, 'gauge', help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self._metric(name, 'histogram', help_text, list(buckets))
+
+    def inc(self, name, labels=(), amount=1):
+        values = self._metrics[name]['values']
+        with self._lock:
+            values[labels] = values.get(labels, 0) + amount
+
+    def set(self, name, labels=(), value=0):
+        with self._lock:
+            self._metrics[name]['values'][labels] = value
+
+    def observe(self, name, labels, value):
+        metric = self._metrics[name]
+        index = bisect.bisect_left(metric['buckets'], value)
+        with self._lock:
+            state = metric['values'].get(labels)
+            if state is None:
+                state = metric['values'][labels] = [[0] * (len(metric['buckets']) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    'type': metric['type'],
+                    'help': metric['help'],
+                    'buckets': metric['buckets'],
+                    'values': [
+                        [list(labels), [list(value[0]), value[1], value[2]] if metric['type'] == 'histogram' else value]
+                        for labels, value in metric['values'].items()
+                    ],
+                }
+                for name, metric in self._metrics.items()
+            }
+
+
+def merge_snapshots(snapshots):
+    """Sum a list of ``(snapshot, alive)`` pairs into one snapshot."""
+    merged = {}
+    for snapshot, alive in snapshots:
+        for name, metric in snapshot.items():
+            if metric['type'] == 'gauge' and not alive:
+                continue
+            target = merged.setdefault(name, {**metric, 'values': {}})
+            for labels, value in metric['values']:
+                key = tuple(labels)
+                current = target['values'].get(key)
+                if metric['type'] == 'histogram':
+                    if current is None:
+                        current = target['values'][key] = [[0] * len(value[0]), 0.0, 0]
+                    current[0] = [a + b for a, b in zip(current[0], value[0])]
+                    current[1] += value[1]
+                    current[2] += value[2]
+                else:
+                    target['values'][key] = (current or 0) + value
+    return merged
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    )
+    return '{' + escaped + '}'
+
+
+def render(merged, label_names):
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        names = label_names.get(name, ())
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for labels, value in sorted(metric['values'].items()):
+            if metric['type'] == 'histogram':
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(metric['buckets'] + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(names, labels, ('le', bound))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(names, labels)} {total}")
+                lines.append(f"{name}_count{_format_labels(names, labels)} {count}")
+            else:
+                lines.append(f"{name}{_format_labels(names, labels)} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+LABELS = {
+    'jiseti_http_requests_total': ('blueprint', 'route', 'method', 'status'),
+    'jiseti_http_request_duration_seconds': ('blueprint', 'route', 'method'),
+    'jiseti_http_requests_in_flight': (),
+    'jiseti_db_queries_total': ('operation',),
+    'jiseti_db_query_duration_seconds': ('operation',),
+    'jiseti_db_queries_per_request': ('blueprint', 'route'),
+    'jiseti_upload_bytes_total': ('endpoint',),
+    'jiseti_db_pool_connections': ('state',),
+    'jiseti_log_records': ('outcome',),
+    'jiseti_admission_requests_total': ('class', 'outcome'),
+    'jiseti_admission_wait_seconds': ('class',),
+}
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self.registry = Registry()
+        self.directory = None
+        self.flush_interval = 1.0
+        self._last_flush = 0.0
+        r = self.registry
+        r.counter('jiseti_http_requests_total', 'HTTP requests handled.')
+        r.histogram('jiseti_http_request_duration_seconds', 'HTTP request latency.')
+        r.gauge('jiseti_http_requests_in_flight', 'HTTP requests currently being handled.')
+        r.counter('jiseti_db_queries_total', 'SQL statements executed.')
+        r.histogram('jiseti_db_query_duration_seconds', 'SQL statement latency.')
+        r.histogram('jiseti_db_queries_per_request', 'SQL statements issued per request.',
+                    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+        r.counter('jiseti_upload_bytes_total', 'Bytes of uploaded media stored.')
+        r.gauge('jiseti_db_pool_connections', 'Database pool connections by state.')
+        r.gauge('jiseti_log_records', 'Log pipeline record counts.')
+        r.counter('jiseti_admission_requests_total', 'Requests admitted or shed by admission control.')
+        r.histogram('jiseti_admission_wait_seconds', 'Time spent queued for admission.')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', os.getenv('METRICS_ENABLED', 'true').lower() != 'false')
+        self.directory = os.getenv('METRICS_DIR') or os.getenv('PROMETHEUS_MULTIPROC_DIR')
+        self.flush_interval = float(os.getenv('METRICS_FLUSH_INTERVAL', 1.0))
+        self.config = app.config
+        app.extensions['metrics'] = self
+        app.wsgi_app = self.middleware(app.wsgi_app)
+        # Flask clears environ['werkzeug.request'] when the context pops,
+        # so hand the request to the middleware as soon as it is routed.
+        app.before_request_funcs.setdefault(None, []).insert(0, self._capture_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def instrument_engine(self, engine):
+        @event.listens_for(engine, 'before_cursor_execute')
+        def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def record_query(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info['query_start'].pop()
+            operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+            labels = (operation,)
+            self.registry.inc('jiseti_db_queries_total', labels)
+            self.registry.observe('jiseti_db_query_duration_seconds', labels, time.perf_counter() - started)
+            state = _request_state.get()
+            if state is not None:
+                state[1] += 1
+
+        @event.listens_for(engine, 'handle_error')
+        def drop_query_timer(exception_context):
+            # after_cursor_execute does not run for a failed statement.
+            conn = exception_context.connection
+            if conn is not None and conn.info.get('query_start'):
+                conn.info['query_start'].pop()
+
+    def middleware(self, wsgi_app):
+        """Wrap ``wsgi_app`` so every request is timed and counted.
+
+        This runs outside Flask's hooks on purpose: it never touches the
+        context-local proxies, which keeps the cost to a few microseconds.
+        The route and blueprint are read off the request object captured
+        by :meth:`_capture_request`.
+        """
+        registry = self.registry
+
+        def instrumented(environ, start_response):
+            if not self.config['METRICS_ENABLED']:
+                return wsgi_app(environ, start_response)
+
+            # [start, queries, status, flask request]
+            state = [time.perf_counter(), 0, '500', None]
+            token = _request_state.set(state)
+            registry.inc('jiseti_http_requests_in_flight')
+
+            def capture_status(status, headers, exc_info=None):
+                state[2] = status[:3]
+                return start_response(status, headers, exc_info)
+
+            def finish():
+                elapsed = time.perf_counter() - state[0]
+                req = state[3]
+                rule = getattr(req, 'url_rule', None)
+                route = rule.rule if rule is not None else 'unmatched'
+                blueprint = (req.blueprint if req is not None else None) or ''
+                method = environ.get('REQUEST_METHOD', '')
+                registry.inc('jiseti_http_requests_in_flight', (), -1)
+                registry.inc('jiseti_http_requests_total', (blueprint, route, method, state[2]))
+                registry.observe('jiseti_http_request_duration_seconds', (blueprint, route, method), elapsed)
+                registry.observe('jiseti_db_queries_per_request', (blueprint, route), state[1])
+                if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+                    self.flush()
+
+            try:
+                response = wsgi_app(environ, capture_status)
+            except BaseException:
+                _request_state.reset(token)
+                finish()
+                raise
+            _request_state.reset(token)
+            # Latency is recorded when the server closes the body, so
+            # streamed responses are measured to the last byte.
+            return ClosingIterator(response, finish)
+
+        return instrumented
+
+    def _capture_request(self):
+        state = _request_state.get()
+        if state is not None:
+            state[3] = request._get_current_object()
+
+    def record_upload(self, nbytes):
+        self.registry.inc('jiseti_upload_bytes_total', (request.endpoint or '',), nbytes)
+
+    def _collect_gauges(self):
+        stats = pool_stats(db.engine)
+        for state in ('checkedin', 'checkedout', 'overflow'):
+            if state in stats:
+                self.registry.set('jiseti_db_pool_connections', (state,), stats[state])
+        for outcome, value in logging_stats().items():
+            self.registry.set('jiseti_log_records', (outcome,), value)
+
+    def flush(self):
+        """Write this worker's snapshot for other workers to aggregate."""
+        self._last_flush = time.monotonic()
+        pid = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.metrics-')
+        with os.fdopen(fd, 'w') as handle:
+            json.dump({'pid': pid, 'metrics': self.registry.snapshot()}, handle)
+        os.replace(tmp_path, os.path.join(self.directory, f'metrics-{pid}.json'))
+
+    def collect(self):
+        self._collect_gauges()
+        own = (self.registry.snapshot(), True)
+        if not self.directory:
+            return merge_snapshots([own])
+
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as handle:
+                    data = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            snapshots.append((data['metrics'], _pid_alive(data['pid'])))
+        return merge_snapshots(snapshots)
+
+    def metrics_view(self):
+        token = current_app.config.get('METRICS_TOKEN') or os.getenv('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render(self.collect(), LABELS), mimetype='text/plain; version=0.0.4')
+
+
+def get_metrics():
+    return current_app.extensions['metrics']
@@ -2,8 +2,25 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timezone
 from werkzeug.security import generate_password_hash, check_password_hash
 import mimetypes
+try:
+    from .replicas import RoutingSession
+except ImportError:  # pragma: no cover - fallback for script execution
+    from replicas import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def hash_password(password):
+    """Hash ``password`` the way :meth:`User.set_password` does.
+
+    Kept at module level so it can be shipped to worker processes.
+    """
+    return generate_password_hash(
+        password,
+        method='pbkdf2:sha256',
+        salt_length=8
+    )
 
-db = SQLAlchemy()
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -14,11 +31,7 @@ class User(db.Model):
     role = db.Column(db.String(20), default='user')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(
-            password, 
-            method='pbkdf2:sha256', 
-            salt_length=8
-        )
+        self.password_hash = hash_password(password)
         return True
 
     def check_password(self, password):
@@ -100,6 +113,155 @@ class ReportMedia(db.Model):
             'url': f'/api/v1/media/{self.filename}'
         }
 
+class ReportImportKey(db.Model):
+    """Natural key of a report that came in through a bulk import.
+
+    Kept in its own table so ``create_all`` adds it to existing databases.
+    """
+    __tablename__ = 'report_import_keys'
+    __table_args__ = (db.UniqueConstraint('source', 'natural_key'),)
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(100), nullable=False)
+    natural_key = db.Column(db.String(128), nullable=False)
+    report_id = db.Column(db.Integer, db.ForeignKey('reports.id', ondelete='CASCADE'), nullable=False, index=True)
+
+
+class ReportSimilarityBucket(db.Model):
+    """One LSH band bucket of a report's MinHash signature (see similarity.py)."""
+    __tablename__ = 'report_similarity_buckets'
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('reports.id', ondelete='CASCADE'), nullable=False, index=True)
+    bucket = db.Column(db.BigInteger, nullable=False, index=True)
+
+
+class ArchiveSegment(db.Model):
+    """One compressed NDJSON file of archived reports (see archive.py)."""
+    __tablename__ = 'archive_segments'
+    id = db.Column(db.Integer, primary_key=True)
+    # Month the reports were closed in, e.g. "2025-06".
+    partition = db.Column(db.String(7), nullable=False, index=True)
+    path = db.Column(db.String(500), nullable=False, unique=True)
+    report_count = db.Column(db.Integer, nullable=False)
+    media_count = db.Column(db.Integer, nullable=False, default=0)
+    compressed_bytes = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class ArchivedReport(db.Model):
+    """Where an archived report lives, so it can still be fetched by id."""
+    __tablename__ = 'archived_reports'
+    report_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    segment_id = db.Column(db.Integer, db.ForeignKey('archive_segments.id'), nullable=False, index=True)
+    created_by = db.Column(db.Integer, nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False)
+    closed_at = db.Column(db.DateTime, nullable=False)
+
+
+class IdempotencyKey(db.Model):
+    """A client's ``Idempotency-Key`` and the response it produced (see idempotency.py).
+
+    ``response_status`` is NULL while the first request is still running.
+    """
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (db.UniqueConstraint('user_id', 'scope', 'key'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    # "<METHOD> <path>", so one key cannot replay another endpoint's response.
+    scope = db.Column(db.String(255), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    response_mimetype = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+
+class UserUsage(db.Model):
+    """Per-user report and storage counters (see usage.py).
+
+    Kept in its own table so ``create_all`` adds it to existing databases.
+    """
+    __tablename__ = 'user_usage'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True,
+                        autoincrement=False)
+    reports_pending = db.Column(db.Integer, nullable=False, default=0)
+    reports_under_investigation = db.Column(db.Integer, nullable=False, default=0)
+    reports_resolved = db.Column(db.Integer, nullable=False, default=0)
+    reports_rejected = db.Column(db.Integer, nullable=False, default=0)
+    media_count = db.Column(db.Integer, nullable=False, default=0)
+    storage_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    reconciled_at = db.Column(db.DateTime, nullable=True)
+
+
+class OutboxEvent(db.Model):
+    """An event written in the same transaction as the change it describes.
+
+    The webhook dispatcher fans it out to ``webhook_deliveries`` and sets
+    ``fanned_out_at`` (see webhooks.py).
+    """
+    __tablename__ = 'outbox_events'
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    fanned_out_at = db.Column(db.DateTime, nullable=True, index=True)
+
+
+class WebhookEndpoint(db.Model):
+    __tablename__ = 'webhook_endpoints'
+    id = db.Column(db.Integer, primary_key=True)
+    url = db.Column(db.String(500), nullable=False)
+    secret = db.Column(db.String(64), nullable=False)
+    # Comma-separated event types, or "*" for all of them.
+    events = db.Column(db.String(255), nullable=False, default='*')
+    max_concurrency = db.Column(db.Integer, nullable=False, default=2)
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def subscribes_to(self, event_type):
+        events = self.events.split(',')
+        return '*' in events or event_type in events
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'events': self.events.split(','),
+            'max_concurrency': self.max_concurrency,
+            'active': self.active,
+            'created_at': self.created_at.isoformat(),
+        }
+
+
+class WebhookDelivery(db.Model):
+    """One event owed to one endpoint; ``status`` is pending, delivered or failed."""
+    __tablename__ = 'webhook_deliveries'
+    __table_args__ = (db.Index('ix_webhook_deliveries_due', 'status', 'next_attempt_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('outbox_events.id', ondelete='CASCADE'), nullable=False, index=True)
+    endpoint_id = db.Column(
+        db.Integer, db.ForeignKey('webhook_endpoints.id', ondelete='CASCADE'), nullable=False, index=True
+    )
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    last_error = db.Column(db.String(500), nullable=True)
+    delivered_at = db.Column(db.DateTime, nullable=True)
+
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    token_type = db.Column(db.String(10), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    # JWT ``exp`` claim (epoch seconds); rows past it can be purged.
+    expires = db.Column(db.Integer, nullable=False, index=True)
+    # Filtered on by every RevocationFilter sync.
+    revoked_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+
 # class ReportMedia(db.Model):
 #     __tablename__ = 'report_media'
 #     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,429 @@
+"""On-demand profiles of single requests, for admins.
+
+An admin adds ``X-Profile: 1`` (or ``?_profile=1``) to any request. That
+one request then runs under:
+
+* a sampling profiler: a thread records the request thread's stack every
+  ``PROFILE_INTERVAL_MS``. The samples are kept as folded stacks
+  (``root;...;leaf count``, the input of flamegraph.pl and speedscope)
+  and rendered as an SVG flame graph;
+* the SQL recorder from querylog.py: the shape, parameter types and
+  duration of every statement;
+* tracemalloc: peak traced memory and the top ``PROFILE_TRACEMALLOC_TOP``
+  allocation sites still alive when the response is sent.
+
+The response is otherwise unchanged. It carries ``X-Profile-Id``; the
+profile is stored under ``PROFILE_DIR`` and served by
+``/api/v1/admin/profiles/<id>`` and ``.../flamegraph.svg``. The flag is
+ignored for anyone who is not an admin.
+
+Slow requests are often not reproducible on demand, so a capture can
+also be armed per endpoint: ``POST /api/v1/admin/profiles/capture
+{"endpoint": "reports.get_reports", "rank": 3, "window": 200}`` profiles
+the next 200 requests to that endpoint. It keeps the ``rank`` slowest
+in memory and stores the 3rd slowest when the window closes. Captures
+skip tracemalloc, which would slow every request in the window. They
+are per worker process; ``PROFILE_CAPTURE=endpoint:rank:window,...``
+arms them in every worker at startup.
+
+When nothing is being profiled, each request costs one environ lookup,
+one substring test and a truthiness check. Each SQL statement costs one
+ContextVar read. ``PROFILING_ENABLED=false`` installs nothing at all.
+Sampling uses ``sys._current_frames``, so under gevent the samples
+include whatever other greenlets run on the same thread meanwhile;
+tracemalloc likewise sees the whole process.
+
+Environment:
+
+``PROFILING_ENABLED``        install the hook (true).
+``PROFILE_DIR``              where profiles are stored (instance/profiles).
+``PROFILE_KEEP``             newest profiles kept on disk (200).
+``PROFILE_INTERVAL_MS``      sampling interval (1).
+``PROFILE_TRACEMALLOC_TOP``  allocation sites reported (20).
+``PROFILE_CAPTURE``          captures armed at startup.
+"""
+import heapq
+import html
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from werkzeug.exceptions import HTTPException
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    from .models import db, User
+    from .querylog import QueryRecorder
+except ImportError:  # pragma: no cover - fallback for script execution
+    from models import db, User
+    from querylog import QueryRecorder
+
+PROFILE_ID = re.compile(r'^[0-9TZ]+-[0-9a-f]{8}$')
+
+_profile_queries = ContextVar('jiseti_profile_queries', default=None)
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+class StackSampler:
+    """Sample one thread's stack every ``interval`` seconds from a helper thread."""
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        labels = {}
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    name = getattr(code, 'co_qualname', code.co_name)
+                    label = labels[code] = f'{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+
+def folded(samples):
+    """Samples as ``root;...;leaf count`` lines."""
+    return [f"{';'.join(stack)} {count}" for stack, count in samples.most_common()]
+
+
+def unfold(lines):
+    """The inverse of :func:`folded`."""
+    samples = Counter()
+    for line in lines:
+        stack, _, count = line.rpartition(' ')
+        samples[tuple(stack.split(';'))] += int(count)
+    return samples
+
+
+def flamegraph_svg(samples, title='', width=1200, row_height=16):
+    tree, total, depth = {}, 0, 0
+    for stack, count in samples.items():
+        total += count
+        depth = max(depth, len(stack))
+        node = tree
+        for label in stack:
+            entry = node.setdefault(label, [0, {}])
+            entry[0] += count
+            node = entry[1]
+    height = (depth + 2) * row_height
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="monospace" font-size="11">',
+        f'<text x="4" y="{row_height - 4}">{html.escape(title)} ({total} samples)</text>',
+    ]
+
+    def draw(children, x, level):
+        for label, (count, grandchildren) in sorted(children.items()):
+            w = width * count / total
+            if w >= 0.5:
+                y = height - level * row_height
+                hue = 10 + zlib.crc32(label.encode()) % 45
+                escaped = html.escape(label)
+                parts.append(
+                    f'<g><title>{escaped} ({count} samples, {100 * count / total:.1f}%)</title>'
+                    f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_height - 1}" '
+                    f'fill="hsl({hue},85%,60%)"/>'
+                )
+                if w > 40:
+                    text = escaped if len(label) * 7 < w else html.escape(label[:int(w / 7) - 2]) + '..'
+                    parts.append(f'<text x="{x + 3:.1f}" y="{y + row_height - 4}">{text}</text>')
+                parts.append('</g>')
+                draw(grandchildren, x, level + 1)
+            x += w
+
+    if total:
+        draw(tree, 0.0, 1)
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(1)
+        else:
+            tracemalloc.reset_peak()
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc(top):
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+    snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+    return {
+        'peak_bytes': peak,
+        'top': [
+            {'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+             'bytes': stat.size, 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:top]
+        ],
+    }
+
+
+class Profile:
+    def __init__(self, environ, trigger):
+        now = datetime.now(timezone.utc)
+        self.id = f"{now.strftime('%Y%m%dT%H%M%S%fZ')}-{uuid4().hex[:8]}"
+        self.trigger = trigger
+        self.method = environ.get('REQUEST_METHOD')
+        self.path = environ.get('PATH_INFO')
+        self.query_string = environ.get('QUERY_STRING', '')
+        self.created_at = now.isoformat()
+        self.status = None
+        self.duration = None
+        self.samples = Counter()
+        self.queries = []
+        self.allocations = None
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'trigger': self.trigger,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'duration_ms': round(self.duration * 1000, 2),
+            'samples': sum(self.samples.values()),
+            'queries': len(self.queries),
+            'created_at': self.created_at,
+        }
+
+    def to_dict(self):
+        return {
+            **self.summary(),
+            'query_string': self.query_string,
+            'folded': folded(self.samples),
+            'sql': {
+                'total_ms': round(sum(seconds for _, _, seconds in self.queries) * 1000, 2),
+                'statements': [
+                    {'statement': shape, 'parameters': params, 'ms': round(seconds * 1000, 3)}
+                    for shape, params, seconds in self.queries
+                ],
+            },
+            'allocations': self.allocations,
+        }
+
+
+class SlowCapture:
+    """Profile ``window`` requests to ``endpoint`` and keep the ``rank``-th slowest."""
+
+    def __init__(self, endpoint, rank=1, window=100):
+        self.endpoint = endpoint
+        self.rank = rank
+        self.window = window
+        self.seen = 0
+        self._slowest = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def to_dict(self):
+        return {'endpoint': self.endpoint, 'rank': self.rank, 'window': self.window, 'seen': self.seen}
+
+    def offer(self, profile):
+        """Record a finished profile; returns (done, profile to store or None)."""
+        with self._lock:
+            self.seen += 1
+            entry = (profile.duration, next(self._counter), profile)
+            if len(self._slowest) < self.rank:
+                heapq.heappush(self._slowest, entry)
+            elif entry > self._slowest[0]:
+                heapq.heapreplace(self._slowest, entry)
+            if self.seen < self.window:
+                return False, None
+            if len(self._slowest) < self.rank:
+                return True, None
+            return True, self._slowest[0][2]
+
+
+class Profiler:
+    def __init__(self, app=None):
+        self.app = None
+        self.captures = {}
+        self.recorder = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILING_ENABLED', os.getenv('PROFILING_ENABLED', 'true').lower() != 'false')
+        app.config.setdefault('PROFILE_DIR', os.getenv('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles'))
+        app.config.setdefault('PROFILE_KEEP', int(os.getenv('PROFILE_KEEP', 200)))
+        app.config.setdefault('PROFILE_INTERVAL_MS', float(os.getenv('PROFILE_INTERVAL_MS', 1)))
+        app.config.setdefault('PROFILE_TRACEMALLOC_TOP', int(os.getenv('PROFILE_TRACEMALLOC_TOP', 20)))
+        app.extensions['profiler'] = self
+        if not app.config['PROFILING_ENABLED']:
+            return
+
+        self.app = app
+        self.recorder = QueryRecorder(_profile_queries.get)
+        for spec in filter(None, os.getenv('PROFILE_CAPTURE', '').split(',')):
+            endpoint, rank, window = (spec.strip().split(':') + ['1', '100'])[:3]
+            self.arm(endpoint, int(rank), int(window))
+        app.wsgi_app = self.middleware(app.wsgi_app)
+
+    def instrument_engine(self, engine):
+        if self.recorder is not None:
+            self.recorder.attach(engine)
+
+    def arm(self, endpoint, rank=1, window=100):
+        capture = SlowCapture(endpoint, rank, window)
+        self.captures[endpoint] = capture
+        return capture
+
+    def middleware(self, wsgi_app):
+        def profiled(environ, start_response):
+            if (
+                'HTTP_X_PROFILE' not in environ
+                and '_profile=' not in environ.get('QUERY_STRING', '')
+                and not self.captures
+            ):
+                return wsgi_app(environ, start_response)
+            return self._dispatch(wsgi_app, environ, start_response)
+
+        return profiled
+
+    def _requested(self, environ):
+        flag = environ.get('HTTP_X_PROFILE')
+        if flag is None:
+            flag = next((value for name, _, value in
+                         (part.partition('=') for part in environ.get('QUERY_STRING', '').split('&'))
+                         if name == '_profile'), None)
+        return flag is not None and flag.lower() in ('1', 'true', 'yes') and self._is_admin(environ)
+
+    def _is_admin(self, environ):
+        # Reads headers only; the body is left for the real request.
+        with self.app.request_context(environ):
+            try:
+                verify_jwt_in_request()
+                user = db.session.get(User, int(get_jwt_identity()))
+            except Exception:
+                return False
+            return user is not None and user.role == 'admin'
+
+    def _capture_for(self, environ):
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None
+        return self.captures.get(endpoint)
+
+    def _dispatch(self, wsgi_app, environ, start_response):
+        requested = self._requested(environ)
+        capture = None if requested else self._capture_for(environ) if self.captures else None
+        if not requested and capture is None:
+            return wsgi_app(environ, start_response)
+
+        config = self.app.config
+        profile = Profile(environ, 'request' if requested else f'capture:{capture.endpoint}')
+        started = time.perf_counter()
+        sampler = StackSampler(threading.get_ident(), config['PROFILE_INTERVAL_MS'] / 1000).start()
+        if requested:
+            _start_tracemalloc()
+
+        def profile_start_response(status, headers, exc_info=None):
+            profile.status = int(status[:3])
+            if requested:
+                headers = [*headers, ('X-Profile-Id', profile.id)]
+            return start_response(status, headers, exc_info)
+
+        def finish():
+            profile.duration = time.perf_counter() - started
+            profile.samples = sampler.stop()
+            if requested:
+                profile.allocations = _stop_tracemalloc(config['PROFILE_TRACEMALLOC_TOP'])
+                self.store(profile)
+                return
+            done, slowest = capture.offer(profile)
+            if done:
+                if self.captures.get(capture.endpoint) is capture:
+                    del self.captures[capture.endpoint]
+                if slowest is not None:
+                    self.store(slowest)
+
+        token = _profile_queries.set(profile.queries)
+        try:
+            response = wsgi_app(environ, profile_start_response)
+        except BaseException:
+            finish()
+            raise
+        finally:
+            _profile_queries.reset(token)
+        return ClosingIterator(response, finish)
+
+    def store(self, profile):
+        directory = self.app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{profile.id}.json')
+        with open(f'{path}.tmp', 'w') as handle:
+            json.dump(profile.to_dict(), handle)
+        os.replace(f'{path}.tmp', path)
+        stored = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+        for name in stored[:-self.app.config['PROFILE_KEEP']]:
+            os.remove(os.path.join(directory, name))
+
+
+def load_profile(directory, profile_id):
+    """A stored profile as a dict, or ``None``."""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(directory, f'{profile_id}.json')) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles(directory, limit=50):
+    try:
+        names = sorted((name for name in os.listdir(directory) if name.endswith('.json')), reverse=True)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names[:limit]:
+        profile = load_profile(directory, name[:-len('.json')])
+        if profile is not None:
+            for key in ('folded', 'sql', 'allocations', 'query_string'):
+                profile.pop(key, None)
+            profiles.append(profile)
+    return profiles
+
+
+def get_profiler():
+    from flask import current_app
+    return current_app.extensions['profiler']
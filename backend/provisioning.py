@@ -0,0 +1,244 @@
+"""Bulk user provisioning from CSV or NDJSON.
+
+Rows are processed in batches: each batch is validated, checked for
+duplicates with one ``IN`` query per column, hashed across a process pool
+and inserted in a single transaction. Only rows that will actually be
+inserted pay for a password hash.
+"""
+import csv
+import io
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from .models import db, User, hash_password
+except ImportError:  # pragma: no cover - fallback for script execution
+    from models import db, User, hash_password
+
+logger = logging.getLogger(__name__)
+
+# Keep IN lists under SQLite's default bound-parameter limit.
+LOOKUP_CHUNK_SIZE = 500
+ALLOWED_ROLES = {'user', 'admin'}
+HASH_PREFIXES = ('pbkdf2:', 'scrypt:')
+
+
+def detect_format(filename=None, content_type=None):
+    name = (filename or '').lower()
+    ctype = (content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in ctype or 'jsonl' in ctype:
+        return 'ndjson'
+    return 'csv'
+
+
+def iter_rows(stream, fmt='csv'):
+    """Yield ``(line_number, row)`` pairs from a text or binary stream."""
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+    if fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_number, ValueError(f"Invalid JSON: {exc.msg}")
+                continue
+            if not isinstance(row, dict):
+                yield line_number, ValueError("Each line must be a JSON object")
+                continue
+            yield line_number, row
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Header is line 1, so the first data row is line 2.
+            yield reader.line_num, row
+
+
+def text_field(row, field, default=''):
+    """``row[field]`` as a string, ``default`` if empty; NDJSON rows may hold any type."""
+    value = row.get(field)
+    if value is None or value == '':
+        return default
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a string")
+    return value
+
+
+def validate_row(row):
+    """Return a normalized user mapping or raise ``ValueError``."""
+    username = text_field(row, 'username').strip()
+    email = text_field(row, 'email').strip()
+    password = text_field(row, 'password')
+    password_hash = text_field(row, 'password_hash').strip()
+    role = text_field(row, 'role', 'user').strip()
+
+    if not username:
+        raise ValueError("Missing field: username")
+    if not email:
+        raise ValueError("Missing field: email")
+    if '@' not in email or '.' not in email:
+        raise ValueError("Please enter a valid email address")
+    if password_hash:
+        if not password_hash.startswith(HASH_PREFIXES):
+            raise ValueError("Unsupported password_hash format")
+    elif not password:
+        raise ValueError("Missing field: password")
+    elif len(password) < 6:
+        raise ValueError("Password must be at least 6 characters long")
+    if role not in ALLOWED_ROLES:
+        raise ValueError(f"Invalid role: {role}")
+    if len(username) > 80 or len(email) > 120:
+        raise ValueError("Username or email too long")
+
+    return {
+        'username': username,
+        'email': email,
+        'password': password,
+        'password_hash': password_hash,
+        'role': role,
+    }
+
+
+def _existing_values(column, values):
+    found = set()
+    values = list(values)
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        chunk = values[start:start + LOOKUP_CHUNK_SIZE]
+        found.update(value for (value,) in db.session.query(column).filter(column.in_(chunk)))
+    return found
+
+
+class UserImporter:
+    """Import users in batches; see :func:`import_users`."""
+
+    def __init__(self, batch_size=1000, workers=None):
+        self.batch_size = batch_size
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self._pool = None
+        self.created = 0
+        self.errors = []
+        self._seen_emails = set()
+        self._seen_usernames = set()
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _error(self, line_number, message):
+        self.errors.append({'row': line_number, 'error': message})
+
+    def _hash_all(self, passwords):
+        if self._pool is None or len(passwords) < 2:
+            return [hash_password(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._pool.map(hash_password, passwords, chunksize=chunksize))
+
+    def run(self, rows, progress=None):
+        rows = iter(rows)
+        processed = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self._import_batch(batch)
+            processed += len(batch)
+            if progress:
+                progress(processed, self.created, len(self.errors))
+        return self.summary(processed)
+
+    def summary(self, total):
+        return {
+            'total': total,
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors,
+        }
+
+    def _import_batch(self, batch):
+        candidates = []
+        for line_number, row in batch:
+            if isinstance(row, Exception):
+                self._error(line_number, str(row))
+                continue
+            try:
+                candidates.append((line_number, validate_row(row)))
+            except ValueError as exc:
+                self._error(line_number, str(exc))
+
+        existing_emails = _existing_values(User.email, {c['email'] for _, c in candidates})
+        existing_usernames = _existing_values(User.username, {c['username'] for _, c in candidates})
+
+        accepted = []
+        for line_number, candidate in candidates:
+            if candidate['email'] in existing_emails or candidate['email'] in self._seen_emails:
+                self._error(line_number, "Email address already registered")
+                continue
+            if candidate['username'] in existing_usernames or candidate['username'] in self._seen_usernames:
+                self._error(line_number, "Username already taken")
+                continue
+            self._seen_emails.add(candidate['email'])
+            self._seen_usernames.add(candidate['username'])
+            accepted.append((line_number, candidate))
+
+        to_hash = [candidate['password'] for _, candidate in accepted if not candidate['password_hash']]
+        hashes = iter(self._hash_all(to_hash))
+
+        mappings = []
+        for line_number, candidate in accepted:
+            mappings.append((line_number, {
+                'username': candidate['username'],
+                'email': candidate['email'],
+                'role': candidate['role'],
+                'password_hash': candidate['password_hash'] or next(hashes),
+            }))
+
+        self._insert(mappings)
+
+    def _insert(self, mappings):
+        if not mappings:
+            return
+        try:
+            db.session.execute(insert(User), [mapping for _, mapping in mappings])
+            db.session.commit()
+            self.created += len(mappings)
+            return
+        except IntegrityError:
+            db.session.rollback()
+            logger.warning("Bulk insert hit a uniqueness conflict; retrying batch row by row")
+
+        # A concurrent registration won a race with this batch. Fall back to
+        # one savepoint per row so only the conflicting rows are rejected.
+        for line_number, mapping in mappings:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(User), [mapping])
+                self.created += 1
+            except IntegrityError:
+                self._error(line_number, "Email or username already registered")
+        db.session.commit()
+
+
+def import_users(stream, fmt='csv', batch_size=1000, workers=None, progress=None):
+    """Import users from ``stream`` and return a summary with per-row errors.
+
+    Must be called inside an application context.
+    """
+    with UserImporter(batch_size=batch_size, workers=workers) as importer:
+        return importer.run(iter_rows(stream, fmt), progress=progress)
@@ -0,0 +1,199 @@
+"""Per-request SQL inspection: slow-query log and N+1 detection.
+
+Opt-in; nothing is installed unless ``SQL_INSPECT_ENABLED`` is true.
+When enabled, every statement a request issues is recorded. Statements
+slower than ``SQL_SLOW_QUERY_MS`` are logged as they finish, together with
+the shape of their bound parameters (types only, never values). When the
+response is closed, any statement shape that ran ``SQL_N_PLUS_ONE_THRESHOLD``
+or more times in the request is logged as a likely N+1.
+
+Environment:
+
+``SQL_INSPECT_ENABLED``       turn the inspector on (false).
+``SQL_SLOW_QUERY_MS``         slow statement threshold (100).
+``SQL_N_PLUS_ONE_THRESHOLD``  repeats of one shape that count as N+1 (5).
+
+Tests use :func:`query_budget` instead, which needs no configuration::
+
+    with query_budget(3):
+        client.get('/api/v1/reports')
+"""
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from werkzeug.wsgi import ClosingIterator
+
+logger = logging.getLogger(__name__)
+
+_request_queries = ContextVar('jiseti_request_queries', default=None)
+
+_WHITESPACE = re.compile(r'\s+')
+# ``IN (?, ?, ?)`` and VALUES lists grow with the data; fold them.
+_PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)'
+_PLACEHOLDER_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)' % (_PLACEHOLDER, _PLACEHOLDER))
+_NUMBER = re.compile(r'\b\d+\b')
+
+
+def statement_shape(statement):
+    """Normalise ``statement`` so repeats differing only in values match."""
+    shape = _WHITESPACE.sub(' ', statement).strip()
+    shape = _PLACEHOLDER_LIST.sub('(?...)', shape)
+    return _NUMBER.sub('N', shape)
+
+
+def parameter_shape(parameters, executemany=False):
+    """Describe bound parameters by type, e.g. ``(int, str)``."""
+    if executemany:
+        rows = list(parameters or ())
+        return f"{len(rows)} x {parameter_shape(rows[0]) if rows else '()'}"
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+    return type(parameters).__name__
+
+
+def repeated_shapes(queries, threshold):
+    """Return ``[(shape, count)]`` for shapes issued ``threshold`` or more times."""
+    counts = Counter(shape for shape, _, _ in queries)
+    return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+
+class QueryRecorder:
+    """Engine listeners that append ``(shape, parameters, seconds)`` to a sink.
+
+    ``sink`` is called with no arguments for every statement and returns
+    the list to record into, or ``None`` to skip it.
+    """
+
+    def __init__(self, sink, slow_threshold=None):
+        self.sink = sink
+        self.slow_threshold = slow_threshold
+        self._engines = []
+
+    def attach(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+        event.listen(engine, 'handle_error', self._error)
+        self._engines.append(engine)
+
+    def detach(self):
+        for engine in self._engines:
+            event.remove(engine, 'before_cursor_execute', self._before)
+            event.remove(engine, 'after_cursor_execute', self._after)
+            event.remove(engine, 'handle_error', self._error)
+        self._engines = []
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if self.sink() is not None:
+            conn.info.setdefault('querylog_start', []).append(time.perf_counter())
+
+    def _error(self, exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('querylog_start'):
+            conn.info['querylog_start'].pop()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        queries = self.sink()
+        if queries is None:
+            return
+        elapsed = time.perf_counter() - conn.info['querylog_start'].pop()
+        shape = statement_shape(statement)
+        params = parameter_shape(parameters, executemany)
+        queries.append((shape, params, elapsed))
+        if self.slow_threshold is not None and elapsed >= self.slow_threshold:
+            logger.warning(
+                "Slow SQL statement",
+                extra={'event': 'slow_query', 'duration_ms': round(elapsed * 1000, 2),
+                       'statement': shape, 'parameters': params},
+            )
+
+
+class QueryInspector:
+    def __init__(self, app=None):
+        self.recorder = None
+        self.n_plus_one_threshold = 5
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_INSPECT_ENABLED', os.getenv('SQL_INSPECT_ENABLED', 'false').lower() == 'true')
+        app.config.setdefault('SQL_SLOW_QUERY_MS', float(os.getenv('SQL_SLOW_QUERY_MS', 100)))
+        app.config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', 5)))
+        app.extensions['query_inspector'] = self
+        if not app.config['SQL_INSPECT_ENABLED']:
+            return
+
+        self.n_plus_one_threshold = app.config['SQL_N_PLUS_ONE_THRESHOLD']
+        self.recorder = QueryRecorder(_request_queries.get, app.config['SQL_SLOW_QUERY_MS'] / 1000)
+        app.wsgi_app = self.middleware(app.wsgi_app)
+
+    def instrument_engine(self, engine):
+        if self.recorder is not None:
+            self.recorder.attach(engine)
+
+    def middleware(self, wsgi_app):
+        def inspected(environ, start_response):
+            queries = []
+            token = _request_queries.set(queries)
+            try:
+                response = wsgi_app(environ, start_response)
+            finally:
+                _request_queries.reset(token)
+            return ClosingIterator(response, lambda: self.report(environ, queries))
+
+        return inspected
+
+    def report(self, environ, queries):
+        for shape, count in repeated_shapes(queries, self.n_plus_one_threshold):
+            logger.warning(
+                "Possible N+1 query",
+                extra={'event': 'n_plus_one', 'statement': shape, 'count': count,
+                       'total_queries': len(queries),
+                       'method': environ.get('REQUEST_METHOD'), 'path': environ.get('PATH_INFO')},
+            )
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries, n_plus_one_threshold=None, engine=None):
+    """Fail if the block issues more than ``max_queries`` statements.
+
+    With ``n_plus_one_threshold`` it also fails when any one statement
+    shape repeats that many times. Yields the list of recorded
+    ``(shape, parameters, seconds)`` tuples. Needs an app context unless
+    ``engine`` is given.
+    """
+    if engine is None:
+        try:
+            from .models import db
+        except ImportError:  # pragma: no cover - fallback for script execution
+            from models import db
+        engine = db.engine
+
+    queries = []
+    recorder = QueryRecorder(lambda: queries)
+    recorder.attach(engine)
+    try:
+        yield queries
+    finally:
+        recorder.detach()
+
+    problems = []
+    if len(queries) > max_queries:
+        problems.append(f"{len(queries)} queries issued, budget is {max_queries}")
+    if n_plus_one_threshold is not None:
+        for shape, count in repeated_shapes(queries, n_plus_one_threshold):
+            problems.append(f"N+1: {count} x {shape}")
+    if problems:
+        listing = '\n'.join(f'  {shape} {params}' for shape, params, _ in queries)
+        raise QueryBudgetExceeded('; '.join(problems) + '\n' + listing)
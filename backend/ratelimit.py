@@ -0,0 +1,216 @@
+"""Token-bucket rate limiting keyed per client IP and per authenticated user.
+
+Limits are configured per endpoint in ``RATELIMIT_RULES``::
+
+    {"auth.login": {"ip": "10/minute"},
+     "reports.create_report": {"ip": "30/minute", "user": "10/minute"}}
+
+Each rule is ``"<requests>/<period>"``; the bucket holds ``requests`` tokens
+and refills at ``requests / period``. Buckets live in one of two backends,
+chosen by ``RATELIMIT_STORAGE_URL``:
+
+* ``memory://`` - a dict in the worker process (the default);
+* ``sqlite:///<path>`` - a small SQLite file shared by every worker on the
+  host. Point it at tmpfs (e.g. ``/dev/shm``) so it never touches disk.
+
+The check runs in a ``before_request`` hook, after routing but before the
+view reads the body or opens a database session, so throttled requests
+cost a bucket update and a tiny 429.
+"""
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import decode_token
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+DEFAULT_RULES = {
+    'auth.login': {'ip': '10/minute'},
+    'auth.register': {'ip': '5/minute'},
+    'reports.create_report': {'ip': '30/minute', 'user': '10/minute'},
+    'reports.sync_reports': {'ip': '10/minute', 'user': '5/minute'},
+}
+
+
+def parse_limit(value):
+    """Parse ``"10/minute"`` into ``(capacity, tokens_per_second)``."""
+    amount, _, period = value.partition('/')
+    period = period.strip().lower().rstrip('s') or 'second'
+    seconds = PERIODS.get(period)
+    if seconds is None:
+        try:
+            seconds = float(period)
+        except ValueError:
+            raise ValueError(f"Unknown rate limit period: {value}") from None
+    capacity = int(amount)
+    if capacity < 1 or seconds <= 0:
+        raise ValueError(f"Invalid rate limit: {value}")
+    return capacity, capacity / seconds
+
+
+def take_token(tokens, updated, now, capacity, rate):
+    """Refill a bucket and try to take one token.
+
+    Returns ``(allowed, tokens_left, retry_after_seconds)``.
+    """
+    tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / rate
+
+
+class MemoryBackend:
+    """Buckets held in this process only."""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            allowed, tokens, retry_after = take_token(tokens, updated, now, capacity, rate)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._evict(now)
+        return allowed, retry_after
+
+    def _evict(self, now):
+        # Buckets idle long enough to have refilled carry no state worth
+        # keeping; if that frees nothing, drop the oldest half.
+        idle = [key for key, (_, updated) in self._buckets.items() if now - updated > 3600]
+        if not idle:
+            idle = sorted(self._buckets, key=lambda key: self._buckets[key][1])[: len(self._buckets) // 2]
+        for key in idle:
+            del self._buckets[key]
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBackend:
+    """Buckets in a SQLite file shared by every worker process on a host."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # Connections must not cross a fork, so key them by pid as well.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_buckets '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def consume(self, key, capacity, rate):
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            allowed, tokens, retry_after = take_token(tokens, updated, now, capacity, rate)
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                (key, tokens, now)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, retry_after
+
+    def reset(self):
+        self._connection().execute('DELETE FROM rate_limit_buckets')
+
+
+def backend_from_url(url):
+    if not url or url == 'memory://':
+        return MemoryBackend()
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    raise ValueError(f"Unsupported RATELIMIT_STORAGE_URL: {url}")
+
+
+class RateLimiter:
+    def __init__(self, app=None):
+        self.backend = None
+        self.rules = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', os.getenv('RATELIMIT_ENABLED', 'true').lower() != 'false')
+        app.config.setdefault('RATELIMIT_STORAGE_URL', os.getenv('RATELIMIT_STORAGE_URL', 'memory://'))
+        rules = os.getenv('RATELIMIT_RULES')
+        app.config.setdefault('RATELIMIT_RULES', json.loads(rules) if rules else DEFAULT_RULES)
+
+        self.backend = backend_from_url(app.config['RATELIMIT_STORAGE_URL'])
+        self.rules = {
+            endpoint: {scope: parse_limit(limit) for scope, limit in scopes.items()}
+            for endpoint, scopes in app.config['RATELIMIT_RULES'].items()
+        }
+        app.extensions['rate_limiter'] = self
+        # Run ahead of every other before_request hook.
+        app.before_request_funcs.setdefault(None, []).insert(0, self.check)
+
+    def check(self):
+        rules = self.rules.get(request.endpoint)
+        if not rules or request.method == 'OPTIONS' or not current_app.config['RATELIMIT_ENABLED']:
+            return None
+
+        worst_retry = 0.0
+        for scope, (capacity, rate) in rules.items():
+            identity = request.remote_addr if scope == 'ip' else user_identity_from_header()
+            if identity is None:
+                continue
+            allowed, retry_after = self.backend.consume(
+                f"{request.endpoint}:{scope}:{identity}", capacity, rate
+            )
+            if not allowed:
+                worst_retry = max(worst_retry, retry_after)
+
+        if worst_retry:
+            response = jsonify({"error": "Too many requests"})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(max(1, math.ceil(worst_retry)))
+            return response
+        return None
+
+
+def user_identity_from_header():
+    """JWT subject for the current request, or ``None``.
+
+    Only the signature is checked here; revocation and expiry are left to
+    ``@jwt_required`` on the view itself.
+    """
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None
+    try:
+        return decode_token(header[7:], allow_expired=True).get('sub')
+    except Exception:
+        return None
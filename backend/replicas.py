@@ -0,0 +1,120 @@
+"""Read-replica routing for the shared ``db`` session.
+
+Replica URLs come from ``DATABASE_REPLICA_URLS`` (comma separated). They
+are kept out of ``SQLALCHEMY_BINDS`` so ``db.create_all`` never touches
+them; the router owns their engines instead. Views decorated
+with :func:`replica_read` send their SELECTs to a replica, round robin;
+everything else, and anything a replica-routed view flushes, goes to the
+primary.
+
+Read-your-writes: after a successful write request, that client's reads
+stay on the primary for ``DB_READ_YOUR_WRITES_SECONDS``. The window is
+tracked per user (or IP for anonymous clients) in the worker, and in a
+short-lived cookie so it also holds when the next request lands on a
+different worker.
+"""
+import itertools
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+
+try:
+    from .database import configure_engine, engine_options
+    from .ratelimit import user_identity_from_header
+except ImportError:  # pragma: no cover - fallback for script execution
+    from database import configure_engine, engine_options
+    from ratelimit import user_identity_from_header
+
+STICKY_COOKIE = 'jiseti_primary_until'
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and getattr(clause, 'is_select', False):
+            replica = _replica_for_request()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _replica_for_request():
+    if not has_request_context() or not g.get('use_replica'):
+        return None
+    router = current_app.extensions.get('replica_router')
+    if router is None or not router.engines:
+        return None
+    return router.next_engine()
+
+
+class ReplicaRouter:
+    def __init__(self, app=None):
+        self.engines = []
+        self.window = 5.0
+        self._sticky = {}
+        self._lock = threading.Lock()
+        self._cycle = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.engines = []
+        for url in app.config.get('SQLALCHEMY_REPLICA_URIS', []):
+            engine = create_engine(url, **engine_options(url))
+            configure_engine(engine)
+            self.engines.append(engine)
+        self.window = float(app.config.get('DB_READ_YOUR_WRITES_SECONDS', 5))
+        self._cycle = itertools.cycle(self.engines)
+        app.extensions['replica_router'] = self
+        app.after_request(self.remember_write)
+
+    def next_engine(self):
+        with self._lock:
+            return next(self._cycle)
+
+    def _client_key(self):
+        identity = user_identity_from_header()
+        return f'user:{identity}' if identity else f'ip:{request.remote_addr}'
+
+    def is_sticky(self):
+        now = time.time()
+        try:
+            if float(request.cookies.get(STICKY_COOKIE, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        return self._sticky.get(self._client_key(), 0) > now
+
+    def remember_write(self, response):
+        if not self.engines or request.method not in WRITE_METHODS or response.status_code >= 400:
+            return response
+
+        until = time.time() + self.window
+        with self._lock:
+            self._sticky[self._client_key()] = until
+            if len(self._sticky) > 10_000:
+                now = time.time()
+                self._sticky = {key: value for key, value in self._sticky.items() if value > now}
+        response.set_cookie(
+            STICKY_COOKIE,
+            f'{until:.3f}',
+            max_age=max(1, int(self.window)),
+            httponly=True,
+            secure=request.is_secure,
+            samesite='None' if request.is_secure else 'Lax',
+        )
+        return response
+
+
+def replica_read(fn):
+    """Route the view's SELECTs to a replica unless the client just wrote."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        router = current_app.extensions.get('replica_router')
+        g.use_replica = bool(router and router.engines and not router.is_sticky())
+        return fn(*args, **kwargs)
+    return wrapper
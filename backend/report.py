@@ -4,8 +4,6 @@ from extensions import db
 from models import Report, Status, ReportType, User
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 report_bp = Blueprint('reports', __name__, url_prefix='/reports')
@@ -13,9 +11,8 @@ report_bp = Blueprint('reports', __name__, url_prefix='/reports')
 @report_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_report():
-    logger.debug(f"Received POST /reports/ with headers: {request.headers}")
+    logger.debug("Received POST /reports/")
     data = request.get_json()
-    logger.debug(f"Parsed JSON data: {data}")
     if not data or not all(k in data for k in ['type', 'title', 'description', 'location']):
         logger.error("Missing required fields")
         return jsonify({'error': 'Missing required fields'}), 400
@@ -69,7 +66,7 @@ def list_reports():
 @report_bp.route('/<int:report_id>', methods=['PUT'])
 @jwt_required()
 def update_report(report_id):
-    logger.debug(f"Received PUT /reports/{report_id} with headers: {request.headers}")
+    logger.debug(f"Received PUT /reports/{report_id}")
     report = db.session.get(Report, report_id)  # Use db.session.get
     if not report:
         logger.error(f"Report not found for ID: {report_id}")
@@ -97,7 +94,7 @@ def update_report(report_id):
 @report_bp.route('/<int:report_id>', methods=['DELETE'])
 @jwt_required()
 def delete_report(report_id):
-    logger.debug(f"Received DELETE /reports/{report_id} with headers: {request.headers}")
+    logger.debug(f"Received DELETE /reports/{report_id}")
     report = db.session.get(Report, report_id)  # Use db.session.get
     if not report:
         logger.error(f"Report not found for ID: {report_id}")
@@ -0,0 +1,164 @@
+"""Per-process cache of serialized reports for ``GET /api/v1/reports/<id>``.
+
+Entries are the report's JSON, keyed by id and stored with the report's
+version. The version is ``reports.updated_at``; adding or removing
+media also bumps the parent report's ``updated_at``.
+
+Invalidation is driven by session events, so every ORM write path is
+covered without touching the views:
+
+* ``after_flush`` collects the ids of reports inserted, updated or
+  deleted, and of reports whose media rows changed;
+* ``after_commit`` evicts them. This happens before the writing request
+  returns, so this process never serves a report older than its own
+  last commit. A rollback discards the collected ids;
+* bulk ORM ``UPDATE``/``DELETE`` statements on reports or media (e.g.
+  archiving) clear the whole cache on commit.
+
+Fills race with writes: a reader that loaded a report before a
+concurrent commit must not cache the old copy after the eviction. Each
+eviction bumps an epoch. Readers take the epoch before they look up the
+report, and a fill only lands if the epoch is still unchanged.
+
+Other workers' commits cannot evict this process's entries. With
+``REPORT_CACHE_VERIFY`` on (the default), a hit is checked against the
+row's current version with one primary-key lookup. That query only
+reads ``updated_at``: no media query and no serialization. Turn it off
+only when a single process serves all writes (e.g. one gevent worker);
+hits then cost no database round trip at all.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+try:
+    from .models import db, Report, ReportMedia
+except ImportError:  # pragma: no cover - fallback for script execution
+    from models import db, Report, ReportMedia
+
+_DIRTY = 'report_cache_dirty'
+_CLEAR = 'report_cache_clear'
+
+
+class ReportCache:
+    def __init__(self, max_entries=10000, verify=True):
+        self.max_entries = max_entries
+        self.verify = verify
+        self.epoch = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        _listen()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, report_id):
+        """Cached JSON for ``report_id``, or ``None`` on a miss."""
+        with self._lock:
+            entry = self._entries.get(report_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(report_id)
+        version, body = entry
+        if self.verify:
+            current = db.session.query(Report.updated_at).filter(Report.id == report_id).scalar()
+            if current != version:
+                # Stale copy from before another worker's write; the
+                # caller reloads and replaces it.
+                with self._lock:
+                    self._entries.pop(report_id, None)
+                return None
+        return body
+
+    def put(self, report_id, version, body, epoch):
+        """Cache ``body`` unless something was evicted since ``epoch``."""
+        with self._lock:
+            if epoch != self.epoch:
+                return
+            self._entries[report_id] = (version, body)
+            self._entries.move_to_end(report_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, report_ids):
+        with self._lock:
+            self.epoch += 1
+            for report_id in report_ids:
+                self._entries.pop(report_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.epoch += 1
+            self._entries.clear()
+
+
+def get_report_cache():
+    return current_app.extensions['report_cache']
+
+
+def _cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('report_cache')
+
+
+def _before_flush(session, flush_context, instances):
+    # Media changes bump the parent's version so other workers' cached
+    # copies fail verification.
+    now = datetime.now(timezone.utc)
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, ReportMedia):
+            report = obj.report
+            if report is not None and report not in session.deleted:
+                report.updated_at = now
+
+
+def _after_flush(session, flush_context):
+    dirty = session.info.setdefault(_DIRTY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Report) and obj.id is not None:
+            dirty.add(obj.id)
+        elif isinstance(obj, ReportMedia) and obj.report_id is not None:
+            dirty.add(obj.report_id)
+
+
+def _do_orm_execute(state):
+    if (state.is_update or state.is_delete) and state.bind_mapper is not None:
+        if state.bind_mapper.class_ in (Report, ReportMedia):
+            state.session.info[_CLEAR] = True
+
+
+def _after_commit(session):
+    dirty = session.info.pop(_DIRTY, None)
+    clear = session.info.pop(_CLEAR, False)
+    cache = _cache()
+    if cache is None:
+        return
+    if clear:
+        cache.clear()
+    elif dirty:
+        cache.evict(dirty)
+
+
+def _after_rollback(session):
+    session.info.pop(_DIRTY, None)
+    session.info.pop(_CLEAR, None)
+
+
+_listening = False
+
+
+def _listen():
+    global _listening
+    if _listening:
+        return
+    event.listen(Session, 'before_flush', _before_flush)
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'do_orm_execute', _do_orm_execute)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_soft_rollback', lambda session, previous: _after_rollback(session))
+    _listening = True
@@ -0,0 +1,272 @@
+"""Bulk report import from partner agency dumps (CSV or NDJSON).
+
+Rows are read as a stream and handled in batches. For each batch the rows
+are validated, deduplicated against earlier imports with one ``IN`` query
+per chunk of natural keys, and inserted in one transaction: ``COPY`` on
+PostgreSQL, batched ``executemany`` everywhere else. Nothing is kept
+across batches except counters and the first ``max_errors`` row errors,
+so memory stays flat however large the file is.
+
+The natural key of a row is ``(source, external_id)`` when the agency
+supplies an ``external_id``; otherwise it is a digest of the normalised
+title, description, location and ``created_at``. Re-sending a dump is
+therefore a no-op.
+"""
+import hashlib
+import logging
+import re
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import islice
+
+from sqlalchemy import insert, text
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from .models import db, Report, ReportImportKey
+    from .provisioning import LOOKUP_CHUNK_SIZE, iter_rows, text_field
+    from .similarity import index_rows
+    from .usage import record_reports
+except ImportError:  # pragma: no cover - fallback for script execution
+    from models import db, Report, ReportImportKey
+    from provisioning import LOOKUP_CHUNK_SIZE, iter_rows, text_field
+    from similarity import index_rows
+    from usage import record_reports
+
+logger = logging.getLogger(__name__)
+
+REPORT_TYPES = {'corruption', 'infrastructure', 'intervention', 'red-flag'}
+REPORT_STATUSES = {'pending', 'under-investigation', 'resolved', 'rejected'}
+REPORT_COLUMNS = ('id', 'type', 'title', 'description', 'location', 'status', 'created_by', 'created_at', 'updated_at')
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid created_at: {value}") from None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def validate_report_row(row):
+    """Return a normalized report mapping or raise ``ValueError``."""
+    title = text_field(row, 'title').strip()
+    description = text_field(row, 'description').strip()
+    report_type = text_field(row, 'type', 'corruption').strip().lower()
+    location = text_field(row, 'location', 'Unknown location').strip()
+    status = text_field(row, 'status', 'pending').strip().lower()
+    external_id = str(row.get('external_id') or '').strip()
+
+    if not title:
+        raise ValueError("Missing field: title")
+    if not description:
+        raise ValueError("Missing field: description")
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Invalid type: {report_type}")
+    if status not in REPORT_STATUSES:
+        raise ValueError(f"Invalid status: {status}")
+    if len(title) > 200:
+        raise ValueError("Title too long")
+    if len(location) > 100:
+        raise ValueError("Location too long")
+    if len(external_id) > 100:
+        raise ValueError("external_id too long")
+
+    return {
+        'type': report_type,
+        'title': title,
+        'description': description,
+        'location': location,
+        'status': status,
+        'created_at': _parse_timestamp(row.get('created_at')),
+        'external_id': external_id,
+    }
+
+
+def natural_key(report):
+    if report['external_id']:
+        return f"id:{report['external_id']}"
+    parts = [report['title'], report['description'], report['location']]
+    parts = [_WHITESPACE.sub(' ', part).strip().lower() for part in parts]
+    parts.append(report['created_at'].isoformat() if report['created_at'] else '')
+    return 'sha1:' + hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _existing_keys(source, keys):
+    found = set()
+    keys = list(keys)
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+        found.update(
+            key for (key,) in db.session.query(ReportImportKey.natural_key)
+            .filter(ReportImportKey.source == source, ReportImportKey.natural_key.in_(chunk))
+        )
+    return found
+
+
+class ReportImporter:
+    """Import reports in batches; see :func:`import_reports`."""
+
+    def __init__(self, source, owner_id, batch_size=1000, max_errors=1000, index_similarity=True):
+        self.source = source
+        self.owner_id = owner_id
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.index_similarity = index_similarity
+        self.created = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.errors = []
+
+    def _error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': line_number, 'error': message})
+
+    def run(self, rows, progress=None):
+        rows = iter(rows)
+        processed = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self._import_batch(batch)
+            processed += len(batch)
+            if progress:
+                progress(processed, self.created, self.duplicates, self.failed)
+        return self.summary(processed)
+
+    def summary(self, total):
+        return {
+            'total': total,
+            'created': self.created,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+    def _import_batch(self, batch):
+        candidates = {}
+        for line_number, row in batch:
+            if isinstance(row, Exception):
+                self._error(line_number, str(row))
+                continue
+            try:
+                report = validate_report_row(row)
+            except ValueError as exc:
+                self._error(line_number, str(exc))
+                continue
+            key = natural_key(report)
+            if key in candidates:
+                self.duplicates += 1
+                continue
+            candidates[key] = (line_number, report)
+
+        existing = _existing_keys(self.source, candidates)
+        self.duplicates += len(existing)
+        accepted = [(key, line_number, report) for key, (line_number, report) in candidates.items()
+                    if key not in existing]
+        self._insert(accepted)
+
+    def _report_mapping(self, report, now):
+        created_at = report['created_at'] or now
+        return {
+            'type': report['type'],
+            'title': report['title'],
+            'description': report['description'],
+            'location': report['location'],
+            'status': report['status'],
+            'created_by': self.owner_id,
+            'created_at': created_at,
+            'updated_at': created_at,
+        }
+
+    def _insert(self, accepted):
+        if not accepted:
+            return
+        now = datetime.now(timezone.utc)
+        mappings = [self._report_mapping(report, now) for _, _, report in accepted]
+        keys = [key for key, _, _ in accepted]
+        try:
+            if db.session.get_bind().dialect.name == 'postgresql':
+                report_ids = self._copy(mappings, keys)
+            else:
+                report_ids = self._executemany(mappings, keys)
+            self._index(mappings, report_ids)
+            record_reports(self.owner_id, Counter(mapping['status'] for mapping in mappings))
+            db.session.commit()
+            self.created += len(accepted)
+            return
+        except IntegrityError:
+            db.session.rollback()
+            logger.warning("Bulk report insert hit a duplicate key; retrying batch row by row")
+
+        # Another import of the same source raced this batch. Fall back to
+        # one savepoint per row so only the rows it already inserted drop out.
+        for (key, line_number, _), mapping in zip(accepted, mappings):
+            try:
+                with db.session.begin_nested():
+                    self._index([mapping], self._executemany([mapping], [key]))
+                    record_reports(self.owner_id, {mapping['status']: 1})
+                self.created += 1
+            except IntegrityError:
+                self.duplicates += 1
+        db.session.commit()
+
+    def _key_rows(self, keys, report_ids):
+        return [
+            {'source': self.source, 'natural_key': key, 'report_id': report_id}
+            for key, report_id in zip(keys, report_ids)
+        ]
+
+    def _executemany(self, mappings, keys):
+        report_ids = db.session.execute(
+            insert(Report).returning(Report.id, sort_by_parameter_order=True), mappings
+        ).scalars().all()
+        db.session.execute(insert(ReportImportKey), self._key_rows(keys, report_ids))
+        return report_ids
+
+    def _copy(self, mappings, keys):
+        import psycopg
+
+        connection = db.session.connection()
+        report_ids = connection.execute(
+            text("SELECT nextval(pg_get_serial_sequence('reports', 'id')) FROM generate_series(1, :n)"),
+            {'n': len(mappings)},
+        ).scalars().all()
+        raw = connection.connection.driver_connection
+        try:
+            with raw.cursor() as cursor:
+                with cursor.copy(f"COPY reports ({', '.join(REPORT_COLUMNS)}) FROM STDIN") as copy:
+                    for report_id, mapping in zip(report_ids, mappings):
+                        copy.write_row((report_id, *(mapping[column] for column in REPORT_COLUMNS[1:])))
+                with cursor.copy("COPY report_import_keys (source, natural_key, report_id) FROM STDIN") as copy:
+                    for row in self._key_rows(keys, report_ids):
+                        copy.write_row((row['source'], row['natural_key'], row['report_id']))
+        except psycopg.errors.UniqueViolation as exc:
+            raise IntegrityError("COPY report_import_keys", None, exc) from exc
+        return report_ids
+
+    def _index(self, mappings, report_ids):
+        if self.index_similarity:
+            index_rows([{**mapping, 'id': report_id} for mapping, report_id in zip(mappings, report_ids)])
+
+
+def import_reports(stream, source, owner_id, fmt='csv', batch_size=1000, progress=None, max_errors=1000,
+                   index_similarity=True):
+    """Import reports from ``stream`` and return a summary with per-row errors.
+
+    Reports are owned by ``owner_id``. With ``index_similarity=False`` the
+    near-duplicate index is left for ``flask index-duplicates`` to build.
+    Must be called inside an application context.
+    """
+    importer = ReportImporter(source, owner_id, batch_size=batch_size, max_errors=max_errors,
+                              index_similarity=index_similarity)
+    return importer.run(iter_rows(stream, fmt), progress=progress)
@@ -0,0 +1,282 @@
+"""Batched report submission for clients that collected reports offline.
+
+``POST /api/v1/reports/batch`` takes a single ``multipart/form-data``
+stream. Each report is a ``report`` part holding JSON, followed by its
+own ``media`` file parts::
+
+    report  {"client_id": "a1", "title": "...", "description": "...", "type": "...", "location": "..."}
+    media   photo.jpg
+    media   clip.mp4
+    report  {"client_id": "a2", ...}
+
+The body is parsed as it arrives and is never buffered whole. Media
+parts are written straight into the upload folder. Every ``chunk_size``
+reports are inserted in one transaction, together with their media rows
+and similarity buckets. If a chunk fails to commit, its reports are
+retried one per transaction, so one bad item cannot fail the rest. An
+item whose media would take the user over ``USER_STORAGE_QUOTA`` fails
+with "Storage quota exceeded" and its files are removed. The result has
+one entry per ``report`` part, in order::
+
+    {"results": [{"index": 0, "client_id": "a1", "status": "created", "id": 812, "media": 2},
+                 {"index": 1, "client_id": "a2", "status": "error", "error": "Missing field: title"}],
+     "created": 1, "failed": 1}
+
+``client_id`` is optional and only echoed back, so the client can match
+results to its local drafts.
+"""
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from sqlalchemy import insert
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+from werkzeug.utils import secure_filename
+
+try:
+    from .models import db, Report, ReportMedia
+    from .report_import import validate_report_row
+    from .similarity import index_rows
+    from .usage import StorageQuotaExceeded, add_media, record_reports, storage_used
+except ImportError:  # pragma: no cover - fallback for script execution
+    from models import db, Report, ReportMedia
+    from report_import import validate_report_row
+    from similarity import index_rows
+    from usage import StorageQuotaExceeded, add_media, record_reports, storage_used
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024
+MAX_REPORT_PART = 64 * 1024
+
+
+class _Item:
+    def __init__(self, index):
+        self.index = index
+        self.client_id = None
+        self.values = None
+        self.error = None
+        # (absolute path, original filename, size)
+        self.media = []
+
+    def fail(self, message):
+        if self.error is None:
+            self.error = message
+
+    def result(self, report_id=None):
+        result = {'index': self.index, 'client_id': self.client_id}
+        if self.error is None:
+            result.update(status='created', id=report_id, media=len(self.media))
+        else:
+            result.update(status='error', error=self.error)
+        return result
+
+
+class ReportSync:
+    def __init__(self, owner_id, upload_folder, instance_path, allowed_extensions,
+                 chunk_size=50, max_items=200, max_file_size=None, on_upload=None, storage_quota=0):
+        self.owner_id = owner_id
+        self.upload_folder = upload_folder
+        self.instance_path = instance_path
+        self.allowed_extensions = allowed_extensions
+        self.chunk_size = chunk_size
+        self.max_items = max_items
+        self.max_file_size = max_file_size
+        self.on_upload = on_upload
+        self.storage_quota = storage_quota
+        # Bytes this user may still store; None without a quota.
+        self._storage_left = None
+        self.results = []
+        self._pending = []
+        self._count = 0
+
+    def run(self, stream, boundary):
+        """Consume the multipart ``stream``; returns the summary dict."""
+        os.makedirs(self.upload_folder, exist_ok=True)
+        if self.storage_quota:
+            self._storage_left = self.storage_quota - storage_used(self.owner_id)
+            # Do not hold a transaction open while the body streams in.
+            db.session.rollback()
+        decoder = MultipartDecoder(boundary)
+        item, part, sink, buffer = None, None, None, None
+        try:
+            while True:
+                data = stream.read(READ_SIZE)
+                decoder.receive_data(data or None)
+                event = decoder.next_event()
+                while not isinstance(event, (Epilogue, NeedData)):
+                    if isinstance(event, Field):
+                        part, sink = event, None
+                        if event.name == 'report':
+                            item = self._start_item(item)
+                            buffer = bytearray()
+                    elif isinstance(event, File):
+                        part = event
+                        sink = self._open_media(item, event) if event.name == 'media' else None
+                    elif isinstance(event, Data):
+                        if isinstance(part, Field) and part.name == 'report':
+                            buffer += event.data
+                            if len(buffer) > MAX_REPORT_PART:
+                                raise ValueError("report part is too large")
+                            if not event.more_data:
+                                self._read_report(item, bytes(buffer))
+                        elif sink is not None:
+                            sink = self._write_media(item, sink, event.data, event.more_data)
+                    event = decoder.next_event()
+                if not data or isinstance(event, Epilogue):
+                    break
+            if item is not None:
+                self._finish_item(item)
+            self._flush()
+        except Exception:
+            if sink is not None:
+                sink.close()
+            for pending in self._pending + ([item] if item is not None else []):
+                self._discard(pending)
+            raise
+        created = sum(1 for result in self.results if result['status'] == 'created')
+        return {'results': self.results, 'created': created, 'failed': len(self.results) - created}
+
+    def _finish_item(self, item):
+        self._pending.append(item)
+        if len(self._pending) >= self.chunk_size:
+            self._flush()
+
+    def _start_item(self, previous):
+        if previous is not None:
+            self._finish_item(previous)
+        item = _Item(self._count)
+        self._count += 1
+        if item.index >= self.max_items:
+            item.fail(f"Too many reports in one batch (max {self.max_items})")
+        return item
+
+    def _read_report(self, item, raw):
+        try:
+            payload = json.loads(raw)
+        except ValueError:
+            item.fail("report part is not valid JSON")
+            return
+        if not isinstance(payload, dict):
+            item.fail("report part must be a JSON object")
+            return
+        client_id = payload.get('client_id')
+        item.client_id = str(client_id)[:100] if client_id is not None else None
+        try:
+            fields = {name: payload.get(name) for name in ('title', 'description', 'type', 'location')}
+            item.values = validate_report_row(fields)
+        except ValueError as e:
+            item.fail(str(e))
+
+    def _open_media(self, item, part):
+        if item is None:
+            raise ValueError("media part before any report part")
+        if item.error is not None:
+            return None
+        original_name = part.filename or ''
+        extension = original_name.rsplit('.', 1)[1].lower() if '.' in original_name else ''
+        if extension not in self.allowed_extensions:
+            item.fail(f"File type not allowed: {original_name}")
+            return None
+        path = os.path.join(self.upload_folder, secure_filename(f"{uuid4().hex}.{extension}"))
+        item.media.append([path, original_name, 0])
+        return open(path, 'wb')
+
+    def _write_media(self, item, sink, data, more_data):
+        entry = item.media[-1]
+        entry[2] += len(data)
+        if self.max_file_size is not None and entry[2] > self.max_file_size:
+            sink.close()
+            item.fail(f"File too large: {entry[1]}")
+            return None
+        if self._storage_left is not None:
+            self._storage_left -= len(data)
+            if self._storage_left < 0:
+                sink.close()
+                item.fail("Storage quota exceeded")
+                return None
+        sink.write(data)
+        if not more_data:
+            sink.close()
+            return None
+        return sink
+
+    def _discard(self, item):
+        if self._storage_left is not None:
+            self._storage_left += sum(size for _, _, size in item.media)
+        for path, _, _ in item.media:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _storage_path(self, path):
+        if path.startswith(self.instance_path):
+            return os.path.relpath(path, self.instance_path)
+        return path
+
+    def _add(self, items):
+        """Insert ``items`` with their media and buckets; returns report ids."""
+        now = datetime.now(timezone.utc)
+        rows = [
+            {'type': item.values['type'], 'title': item.values['title'], 'description': item.values['description'],
+             'location': item.values['location'], 'status': 'pending', 'created_by': self.owner_id,
+             'created_at': now, 'updated_at': now}
+            for item in items
+        ]
+        report_ids = db.session.execute(
+            insert(Report).returning(Report.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        media = [
+            {'report_id': report_id, 'filename': os.path.basename(path), 'original_filename': original_name,
+             'file_path': self._storage_path(path), 'file_size': size}
+            for item, report_id in zip(items, report_ids)
+            for path, original_name, size in item.media
+        ]
+        if media:
+            db.session.execute(insert(ReportMedia), media)
+        record_reports(self.owner_id, {'pending': len(items)})
+        # The stream was checked against a snapshot taken when it started;
+        # this conditional update also covers the user's concurrent uploads.
+        add_media(self.owner_id, [row['file_size'] for row in media], self.storage_quota)
+        index_rows([{'id': report_id, **row} for report_id, row in zip(report_ids, rows)])
+        return report_ids
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        valid = [item for item in pending if item.error is None]
+        for item in pending:
+            if item.error is not None:
+                self._discard(item)
+
+        report_ids = {}
+        if valid:
+            try:
+                ids = self._add(valid)
+                db.session.commit()
+                report_ids = {item.index: report_id for item, report_id in zip(valid, ids)}
+            except Exception as e:
+                db.session.rollback()
+                logger.warning("Batch chunk failed, retrying per report", extra={'error': str(e)})
+                for item in valid:
+                    try:
+                        (report_id,) = self._add([item])
+                        db.session.commit()
+                        report_ids[item.index] = report_id
+                    except StorageQuotaExceeded:
+                        db.session.rollback()
+                        item.fail("Storage quota exceeded")
+                        self._discard(item)
+                    except Exception as item_error:
+                        db.session.rollback()
+                        item.fail("Could not save report")
+                        logger.error("Batch report failed", extra={'index': item.index, 'error': str(item_error)})
+                        self._discard(item)
+
+        for item in pending:
+            if item.error is None and self.on_upload:
+                for _, _, size in item.media:
+                    self.on_upload(size)
+            self.results.append(item.result(report_ids.get(item.index)))
@@ -0,0 +1,116 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from .models import db, RevokedToken
+except ImportError:  # pragma: no cover - fallback for script execution
+    from models import db, RevokedToken
+
+
+class RevocationFilter:
+    """In-memory view of the ``revoked_tokens`` table.
+
+    Every worker keeps the set of revoked, unexpired JTIs in memory and pulls
+    new rows from the database at most once per ``sync_interval`` seconds, so
+    checking a token that was never revoked costs a set lookup and no query.
+    Revocations made by this worker are visible immediately; revocations made
+    by other workers become visible after the next sync.
+
+    Ids and ``revoked_at`` are assigned before a row commits, so rows do not
+    become visible in either order. Each sync therefore re-reads the rows
+    revoked since ``overlap`` seconds before the previous one, and every
+    ``full_sync_interval`` seconds all unexpired rows are read again.
+    """
+
+    def __init__(self, sync_interval: float = 5.0, overlap: float = 60.0, full_sync_interval: float = 300.0):
+        self.sync_interval = sync_interval
+        self.overlap = overlap
+        self.full_sync_interval = full_sync_interval
+        self._revoked = {}
+        self._synced_at = None
+        self._last_sync = None
+        self._last_full_sync = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def is_revoked(self, jti: str) -> bool:
+        self.maybe_sync()
+        expires = self._revoked.get(jti)
+        return expires is not None and expires > time.time()
+
+    def maybe_sync(self):
+        now = time.monotonic()
+        if self._last_sync is not None and now - self._last_sync < self.sync_interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            # Another thread is already syncing; serve from the current view.
+            return
+        try:
+            self._sync(now)
+        finally:
+            self._lock.release()
+
+    def sync(self):
+        with self._lock:
+            self._sync(time.monotonic())
+
+    def _sync(self, now: float):
+        current_time = int(time.time())
+        started = datetime.now(timezone.utc)
+        query = db.session.query(RevokedToken.jti, RevokedToken.expires).filter(RevokedToken.expires > current_time)
+        full = self._last_full_sync is None or now - self._last_full_sync >= self.full_sync_interval
+        if not full:
+            query = query.filter(RevokedToken.revoked_at >= self._synced_at - timedelta(seconds=self.overlap))
+        for jti, expires in query:
+            self._revoked[jti] = expires
+
+        expired = [jti for jti, expires in self._revoked.items() if expires <= current_time]
+        for jti in expired:
+            del self._revoked[jti]
+
+        self._synced_at = started
+        self._last_sync = now
+        if full:
+            self._last_full_sync = now
+
+    def revoke(self, jwt_payload: dict) -> bool:
+        """Persist a revocation for ``jwt_payload``.
+
+        Returns ``False`` if the token had already been revoked, which lets
+        refresh-token rotation treat a replayed refresh token as invalid even
+        when two workers race on it.
+        """
+        jti = jwt_payload["jti"]
+        subject = jwt_payload.get("sub")
+        record = RevokedToken(
+            jti=jti,
+            token_type=jwt_payload.get("type", "access"),
+            user_id=int(subject) if subject is not None and str(subject).isdigit() else None,
+            expires=int(jwt_payload.get("exp") or time.time()),
+        )
+        db.session.add(record)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            self._revoked[jti] = record.expires
+            return False
+
+        self._revoked[jti] = record.expires
+        return True
+
+    def purge_expired(self) -> int:
+        """Delete expired rows from the database and return how many went."""
+        deleted = RevokedToken.query.filter(RevokedToken.expires <= int(time.time())).delete()
+        db.session.commit()
+        return deleted
+
+
+def get_revocation_filter() -> RevocationFilter:
+    return current_app.extensions["revocation_filter"]
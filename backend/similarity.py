@@ -0,0 +1,179 @@
+"""Near-duplicate report detection with MinHash and LSH banding.
+
+A report is reduced to a set of shingles: word bigrams of its title and
+description plus its normalised location. From that set a MinHash
+signature of ``NUM_HASHES`` values is computed and cut into ``BANDS``
+bands; each band is hashed into one bucket id and stored in
+``report_similarity_buckets``. Two reports whose shingle sets have
+Jaccard similarity ``s`` share at least one bucket with probability
+``1 - (1 - s**ROWS)**BANDS``, which is about 0.5 at ``s = 0.5`` and
+above 0.98 from ``s = 0.7``.
+
+A lookup is an indexed ``IN`` query over the ``BANDS`` bucket ids, then
+an exact Jaccard check on the handful of candidates it returns, so its
+cost depends on how many reports look alike, not on how many exist.
+The index lives in the database, so every worker sees the same buckets
+and they are written in the same transaction as the report.
+
+Environment:
+
+``DUPLICATE_THRESHOLD``  minimum Jaccard similarity to report (0.5).
+"""
+import hashlib
+import os
+import random
+import re
+
+from sqlalchemy import delete, func, insert, select
+
+try:
+    from .models import db, Report, ReportSimilarityBucket
+except ImportError:  # pragma: no cover - fallback for script execution
+    from models import db, Report, ReportSimilarityBucket
+
+BANDS = 16
+ROWS = 4
+NUM_HASHES = BANDS * ROWS
+# Candidates are checked exactly; cap how many one lookup may pull in.
+MAX_CANDIDATES = 100
+
+_WORD = re.compile(r'[a-z0-9]+')
+_STOPWORDS = frozenset('a an and are at be by for from has in is it of on or the this to was were with'.split())
+# Fixed seed: signatures must be identical in every worker and across deploys.
+_MASKS = [random.Random(0x5EED + i).getrandbits(64) for i in range(NUM_HASHES)]
+
+
+def shingles(title, description, location=''):
+    words = [word for word in _WORD.findall(f'{title} {description}'.lower()) if word not in _STOPWORDS]
+    grams = {f'{first} {second}' for first, second in zip(words, words[1:])} or set(words)
+    place = ' '.join(_WORD.findall((location or '').lower()))
+    if place:
+        grams.add(f'@{place}')
+    return grams
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def signature(grams):
+    """MinHash signature of a shingle set.
+
+    Each of the ``NUM_HASHES`` hash functions is one 64-bit hash of the
+    shingle XORed with a fixed random mask: much cheaper in Python than
+    ``(a * x + b) % p`` and close enough to min-wise for banding.
+    """
+    if not grams:
+        return None
+    hashes = [_hash64(gram) for gram in grams]
+    return [min(value ^ mask for value in hashes) for mask in _MASKS]
+
+
+def band_buckets(sig):
+    """One signed 63-bit bucket id per band, band index included."""
+    buckets = []
+    for band in range(BANDS):
+        rows = sig[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(
+            band.to_bytes(2, 'big') + b''.join(value.to_bytes(8, 'big') for value in rows), digest_size=8
+        ).digest()
+        buckets.append(int.from_bytes(digest, 'big') >> 1)
+    return buckets
+
+
+def buckets_for(title, description, location=''):
+    sig = signature(shingles(title, description, location))
+    return band_buckets(sig) if sig else []
+
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def index_report(report):
+    """(Re)index ``report`` in the current transaction; it must have an id."""
+    db.session.execute(delete(ReportSimilarityBucket).where(ReportSimilarityBucket.report_id == report.id))
+    rows = [{'report_id': report.id, 'bucket': bucket}
+            for bucket in buckets_for(report.title, report.description, report.location)]
+    if rows:
+        db.session.execute(insert(ReportSimilarityBucket), rows)
+
+
+def index_rows(rows, connection=None):
+    """Index freshly inserted reports given as mappings with an ``id``."""
+    bucket_rows = [
+        {'report_id': row['id'], 'bucket': bucket}
+        for row in rows
+        for bucket in buckets_for(row['title'], row['description'], row.get('location', ''))
+    ]
+    if bucket_rows:
+        (connection or db.session).execute(insert(ReportSimilarityBucket), bucket_rows)
+
+
+def remove_report(report_id):
+    db.session.execute(delete(ReportSimilarityBucket).where(ReportSimilarityBucket.report_id == report_id))
+
+
+def duplicate_threshold():
+    return float(os.getenv('DUPLICATE_THRESHOLD', 0.5))
+
+
+def find_duplicates(title, description, location='', exclude_id=None, limit=5, threshold=None):
+    """Reports that look like the given text, most similar first."""
+    threshold = duplicate_threshold() if threshold is None else threshold
+    grams = shingles(title, description, location)
+    sig = signature(grams)
+    if sig is None:
+        return []
+
+    hits = (
+        select(ReportSimilarityBucket.report_id)
+        .where(ReportSimilarityBucket.bucket.in_(band_buckets(sig)))
+        .group_by(ReportSimilarityBucket.report_id)
+        .order_by(func.count().desc())
+        .limit(MAX_CANDIDATES)
+    )
+    if exclude_id is not None:
+        hits = hits.where(ReportSimilarityBucket.report_id != exclude_id)
+    candidates = Report.query.filter(Report.id.in_(hits.scalar_subquery())).all()
+
+    matches = []
+    for candidate in candidates:
+        score = jaccard(grams, shingles(candidate.title, candidate.description, candidate.location))
+        if score >= threshold:
+            matches.append((score, candidate))
+    matches.sort(key=lambda match: (-match[0], -match[1].id))
+    return [
+        {
+            'id': candidate.id,
+            'title': candidate.title,
+            'location': candidate.location,
+            'status': candidate.status,
+            'created_at': candidate.created_at.isoformat(),
+            'score': round(score, 3),
+        }
+        for score, candidate in matches[:limit]
+    ]
+
+
+def rebuild_index(batch_size=1000, progress=None):
+    """Recompute the buckets of every report, in batches of ``batch_size``."""
+    db.session.execute(delete(ReportSimilarityBucket))
+    db.session.commit()
+    last_id, indexed = 0, 0
+    while True:
+        batch = db.session.execute(
+            select(Report.id, Report.title, Report.description, Report.location)
+            .where(Report.id > last_id).order_by(Report.id).limit(batch_size)
+        ).mappings().all()
+        if not batch:
+            break
+        index_rows(batch)
+        db.session.commit()
+        last_id = batch[-1]['id']
+        indexed += len(batch)
+        if progress:
+            progress(indexed)
+    return indexed
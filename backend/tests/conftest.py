@@ -15,7 +15,7 @@ if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
 from app import create_app
-from models import db
+from models import db, User
 
 
 @pytest.fixture
@@ -43,3 +43,24 @@ def app():
 @pytest.fixture
 def client(app):
     return app.test_client()
+
+
+@pytest.fixture
+def register(client):
+    """Sign a user up; returns their ``Authorization`` headers.
+
+    ``role`` promotes the new user, e.g. ``register('root', role='admin')``.
+    """
+    def register(username, role=None):
+        response = client.post(
+            '/api/v1/auth/register',
+            json={'username': username, 'email': f'{username}@example.com', 'password': 'secret123'}
+        )
+        # Run the finish callbacks, as a server does once the body is sent.
+        response.close()
+        payload = response.get_json()
+        if role:
+            db.session.get(User, payload['user']['id']).role = role
+            db.session.commit()
+        return {'Authorization': f"Bearer {payload['access_token']}"}
+    return register
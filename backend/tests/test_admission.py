@@ -0,0 +1,56 @@
+import threading
+import time
+
+from admission import AdmissionController, get_admission
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_freed_slots_go_to_the_highest_priority_waiter():
+    controller = AdmissionController({
+        'critical': {'limit': 1, 'queue': 1, 'max_wait': 2.0, 'retry_after': 1},
+        'bulk': {'limit': 1, 'queue': 1, 'max_wait': 2.0, 'retry_after': 5},
+    }, max_concurrency=1)
+    assert controller.acquire('bulk')
+
+    admitted = []
+    for name in ('bulk', 'critical'):
+        threading.Thread(target=lambda name=name: admitted.append((name, controller.acquire(name)))).start()
+        wait_until(lambda: controller.stats()['classes'][name]['queued'] == 1)
+
+    # The bulk queue is full: shed without waiting.
+    started = time.perf_counter()
+    assert controller.acquire('bulk') is False
+    assert time.perf_counter() - started < 0.05
+
+    controller.release('bulk')
+    wait_until(lambda: len(admitted) == 1)
+    assert admitted == [('critical', True)]
+    controller.release('critical')
+    wait_until(lambda: len(admitted) == 2)
+    assert admitted[1] == ('bulk', True)
+    assert controller.stats()['classes']['bulk']['shed'] == 1
+
+
+def test_a_full_class_is_shed_with_retry_after_while_others_run(app, client):
+    app.config['ADMISSION_CLASSES'] = {'search': {'limit': 1, 'queue': 0, 'max_wait': 0, 'retry_after': 2}}
+    admission = get_admission()
+    admission.configure(app.config)
+    # Another request holds the only search slot.
+    assert admission.controller.acquire('search')
+
+    response = client.get('/api/v1/reports')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '2'
+    assert client.get('/ping').status_code == 200
+
+    admission.controller.release('search')
+    assert client.get('/api/v1/reports').status_code == 200
+    stats = admission.stats()
+    assert stats['active'] == 0
+    assert (stats['classes']['search']['admitted'], stats['classes']['search']['shed']) == (2, 1)
@@ -0,0 +1,110 @@
+import os
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+import pytest
+
+from archive import archive_closed_reports
+from models import db, ArchivedReport, ArchiveSegment, Report, ReportMedia
+
+
+@pytest.fixture
+def archive_app(app, tmp_path):
+    app.config.update(ARCHIVE_DIR=str(tmp_path / 'archive'), ARCHIVE_COLD_MEDIA_DIR=str(tmp_path / 'cold'))
+    return app
+
+
+def create(client, headers, title, status, closed_days_ago, with_media=False):
+    data = {'title': title, 'description': f'{title} description', 'location': 'Nairobi'}
+    if with_media:
+        data['media'] = (BytesIO(b'fake image bytes'), 'photo.jpg')
+    report_id = client.post(
+        '/api/v1/reports', data=data, content_type='multipart/form-data', headers=headers
+    ).get_json()['id']
+    report = db.session.get(Report, report_id)
+    report.status = status
+    db.session.commit()
+    # Backdate after the status change so the onupdate hook does not win.
+    db.session.execute(
+        Report.__table__.update().where(Report.id == report_id)
+        .values(updated_at=datetime.now(timezone.utc) - timedelta(days=closed_days_ago))
+    )
+    db.session.commit()
+    return report_id
+
+
+def test_closed_reports_move_to_the_archive_and_stay_readable(client, archive_app, register):
+    headers = register('ann')
+    old = create(client, headers, 'Broken streetlight', 'resolved', 400, with_media=True)
+    rejected = create(client, headers, 'Duplicate pothole', 'rejected', 200)
+    recent = create(client, headers, 'Collapsed bridge', 'resolved', 10)
+    open_report = create(client, headers, 'Missing manhole', 'pending', 400)
+    media_path = os.path.join(archive_app.instance_path, db.session.get(Report, old).media_files[0].file_path)
+
+    totals = archive_closed_reports(datetime.now(timezone.utc) - timedelta(days=180))
+
+    assert totals['reports'] == 2 and totals['media'] == 1 and totals['segments'] == 2
+    assert {r.id for r in Report.query} == {recent, open_report}
+    assert ReportMedia.query.count() == 0
+    assert not os.path.exists(media_path)
+    assert ArchivedReport.query.count() == 2
+    assert all(segment.path.endswith('.ndjson.gz') for segment in ArchiveSegment.query)
+
+    # Reading the archive needs a login, like searching it.
+    assert client.get(f'/api/v1/archive/reports/{old}').status_code == 401
+    archived = client.get(f'/api/v1/archive/reports/{old}', headers=headers).get_json()
+    assert archived['title'] == 'Broken streetlight' and archived['archived'] is True
+    media = client.get(archived['media'][0]['url'])
+    assert media.data == b'fake image bytes'
+    media.close()
+    assert client.get(f'/api/v1/archive/reports/{recent}', headers=headers).status_code == 404
+
+    found = client.get('/api/v1/archive/reports?search=POTHOLE', headers=headers).get_json()
+    assert [item['id'] for item in found['items']] == [rejected]
+    partition = (datetime.now(timezone.utc) - timedelta(days=200)).strftime('%Y-%m')
+    bounded = client.get(f'/api/v1/archive/reports?from={partition}', headers=headers).get_json()
+    assert bounded['segments_scanned'] == 1
+    assert client.get('/api/v1/archive/reports?from=2025', headers=headers).status_code == 400
+
+
+def test_failed_archive_run_leaves_hot_tables_and_files_untouched(client, archive_app, monkeypatch, register):
+    headers = register('ann')
+    report_id = create(client, headers, 'Broken streetlight', 'resolved', 400, with_media=True)
+    media_path = os.path.join(archive_app.instance_path, db.session.get(Report, report_id).media_files[0].file_path)
+
+    def fail():
+        raise RuntimeError('database went away')
+
+    monkeypatch.setattr(db.session, 'commit', fail)
+    with pytest.raises(RuntimeError):
+        archive_closed_reports(datetime.now(timezone.utc) - timedelta(days=180))
+    monkeypatch.undo()
+
+    assert db.session.get(Report, report_id) is not None
+    assert os.path.exists(media_path)
+    leftovers = [name for _, _, names in os.walk(archive_app.config['ARCHIVE_DIR']) for name in names]
+    cold = [name for _, _, names in os.walk(archive_app.config['ARCHIVE_COLD_MEDIA_DIR']) for name in names]
+    assert leftovers == [] and cold == []
+
+
+def test_archived_media_cannot_escape_cold_storage(client, archive_app, tmp_path):
+    (tmp_path / 'cold' / '2025-06').mkdir(parents=True)
+    (tmp_path / 'cold' / '2025-06' / 'photo.jpg').write_bytes(b'archived')
+    (tmp_path / 'secret.txt').write_text('do not serve')
+
+    media = client.get('/api/v1/archive/media/2025-06/photo.jpg')
+    assert media.data == b'archived'
+    media.close()
+    for path in ('/api/v1/archive/media/../secret.txt', '/api/v1/archive/media/2025-06/../../secret.txt'):
+        assert client.get(path).status_code == 404
+
+
+def test_search_matches_non_ascii_and_escaped_text(client, archive_app, register):
+    headers = register('ann')
+    create(client, headers, 'Café roof collapsed', 'resolved', 400)
+    create(client, headers, 'Sign says "closed"', 'resolved', 400)
+    archive_closed_reports(datetime.now(timezone.utc) - timedelta(days=180))
+
+    for search in ('é', 'CAFÉ', '"closed"'):
+        found = client.get('/api/v1/archive/reports', query_string={'search': search}, headers=headers).get_json()
+        assert len(found['items']) == 1, search
@@ -0,0 +1,121 @@
+import time
+
+from sqlalchemy import event
+
+from models import db, RevokedToken
+from revocation import get_revocation_filter
+
+
+def register(client, username, email, password='secret123'):
+    response = client.post(
+        '/api/v1/auth/register',
+        json={'username': username, 'email': email, 'password': password}
+    )
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()
+
+
+def auth_header(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_login_returns_access_and_refresh_tokens(client, app):
+    register(client, 'amy', 'amy@example.com')
+
+    response = client.post('/api/v1/auth/login', json={'email': 'amy@example.com', 'password': 'secret123'})
+
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload['access_token']
+    assert payload['refresh_token']
+
+
+def test_refresh_rotates_and_rejects_reused_token(client, app):
+    tokens = register(client, 'ben', 'ben@example.com')
+
+    first = client.post('/api/v1/auth/refresh', headers=auth_header(tokens['refresh_token']))
+    assert first.status_code == 200
+    rotated = first.get_json()
+    assert rotated['refresh_token'] != tokens['refresh_token']
+
+    replay = client.post('/api/v1/auth/refresh', headers=auth_header(tokens['refresh_token']))
+    assert replay.status_code == 401
+
+    second = client.post('/api/v1/auth/refresh', headers=auth_header(rotated['refresh_token']))
+    assert second.status_code == 200
+
+
+def test_access_token_cannot_be_used_to_refresh(client, app):
+    tokens = register(client, 'cara', 'cara@example.com')
+
+    response = client.post('/api/v1/auth/refresh', headers=auth_header(tokens['access_token']))
+
+    assert response.status_code == 422
+
+
+def test_logout_revokes_access_and_refresh_tokens(client, app):
+    tokens = register(client, 'dan', 'dan@example.com')
+
+    response = client.post(
+        '/api/v1/auth/logout',
+        json={'refresh_token': tokens['refresh_token']},
+        headers=auth_header(tokens['access_token'])
+    )
+    assert response.status_code == 200
+
+    blocked = client.post(
+        '/api/v1/reports',
+        json={'title': 'After logout', 'description': 'Should be rejected'},
+        headers=auth_header(tokens['access_token'])
+    )
+    assert blocked.status_code == 401
+
+    refresh = client.post('/api/v1/auth/refresh', headers=auth_header(tokens['refresh_token']))
+    assert refresh.status_code == 401
+
+
+def test_filter_picks_up_revocations_from_other_workers(app):
+    revocation_filter = get_revocation_filter()
+    revocation_filter.sync()
+    assert not revocation_filter.is_revoked('revoked-elsewhere')
+
+    db.session.add(RevokedToken(jti='revoked-elsewhere', token_type='access', expires=int(time.time()) + 60))
+    db.session.commit()
+
+    revocation_filter.sync()
+    assert revocation_filter.is_revoked('revoked-elsewhere')
+
+
+def test_unrevoked_token_check_skips_database_between_syncs(app):
+    revocation_filter = get_revocation_filter()
+    revocation_filter.sync()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        for _ in range(100):
+            assert not revocation_filter.is_revoked('never-revoked')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert statements == []
+
+
+def test_filter_picks_up_rows_that_commit_out_of_id_order(app):
+    revocation_filter = get_revocation_filter()
+    expires = int(time.time()) + 60
+    db.session.add(RevokedToken(id=10, jti='later-id', token_type='access', expires=expires))
+    db.session.commit()
+    revocation_filter.sync()
+    revocation_filter.sync()
+
+    # A smaller id that only becomes visible now, as when an earlier
+    # transaction commits late on PostgreSQL.
+    db.session.add(RevokedToken(id=5, jti='earlier-id', token_type='access', expires=expires))
+    db.session.commit()
+
+    revocation_filter.sync()
+    assert revocation_filter.is_revoked('earlier-id')
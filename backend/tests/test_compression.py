@@ -0,0 +1,120 @@
+import gzip
+import json
+import zlib
+
+from flask import Response
+
+import compression
+from querylog import query_budget
+
+
+def create_reports(client, headers, count):
+    for i in range(count):
+        client.post('/api/v1/reports', json={'title': f'Report {i}', 'description': 'Long description ' * 20},
+                    headers=headers)
+
+
+def test_large_api_responses_are_gzipped_when_accepted(client, monkeypatch, register):
+    monkeypatch.setattr(compression, 'brotli', None)
+    create_reports(client, register('ann'), 5)
+
+    plain = client.get('/api/v1/reports')
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+
+    zipped = client.get('/api/v1/reports', headers={'Accept-Encoding': 'br;q=1.0, gzip;q=0.5'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert len(zipped.data) < len(plain.data) / 3
+    assert json.loads(gzip.decompress(zipped.data)) == plain.get_json()
+
+    small = client.get('/api/v1/reports/suggest?q=re', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+    assert client.get('/api/v1/reports', headers={'Accept-Encoding': 'br'}).data == plain.data
+
+
+def test_cached_list_pages_are_compressed_once_per_fill(client, monkeypatch, register):
+    create_reports(client, register('ann'), 5)
+    calls = []
+    real_compress = compression.compress
+    monkeypatch.setattr(compression, 'compress', lambda *args: calls.append(args[1]) or real_compress(*args))
+    headers = {'Accept-Encoding': 'gzip'}
+
+    first = client.get('/api/v1/reports', headers=headers)
+    with query_budget(0):
+        for _ in range(3):
+            assert client.get('/api/v1/reports', headers=headers).data == first.data
+    assert calls == ['gzip']
+
+    create_reports(client, register('bob'), 1)
+    assert json.loads(gzip.decompress(client.get('/api/v1/reports', headers=headers).data))['totalItems'] == 6
+    assert calls == ['gzip', 'gzip']
+
+
+def test_streamed_responses_are_compressed_chunk_by_chunk(app, monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+
+    @app.route('/api/v1/test-export')
+    def export():
+        return Response((json.dumps({'n': n}) + '\n' for n in range(1000)), mimetype='application/x-ndjson')
+
+    response = app.test_client().get('/api/v1/test-export', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip' and 'Content-Length' not in response.headers
+    chunks = list(response.response)
+    response.close()
+    # Every input line is flushed as soon as it is produced.
+    assert len(chunks) == 1001
+    assert gzip.decompress(b''.join(chunks)).decode().splitlines()[-1] == '{"n": 999}'
+
+
+class FakeBrotli:
+    """Stands in for the brotli package: zlib wrapped in a marker."""
+
+    def __init__(self):
+        self.qualities = []
+
+    def compress(self, data, quality):
+        self.qualities.append(quality)
+        return b'BR' + zlib.compress(data)
+
+    def Compressor(self, quality):
+        self.qualities.append(quality)
+        encoder = zlib.compressobj()
+
+        class Compressor:
+            def process(self, data):
+                return encoder.compress(data)
+
+            def flush(self):
+                return encoder.flush(zlib.Z_SYNC_FLUSH)
+
+            def finish(self):
+                return encoder.flush()
+
+        return Compressor()
+
+
+def test_brotli_is_preferred_when_installed(app, client, monkeypatch, register):
+    fake = FakeBrotli()
+    monkeypatch.setattr(compression, 'brotli', fake)
+    app.config['BROTLI_QUALITY'] = 7
+
+    @app.route('/api/v1/test-export')
+    def export():
+        return Response((json.dumps({'n': n}) + '\n' for n in range(100)), mimetype='application/x-ndjson')
+
+    create_reports(client, register('ann'), 5)
+    plain = client.get('/api/v1/reports')
+
+    response = client.get('/api/v1/reports', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.data.startswith(b'BR')
+    assert json.loads(zlib.decompress(response.data[2:])) == plain.get_json()
+    assert client.get('/api/v1/reports', headers={'Accept-Encoding': 'gzip'}).headers['Content-Encoding'] == 'gzip'
+
+    streamed = client.get('/api/v1/test-export', headers={'Accept-Encoding': 'br'}, buffered=False)
+    assert streamed.headers['Content-Encoding'] == 'br'
+    chunks = list(streamed.response)
+    streamed.close()
+    assert len(chunks) == 101
+    assert zlib.decompress(b''.join(chunks)).decode().splitlines()[-1] == '{"n": 99}'
+    assert set(fake.qualities) == {7}
@@ -0,0 +1,45 @@
+from querylog import query_budget
+
+FRONTEND = 'https://jiseti-frontend-w02k.onrender.com'
+
+
+def preflight(client, path, origin=FRONTEND, method='PUT', headers='authorization, content-type, idempotency-key'):
+    return client.options(path, headers={
+        'Origin': origin,
+        'Access-Control-Request-Method': method,
+        'Access-Control-Request-Headers': headers,
+    })
+
+
+def test_preflight_is_answered_before_routing(client, app):
+    app.config['CORS_MAX_AGE'] = 7200
+    with query_budget(0):
+        response = preflight(client, '/api/v1/reports/123')
+
+    assert response.status_code == 204
+    assert response.data == b''
+    assert response.headers['Access-Control-Allow-Origin'] == FRONTEND
+    assert response.headers['Access-Control-Allow-Credentials'] == 'true'
+    assert response.headers['Access-Control-Allow-Headers'] == 'authorization, content-type, idempotency-key'
+    assert 'PUT' in response.headers['Access-Control-Allow-Methods']
+    assert response.headers['Access-Control-Max-Age'] == '7200'
+    assert 'X-Request-ID' not in response.headers
+    # Every API path gets the same answer, including ones a browser
+    # preflighted before the explicit OPTIONS routes were removed.
+    for path in ('/api/v1/auth/login', '/api/v1/auth/users/1', '/api/v1/reports'):
+        assert preflight(client, path).status_code == 204
+
+
+def test_disallowed_origins_get_no_cors_headers(client):
+    response = preflight(client, '/api/v1/reports', origin='https://evil.example')
+    assert response.status_code == 204
+    assert 'Access-Control-Allow-Origin' not in response.headers
+    assert 'Access-Control-Allow-Origin' not in preflight(client, '/api/v1/reports', method='PATCH').headers
+
+
+def test_actual_requests_still_carry_cors_headers(client):
+    response = client.get('/api/v1/reports', headers={'Origin': FRONTEND})
+    assert response.status_code == 200
+    assert response.headers['Access-Control-Allow-Origin'] == FRONTEND
+    # A plain OPTIONS is not a preflight and is routed as usual.
+    assert client.options('/api/v1/reports').status_code == 200
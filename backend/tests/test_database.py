@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from database import configure_engine, engine_options, pool_stats
+
+
+def test_postgres_profile_sets_pool_and_statement_timeout(monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '8')
+    monkeypatch.setenv('DB_STATEMENT_TIMEOUT_MS', '1500')
+
+    options = engine_options('postgresql+psycopg://user@localhost/jiseti')
+
+    assert options['pool_size'] == 8
+    assert options['pool_pre_ping'] is True
+    assert options['pool_recycle'] == 1800
+    assert '-c statement_timeout=1500' in options['connect_args']['options']
+
+
+def test_default_profile_leaves_engine_untouched(monkeypatch):
+    monkeypatch.setenv('DB_ENGINE_PROFILE', 'default')
+
+    assert engine_options('postgresql+psycopg://user@localhost/jiseti') == {}
+
+
+def test_sqlite_profile_enables_wal_and_busy_timeout(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLITE_BUSY_TIMEOUT_MS', '2500')
+    url = f"sqlite:///{tmp_path / 'profile.db'}"
+    engine = create_engine(url, **engine_options(url))
+    configure_engine(engine)
+
+    with engine.connect() as conn:
+        assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert conn.execute(text('PRAGMA busy_timeout')).scalar() == 2500
+        assert conn.execute(text('PRAGMA synchronous')).scalar() == 1
+
+    stats = pool_stats(engine)
+    assert stats['checkedout'] == 0
+    assert stats['utilisation'] == 0.0
+
+
+def test_sqlite_statement_timeout_interrupts_long_queries(tmp_path, monkeypatch):
+    monkeypatch.setenv('DB_STATEMENT_TIMEOUT_MS', '50')
+    url = f"sqlite:///{tmp_path / 'timeout.db'}"
+    engine = create_engine(url, **engine_options(url))
+    configure_engine(engine)
+
+    runaway = text(
+        'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) '
+        'SELECT count(*) FROM n'
+    )
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError, match='interrupted'):
+            conn.execute(runaway)
+        assert conn.execute(text('SELECT 1')).scalar() == 1
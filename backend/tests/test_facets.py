@@ -0,0 +1,68 @@
+from sqlalchemy.dialects import postgresql
+
+from facets import FacetCache, facet_statement
+from models import db, Report, User
+from querylog import query_budget
+
+
+def seed(app):
+    user = User(username='seed', email='seed@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    for status, report_type, title in [
+        ('pending', 'corruption', 'Bribe at permit office'),
+        ('pending', 'infrastructure', 'Pothole on Moi Avenue'),
+        ('resolved', 'infrastructure', 'Pothole near school'),
+        ('rejected', 'red-flag', 'Tender irregularities'),
+    ]:
+        db.session.add(Report(status=status, type=report_type, title=title, description='d', location='l',
+                              created_by=user.id))
+    db.session.commit()
+
+
+def test_facets_follow_the_current_filters_in_one_query(client, app):
+    seed(app)
+
+    with query_budget(4) as queries:
+        payload = client.get('/api/v1/reports?facets=status,type').get_json()
+    facet_queries = [shape for shape, _, _ in queries if 'UNION ALL' in shape]
+    assert len(facet_queries) == 1
+    assert payload['facets'] == {
+        'status': {'pending': 2, 'resolved': 1, 'rejected': 1},
+        'type': {'corruption': 1, 'infrastructure': 2, 'red-flag': 1},
+    }
+
+    filtered = client.get('/api/v1/reports?search=pothole&facets=status').get_json()
+    assert filtered['facets'] == {'status': {'pending': 1, 'resolved': 1}}
+    assert 'facets' not in client.get('/api/v1/reports').get_json()
+    assert client.get('/api/v1/reports?facets=created_by').status_code == 400
+
+
+def test_facets_are_cached_until_a_write(client, app, register):
+    seed(app)
+    client.get('/api/v1/reports?facets=status')
+
+    with query_budget(3) as queries:
+        client.get('/api/v1/reports?facets=status')
+    assert not any('UNION ALL' in shape for shape, _, _ in queries)
+
+    client.post('/api/v1/reports', json={'title': 'New', 'description': 'd'}, headers=register('ann'))
+
+    assert client.get('/api/v1/reports?facets=status').get_json()['facets']['status']['pending'] == 3
+
+
+def test_postgresql_uses_grouping_sets():
+    statement = facet_statement([Report.status == 'pending'], ('status', 'type'), 'postgresql')
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert 'GROUP BY GROUPING SETS(reports.status, reports.type)' in sql
+    assert 'WHERE reports.status = %(status_1)s' in sql
+
+
+def test_cache_expires_and_evicts():
+    cache = FacetCache(ttl=30, max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    assert FacetCache(ttl=0).get('a') is None
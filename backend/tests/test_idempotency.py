@@ -0,0 +1,91 @@
+import os
+import threading
+from io import BytesIO
+
+import app as app_module
+from admission import get_admission
+from models import db, IdempotencyKey, Report, ReportMedia
+
+
+def upload(client, headers, key, title='Pothole'):
+    return client.post(
+        '/api/v1/reports',
+        data={'title': title, 'description': 'Deep pothole', 'media': (BytesIO(b'video bytes'), 'clip.mp4')},
+        content_type='multipart/form-data',
+        headers={**headers, 'Idempotency-Key': key},
+    )
+
+
+def test_retries_replay_the_first_response_without_writing_again(client, app, register):
+    headers = register('ann')
+
+    first = upload(client, headers, 'retry-1')
+    retry = upload(client, headers, 'retry-1')
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json()['id'] == first.get_json()['id']
+    assert Report.query.count() == 1 and ReportMedia.query.count() == 1
+    assert len(os.listdir(app.config['UPLOAD_FOLDER'])) == 1
+
+    assert upload(client, headers, 'retry-1', title='Something else').status_code == 422
+    assert upload(client, register('bob'), 'retry-1').get_json()['id'] != first.get_json()['id']
+
+    report_id = first.get_json()['id']
+    edit = {**headers, 'Idempotency-Key': 'edit-1'}
+    assert client.put(f'/api/v1/reports/{report_id}', json={'title': 'A'}, headers=edit).status_code == 200
+    client.put(f'/api/v1/reports/{report_id}', json={'title': 'B'}, headers=headers)
+    replay = client.put(f'/api/v1/reports/{report_id}', json={'title': 'A'}, headers=edit)
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert db.session.get(Report, report_id).title == 'B'
+
+
+def test_concurrent_duplicate_waits_for_the_first_request(client, app, monkeypatch, register):
+    headers = register('ann')
+    entered, release = threading.Event(), threading.Event()
+    real_find_duplicates = app_module.find_duplicates
+
+    def slow_find_duplicates(*args, **kwargs):
+        entered.set()
+        release.wait(5)
+        return real_find_duplicates(*args, **kwargs)
+
+    monkeypatch.setattr(app_module, 'find_duplicates', slow_find_duplicates)
+    responses = {}
+
+    def send(name):
+        responses[name] = upload(app.test_client(), headers, 'same-key')
+
+    first = threading.Thread(target=send, args=('first',))
+    first.start()
+    assert entered.wait(5)
+    entered.clear()
+    second = threading.Thread(target=send, args=('second',))
+    second.start()
+    second.join(0.5)
+    assert second.is_alive() and not entered.is_set()
+    # The waiting duplicate does not hold one of the few bulk slots.
+    assert get_admission().stats()['classes']['bulk']['active'] == 1
+
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert responses['first'].get_json()['id'] == responses['second'].get_json()['id']
+    assert responses['second'].headers['Idempotent-Replayed'] == 'true'
+    assert Report.query.count() == 1
+    assert get_admission().stats()['active'] == 0
+
+
+def test_server_errors_release_the_key(client, app, monkeypatch, register):
+    headers = register('ann')
+
+    def broken(report):
+        raise RuntimeError('index unavailable')
+
+    monkeypatch.setattr(app_module, 'index_report', broken)
+    assert upload(client, headers, 'flaky').status_code == 500
+    assert IdempotencyKey.query.count() == 0
+
+    monkeypatch.undo()
+    retry = upload(client, headers, 'flaky')
+    assert retry.status_code == 201 and 'Idempotent-Replayed' not in retry.headers
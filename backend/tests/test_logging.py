@@ -0,0 +1,94 @@
+import json
+import logging
+import queue
+import threading
+
+from flask import Flask, g
+
+from app import create_app
+from logging_setup import JsonFormatter, LogStats, NonBlockingQueueHandler, SamplingFilter, redact, stats
+
+
+def make_record(msg, *args, level=logging.INFO, name='app', **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_redact_masks_secret_keys_and_inline_values():
+    payload = {'username': 'ann', 'password': 'hunter22', 'nested': [{'refresh_token': 'abc'}]}
+    assert redact(payload) == {'username': 'ann', 'password': '[REDACTED]', 'nested': [{'refresh_token': '[REDACTED]'}]}
+
+    message = redact("Registration attempt: {'username': 'ann', 'password': 'hunter22'} Bearer eyJhbGciOi.x.y")
+    assert 'hunter22' not in message
+    assert 'eyJhbGciOi' not in message
+    assert "'username': 'ann'" in message
+
+
+def test_sampling_keeps_warnings_and_inherits_parent_rate():
+    sampler = SamplingFilter({'app': 0.0})
+
+    assert not sampler.filter(make_record('chatty', name='app.routes'))
+    assert sampler.filter(make_record('kept', name='werkzeug'))
+    assert sampler.filter(make_record('problem', level=logging.WARNING, name='app.routes'))
+
+
+def test_queue_handler_drops_instead_of_blocking_when_full():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    dropped_before = stats.dropped
+
+    handler.handle(make_record('first'))
+    handler.handle(make_record('second'))
+
+    assert handler.queue.qsize() == 1
+    assert stats.dropped == dropped_before + 1
+
+
+def test_records_are_redacted_and_carry_request_context():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    app = Flask(__name__)
+
+    with app.test_request_context('/api/v1/auth/register', method='POST'):
+        g.request_id = 'req-1'
+        handler.handle(make_record('Registration attempt: %s', {'password': 'hunter22'}, payload={'token': 't'}))
+
+    line = JsonFormatter().format(handler.queue.get_nowait())
+    entry = json.loads(line)
+    assert 'hunter22' not in line
+    assert entry['payload'] == {'token': '[REDACTED]'}
+    assert entry['request_id'] == 'req-1'
+    assert entry['path'] == '/api/v1/auth/register'
+    assert entry['level'] == 'INFO'
+
+
+def test_register_does_not_log_password(client, app, caplog):
+    with caplog.at_level(logging.DEBUG):
+        client.post(
+            '/api/v1/auth/register',
+            json={'username': 'liz', 'email': 'liz@example.com', 'password': 'hunter22'}
+        )
+
+    assert 'hunter22' not in caplog.text
+
+
+def test_creating_an_app_leaves_the_root_logger_alone():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    create_app()
+    assert (root.handlers, root.level) == (handlers, level)
+
+
+def test_stats_do_not_lose_counts_across_threads():
+    counts = LogStats()
+
+    def log_many():
+        for _ in range(10000):
+            counts.incr('enqueued')
+
+    threads = [threading.Thread(target=log_many) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counts.enqueued == 40000
@@ -0,0 +1,75 @@
+import json
+from io import BytesIO
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from metrics import Registry, merge_snapshots, render
+from models import db
+from querylog import query_budget
+
+
+def test_metrics_endpoint_reports_routes_queries_and_uploads(client, app, register):
+    headers = register('mia')
+    # Latency is recorded when the server closes the response body.
+    client.post(
+        '/api/v1/reports',
+        data={'title': 'T', 'description': 'D', 'media': (BytesIO(b'12345678'), 'proof.png')},
+        content_type='multipart/form-data',
+        headers=headers
+    ).close()
+    client.get('/api/v1/reports').close()
+
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert 'jiseti_http_requests_total{blueprint="reports",route="/api/v1/reports",method="GET",status="200"} 1' in body
+    assert 'jiseti_http_request_duration_seconds_count{blueprint="auth",route="/api/v1/auth/register",method="POST"} 1' in body
+    assert 'jiseti_db_queries_total{operation="INSERT"}' in body
+    assert 'jiseti_db_queries_per_request_count{blueprint="reports",route="/api/v1/reports"} 2' in body
+    assert 'jiseti_upload_bytes_total{endpoint="reports.create_report"} 8' in body
+    assert "\njiseti_http_requests_in_flight 1\n" in body
+    assert 'jiseti_db_pool_connections{state="checkedout"}' in body
+
+
+
+def test_failed_statements_do_not_leave_timers_behind(app):
+    with query_budget(5):
+        with pytest.raises(OperationalError):
+            db.session.execute(text('SELECT * FROM no_such_table'))
+        db.session.rollback()
+        info = db.session.connection().info
+        assert info.get('query_start') == [] and info.get('querylog_start') == []
+
+def test_metrics_aggregate_worker_snapshots(app, tmp_path):
+    metrics = app.extensions['metrics']
+    metrics.directory = str(tmp_path)
+    metrics.registry.inc('jiseti_http_requests_total', ('reports', '/api/v1/reports', 'GET', '200'), 3)
+    metrics.registry.inc('jiseti_http_requests_in_flight', (), 2)
+
+    other = Registry()
+    other.counter('jiseti_http_requests_total', 'HTTP requests handled.')
+    other.gauge('jiseti_http_requests_in_flight', 'In flight.')
+    other.inc('jiseti_http_requests_total', ('reports', '/api/v1/reports', 'GET', '200'), 4)
+    other.inc('jiseti_http_requests_in_flight', (), 5)
+    # A worker that has exited: its counters still count, its gauges do not.
+    (tmp_path / 'metrics-999999999.json').write_text(json.dumps({'pid': 999999999, 'metrics': other.snapshot()}))
+
+    merged = metrics.collect()
+
+    assert merged['jiseti_http_requests_total']['values'][('reports', '/api/v1/reports', 'GET', '200')] == 7
+    assert merged['jiseti_http_requests_in_flight']['values'][()] == 2
+
+
+def test_histogram_rendering_is_cumulative():
+    registry = Registry()
+    registry.histogram('latency', 'Latency.', buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5):
+        registry.observe('latency', ('x',), value)
+
+    text = render(merge_snapshots([(registry.snapshot(), True)]), {'latency': ('route',)})
+
+    assert 'latency_bucket{route="x",le="0.1"} 1' in text
+    assert 'latency_bucket{route="x",le="1.0"} 2' in text
+    assert 'latency_bucket{route="x",le="+Inf"} 3' in text
+    assert 'latency_count{route="x"} 3' in text
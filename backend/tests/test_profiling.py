@@ -0,0 +1,64 @@
+import time
+
+from profiling import folded, unfold
+
+
+def test_admin_can_profile_a_single_request(client, app, tmp_path, register):
+    app.config['PROFILE_DIR'] = str(tmp_path)
+    admin = register('root', role='admin')
+    user = register('ann')
+    client.post('/api/v1/reports', json={'title': 'Pothole', 'description': 'Deep'}, headers=user)
+
+    plain = client.get('/api/v1/reports/1', headers=admin)
+    assert 'X-Profile-Id' not in plain.headers
+    # Ignored for everyone else.
+    ignored = client.get('/api/v1/reports?_profile=1', headers=user)
+    ignored.close()
+    assert 'X-Profile-Id' not in ignored.headers
+    assert list(tmp_path.iterdir()) == []
+
+    response = client.get('/api/v1/reports?status=pending', headers={**admin, 'X-Profile': '1'})
+    # Stored once the server has sent the response.
+    response.close()
+    assert response.status_code == 200
+    assert response.get_json()['items'][0] == plain.get_json()
+    profile_id = response.headers['X-Profile-Id']
+
+    profile = client.get(f'/api/v1/admin/profiles/{profile_id}', headers=admin).get_json()
+    assert (profile['trigger'], profile['method'], profile['path'], profile['status']) == (
+        'request', 'GET', '/api/v1/reports', 200
+    )
+    assert any('reports' in query['statement'] for query in profile['sql']['statements'])
+    assert profile['allocations']['peak_bytes'] > 0
+    assert profile['allocations']['top']
+    assert unfold(profile['folded']) and folded(unfold(profile['folded'])) == profile['folded']
+
+    listing = client.get('/api/v1/admin/profiles', headers=admin).get_json()['profiles']
+    assert [p['id'] for p in listing] == [profile_id]
+    svg = client.get(f'/api/v1/admin/profiles/{profile_id}/flamegraph.svg', headers=admin)
+    assert svg.content_type == 'image/svg+xml'
+    assert svg.data.startswith(b'<svg')
+    assert client.get(f'/api/v1/admin/profiles/{profile_id}', headers=user).status_code == 403
+    assert client.get('/api/v1/admin/profiles/..%2Fapp', headers=admin).status_code == 404
+
+
+def test_capture_stores_the_nth_slowest_request(client, app, tmp_path, register):
+    app.config['PROFILE_DIR'] = str(tmp_path)
+    admin = register('root', role='admin')
+    response = client.post(
+        '/api/v1/admin/profiles/capture', json={'endpoint': 'ping', 'rank': 2, 'window': 4}, headers=admin
+    )
+    assert response.status_code == 202
+    assert client.post('/api/v1/admin/profiles/capture', json={'endpoint': 'nope'}, headers=admin).status_code == 400
+
+    delays = iter([0.0, 0.03, 0.06, 0.0, 0.0])
+    view = app.view_functions['ping']
+    app.view_functions['ping'] = lambda: (time.sleep(next(delays)), view())[1]
+    for _ in range(5):
+        client.get('/ping').close()
+
+    profiles = client.get('/api/v1/admin/profiles', headers=admin).get_json()['profiles']
+    assert len(profiles) == 1
+    assert profiles[0]['trigger'] == 'capture:ping'
+    assert 30 <= profiles[0]['duration_ms'] < 60
+    assert client.get('/api/v1/admin/profiles/capture', headers=admin).get_json()['captures'] == []
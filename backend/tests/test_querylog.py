@@ -0,0 +1,76 @@
+import logging
+
+import pytest
+
+from app import create_app
+from models import db, Report, ReportMedia, User
+from querylog import QueryBudgetExceeded, parameter_shape, query_budget, statement_shape
+
+
+def seed_reports(count):
+    user = User(username='seed', email='seed@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    for i in range(count):
+        report = Report(type='infrastructure', title=f'Report {i}', description='d', location='l', created_by=user.id)
+        report.media_files.append(ReportMedia(
+            filename=f'{i}.png', original_filename=f'{i}.png', file_path=f'/tmp/{i}.png', file_size=10
+        ))
+        db.session.add(report)
+    db.session.commit()
+
+
+def test_shapes_fold_values_and_placeholder_lists():
+    assert statement_shape('SELECT * FROM t WHERE id IN (?, ?, ?)\n LIMIT 10') == \
+        statement_shape('SELECT *  FROM t WHERE id IN (?, ?) LIMIT 20')
+    assert parameter_shape((1, 'a')) == '(int, str)'
+    assert parameter_shape({'id': 1}) == '{id: int}'
+    assert parameter_shape([(1,), (2,)], executemany=True) == '2 x (int)'
+
+
+def test_report_listing_stays_within_query_budget(client, app):
+    seed_reports(8)
+
+    # Count, page of reports and one batched media load, however many
+    # reports are on the page.
+    with query_budget(3, n_plus_one_threshold=3):
+        response = client.get('/api/v1/reports')
+
+    assert len(response.get_json()['items']) == 8
+
+
+def test_query_budget_fails_on_lazy_loading(app):
+    seed_reports(4)
+    db.session.expire_all()
+
+    with pytest.raises(QueryBudgetExceeded, match='N\\+1: 4 x SELECT'):
+        with query_budget(10, n_plus_one_threshold=3):
+            [report.to_dict() for report in Report.query.all()]
+
+
+def test_inspector_logs_n_plus_one_and_slow_queries(tmp_path, monkeypatch, caplog):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('FLASK_INSTANCE_PATH', str(tmp_path / 'instance'))
+    monkeypatch.setenv('SQL_INSPECT_ENABLED', 'true')
+    monkeypatch.setenv('SQL_SLOW_QUERY_MS', '0')
+    monkeypatch.setenv('SQL_N_PLUS_ONE_THRESHOLD', '3')
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed_reports(4)
+
+        @app.route('/lazy')
+        def lazy():
+            return {'items': [report.to_dict() for report in Report.query.all()]}
+
+        with caplog.at_level(logging.WARNING, logger='querylog'):
+            app.test_client().get('/lazy').close()
+        db.session.remove()
+
+    events = [record for record in caplog.records if record.name == 'querylog']
+    n_plus_one = [record for record in events if record.event == 'n_plus_one']
+    assert len(n_plus_one) == 1
+    assert n_plus_one[0].count == 4
+    assert n_plus_one[0].path == '/lazy'
+    slow = [record for record in events if record.event == 'slow_query']
+    assert slow and all(record.parameters.startswith('(') for record in slow)
@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy import event
+
+from models import db
+from ratelimit import SQLiteBackend, parse_limit
+
+
+def test_parse_limit():
+    assert parse_limit('10/minute') == (10, 10 / 60)
+    assert parse_limit('3/seconds') == (3, 3)
+    with pytest.raises(ValueError):
+        parse_limit('5/fortnight')
+
+
+def test_login_is_throttled_per_ip_with_retry_after(client, app):
+    limiter = app.extensions['rate_limiter']
+    limiter.rules['auth.login'] = {'ip': parse_limit('3/minute')}
+    credentials = {'email': 'nobody@example.com', 'password': 'wrong-password'}
+
+    for _ in range(3):
+        assert client.post('/api/v1/auth/login', json=credentials).status_code == 401
+
+    throttled = client.post('/api/v1/auth/login', json=credentials)
+    assert throttled.status_code == 429
+    assert int(throttled.headers['Retry-After']) >= 1
+
+    other_ip = client.post('/api/v1/auth/login', json=credentials, environ_base={'REMOTE_ADDR': '10.0.0.9'})
+    assert other_ip.status_code == 401
+
+
+def test_throttled_request_does_no_database_work(client, app):
+    limiter = app.extensions['rate_limiter']
+    limiter.rules['auth.register'] = {'ip': parse_limit('1/minute')}
+    client.post('/api/v1/auth/register', json={'username': 'x', 'email': 'x@example.com', 'password': 'secret123'})
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.post(
+            '/api/v1/auth/register',
+            json={'username': 'y', 'email': 'y@example.com', 'password': 'secret123'}
+        )
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert response.status_code == 429
+    assert statements == []
+
+
+def test_report_creation_is_limited_per_user(client, app):
+    limiter = app.extensions['rate_limiter']
+    limiter.rules['reports.create_report'] = {'user': parse_limit('2/minute')}
+    tokens = []
+    for name in ('uma', 'vic'):
+        response = client.post(
+            '/api/v1/auth/register',
+            json={'username': name, 'email': f'{name}@example.com', 'password': 'secret123'}
+        )
+        tokens.append(response.get_json()['access_token'])
+
+    def create(token):
+        return client.post(
+            '/api/v1/reports',
+            json={'title': 'Flood', 'description': 'Road under water'},
+            headers={'Authorization': f'Bearer {token}'}
+        )
+
+    assert create(tokens[0]).status_code == 201
+    assert create(tokens[0]).status_code == 201
+    assert create(tokens[0]).status_code == 429
+    assert create(tokens[1]).status_code == 201
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'buckets.db')
+    worker_a = SQLiteBackend(path)
+    worker_b = SQLiteBackend(path)
+    capacity, rate = parse_limit('2/minute')
+
+    assert worker_a.consume('login:ip:1.2.3.4', capacity, rate)[0]
+    assert worker_b.consume('login:ip:1.2.3.4', capacity, rate)[0]
+    allowed, retry_after = worker_a.consume('login:ip:1.2.3.4', capacity, rate)
+    assert not allowed
+    assert 0 < retry_after <= 30
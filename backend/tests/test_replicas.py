@@ -0,0 +1,71 @@
+import pytest
+
+from app import create_app
+from models import db, Report, User
+
+
+@pytest.fixture
+def replicated_app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setenv('DATABASE_REPLICA_URLS', f"sqlite:///{tmp_path / 'replica.db'}")
+    monkeypatch.setenv('FLASK_INSTANCE_PATH', str(tmp_path / 'instance'))
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        replica = app.extensions['replica_router'].engines[0]
+        db.metadata.create_all(replica)
+        # Seed the replica with a row the primary does not have, so the
+        # tests can tell which database answered.
+        with replica.begin() as conn:
+            conn.execute(User.__table__.insert(), {'id': 99, 'username': 'r', 'email': 'r@example.com', 'password_hash': 'x'})
+            conn.execute(Report.__table__.insert(), {
+                'type': 'infrastructure', 'title': 'Only on replica', 'description': 'd',
+                'location': 'l', 'status': 'pending', 'created_by': 99,
+            })
+        yield app
+        db.session.remove()
+
+
+def titles(response):
+    return [item['title'] for item in response.get_json()['items']]
+
+
+def test_anonymous_reads_go_to_replica(replicated_app):
+    client = replicated_app.test_client()
+
+    assert titles(client.get('/api/v1/reports')) == ['Only on replica']
+
+
+def test_writes_go_to_primary_and_writer_reads_own_writes(replicated_app):
+    client = replicated_app.test_client()
+    register = client.post(
+        '/api/v1/auth/register',
+        json={'username': 'wanda', 'email': 'wanda@example.com', 'password': 'secret123'}
+    )
+    token = register.get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    created = client.post('/api/v1/reports', json={'title': 'Fresh', 'description': 'Just filed'}, headers=headers)
+    assert created.status_code == 201
+
+    with replicated_app.app_context():
+        assert Report.query.filter_by(title='Fresh').count() == 1
+
+    # The writer is pinned to the primary for the read-your-writes window,
+    # even from a client without the cookie.
+    assert titles(replicated_app.test_client().get('/api/v1/reports', headers=headers)) == ['Fresh']
+    # Other clients keep reading from the replica.
+    assert titles(replicated_app.test_client().get('/api/v1/reports', environ_base={'REMOTE_ADDR': '10.1.1.1'})) == ['Only on replica']
+
+
+def test_stickiness_expires(replicated_app):
+    replicated_app.extensions['replica_router'].window = 0
+    client = replicated_app.test_client()
+    client.post(
+        '/api/v1/auth/register',
+        json={'username': 'xena', 'email': 'xena@example.com', 'password': 'secret123'}
+    )
+    client.delete_cookie('jiseti_primary_until')
+
+    assert titles(client.get('/api/v1/reports')) == ['Only on replica']
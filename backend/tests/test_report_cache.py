@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+from io import BytesIO
+
+from sqlalchemy import update
+
+from models import db, Report
+from querylog import query_budget
+from report_cache import get_report_cache
+
+
+def create(client, headers):
+    response = client.post(
+        '/api/v1/reports',
+        data={'title': 'Pothole', 'description': 'Deep pothole', 'media': (BytesIO(b'photo'), 'one.jpg')},
+        content_type='multipart/form-data',
+        headers=headers,
+    )
+    return response.get_json()['id']
+
+
+def test_hits_skip_the_database_and_every_write_evicts(client, app, register):
+    get_report_cache().verify = False
+    headers = register('ann')
+    report_id = create(client, headers)
+
+    first = client.get(f'/api/v1/reports/{report_id}')
+    with query_budget(0):
+        assert client.get(f'/api/v1/reports/{report_id}').get_json() == first.get_json()
+
+    client.put(f'/api/v1/reports/{report_id}', json={'title': 'Crater'}, headers=headers)
+    assert client.get(f'/api/v1/reports/{report_id}').get_json()['title'] == 'Crater'
+
+    client.put(
+        f'/api/v1/reports/{report_id}',
+        data={'media': (BytesIO(b'video'), 'two.mp4')}, content_type='multipart/form-data', headers=headers,
+    )
+    media = client.get(f'/api/v1/reports/{report_id}').get_json()['media']
+    assert sorted(m['original_filename'] for m in media) == ['one.jpg', 'two.mp4']
+
+    client.put(f'/api/v1/reports/{report_id}', json={'remove_media_ids': [media[0]['id']]}, headers=headers)
+    assert len(client.get(f'/api/v1/reports/{report_id}').get_json()['media']) == 1
+
+    db.session.get(Report, report_id).status = 'under-investigation'
+    db.session.commit()
+    assert client.get(f'/api/v1/reports/{report_id}').get_json()['status'] == 'under-investigation'
+
+    db.session.execute(update(Report).where(Report.id == report_id).values(status='resolved'))
+    db.session.commit()
+    assert client.get(f'/api/v1/reports/{report_id}').get_json()['status'] == 'resolved'
+
+    db.session.delete(db.session.get(Report, report_id))
+    db.session.commit()
+    assert client.get(f'/api/v1/reports/{report_id}').status_code == 404
+
+
+def test_verified_hits_catch_writes_from_other_workers(client, app, register):
+    report_id = create(client, register('ann'))
+    client.get(f'/api/v1/reports/{report_id}')
+
+    with query_budget(1) as queries:
+        assert client.get(f'/api/v1/reports/{report_id}').get_json()['title'] == 'Pothole'
+    assert len(queries) == 1
+
+    # Bypasses this process's session, as another worker's commit would.
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(Report).where(Report.id == report_id)
+            .values(title='Crater', updated_at=datetime.now(timezone.utc))
+        )
+    assert client.get(f'/api/v1/reports/{report_id}').get_json()['title'] == 'Crater'
+
+
+def test_fill_loaded_before_a_commit_is_dropped(client, app):
+    cache = get_report_cache()
+    epoch = cache.epoch
+    cache.evict([1])
+    cache.put(1, None, '{"title": "old"}', epoch)
+    assert len(cache) == 0
+
+    cache.put(1, None, '{"title": "new"}', cache.epoch)
+    db.session.rollback()
+    assert len(cache) == 1
@@ -0,0 +1,91 @@
+import json
+from io import BytesIO
+
+from models import db, Report, ReportImportKey, User
+from report_import import import_reports
+
+
+def test_admin_can_import_csv_with_row_errors_and_duplicates(client, app, register):
+    headers = register('root', role='admin')
+    admin_id = User.query.filter_by(username='root').one().id
+    csv_body = (
+        "external_id,title,description,type,location,status,created_at\n"
+        "A1,Pothole,Deep pothole on Moi Ave,infrastructure,Nairobi,pending,2025-06-01T08:00:00Z\n"
+        "A2,Bribe,Officer asked for a bribe,corruption,Thika,resolved,\n"
+        "A3,,No title,corruption,Thika,pending,\n"
+        "A1,Pothole again,Same external id,infrastructure,Nairobi,pending,\n"
+        "A4,Bad type,Whatever,weather,Nairobi,pending,\n"
+    )
+
+    response = client.post(
+        '/api/v1/admin/reports/import?source=nairobi-county',
+        data={'file': (BytesIO(csv_body.encode()), 'reports.csv')},
+        content_type='multipart/form-data',
+        headers=headers
+    )
+
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert (summary['created'], summary['duplicates'], summary['failed']) == (2, 1, 2)
+    assert {(e['row'], e['error']) for e in summary['errors']} == {
+        (4, 'Missing field: title'),
+        (6, 'Invalid type: weather'),
+    }
+    pothole = Report.query.filter_by(title='Pothole').one()
+    assert pothole.created_by == admin_id
+    assert pothole.created_at.isoformat().startswith('2025-06-01T08:00:00')
+    assert ReportImportKey.query.filter_by(source='nairobi-county', natural_key='id:A1').one().report_id == pothole.id
+
+    # Sending the same dump again creates nothing.
+    again = client.post(
+        '/api/v1/admin/reports/import?source=nairobi-county',
+        data=csv_body.encode(),
+        content_type='text/csv',
+        headers=headers
+    ).get_json()
+    assert (again['created'], again['duplicates']) == (0, 3)
+
+
+def test_import_requires_admin_and_source(client, app, register):
+    headers = register('root', role='admin')
+    response = client.post('/api/v1/admin/reports/import', data=b'title\nx\n', content_type='text/csv', headers=headers)
+    assert response.status_code == 400
+
+    response = client.post(
+        '/api/v1/admin/reports/import?source=nairobi-county', data=b'title\nx\n', content_type='text/csv',
+        headers=register('eve')
+    )
+    assert response.status_code == 403
+    assert Report.query.count() == 0
+
+
+def test_non_string_fields_fail_only_their_row(app):
+    user = User(username='agency', email='agency@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    rows = [{'title': 5, 'description': 'd'}, {'title': 'Pothole', 'description': 'Deep', 'status': ['resolved']},
+            {'title': 'Streetlight', 'description': 'Broken'}]
+    stream = '\n'.join(json.dumps(row) for row in rows)
+
+    summary = import_reports(BytesIO(stream.encode()), source='kisumu', owner_id=user.id, fmt='ndjson')
+
+    assert (summary['created'], summary['failed']) == (1, 2)
+    assert [e['error'] for e in summary['errors']] == ['title must be a string', 'status must be a string']
+
+
+def test_rows_without_external_id_dedupe_on_content_across_batches(app):
+    user = User(username='agency', email='agency@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    rows = [{'title': f'Report {i % 30}', 'description': 'Broken  streetlight', 'location': 'Kisumu'} for i in range(100)]
+    stream = '\n'.join(json.dumps(row) for row in rows)
+    progress = []
+
+    summary = import_reports(
+        BytesIO(stream.encode()), source='kisumu', owner_id=user.id, fmt='ndjson', batch_size=25,
+        progress=lambda *counts: progress.append(counts)
+    )
+
+    assert (summary['created'], summary['duplicates'], summary['failed']) == (30, 70, 0)
+    assert progress[-1] == (100, 30, 70, 0)
+    assert Report.query.count() == 30
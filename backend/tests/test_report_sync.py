@@ -0,0 +1,138 @@
+import json
+import os
+from io import BytesIO
+
+import report_sync
+from models import db, Report, ReportMedia, UserUsage
+from querylog import query_budget
+
+
+def batch_body(items, boundary='sync-boundary'):
+    """``items`` is a list of (report dict or raw str, [(filename, bytes), ...])."""
+    parts = []
+    for report, media in items:
+        payload = report if isinstance(report, str) else json.dumps(report)
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="report"\r\n'
+            f'Content-Type: application/json\r\n\r\n{payload}\r\n'.encode()
+        )
+        for filename, content in media:
+            parts.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="media"; filename="{filename}"\r\n'
+                f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b'\r\n'
+            )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def test_batch_creates_reports_with_their_own_media_and_per_item_results(client, app, register):
+    headers = register('officer')
+    body, content_type = batch_body([
+        ({'client_id': 'a1', 'title': 'Pothole', 'description': 'Deep', 'type': 'infrastructure'},
+         [('one.jpg', b'first photo'), ('two.mp4', b'video')]),
+        ({'client_id': 'a2', 'description': 'No title'}, [('three.jpg', b'orphaned')]),
+        ('{not json', []),
+        ({'client_id': 'a4', 'title': 'Bribe', 'description': 'At the office'}, [('virus.exe', b'nope')]),
+        ({'client_id': 'a5', 'title': 'Bribe', 'description': 'At the office'}, []),
+    ])
+
+    response = client.post('/api/v1/reports/batch', data=body, content_type=content_type, headers=headers)
+
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert (summary['created'], summary['failed']) == (2, 3)
+    results = summary['results']
+    assert [r['status'] for r in results] == ['created', 'error', 'error', 'error', 'created']
+    assert results[1] == {'index': 1, 'client_id': 'a2', 'status': 'error', 'error': 'Missing field: title'}
+    assert results[3]['error'] == 'File type not allowed: virus.exe'
+
+    first = Report.query.get(results[0]['id'])
+    assert sorted(m.original_filename for m in first.media_files) == ['one.jpg', 'two.mp4']
+    assert ReportMedia.query.count() == 2
+    # Files of rejected items are not left behind.
+    assert len(os.listdir(app.config['UPLOAD_FOLDER'])) == 2
+    assert client.get(first.media_files[0].to_dict()['url']).status_code == 200
+
+
+def test_reports_are_committed_per_chunk(client, app, monkeypatch, register):
+    app.config['BATCH_SYNC_CHUNK_SIZE'] = 50
+    headers = register('officer')
+    body, content_type = batch_body([
+        ({'client_id': str(i), 'title': f'Report {i}', 'description': 'Collected offline'}, [])
+        for i in range(200)
+    ])
+    commits = []
+    real_commit = db.session.commit
+    monkeypatch.setattr(db.session, 'commit', lambda: commits.append(1) or real_commit())
+
+    with query_budget(250) as queries:
+        response = client.post('/api/v1/reports/batch', data=body, content_type=content_type, headers=headers)
+
+    assert response.get_json()['created'] == 200
+    assert [r['client_id'] for r in response.get_json()['results']] == [str(i) for i in range(200)]
+    assert len(commits) == 4
+    assert not any(shape.startswith('SELECT reports') for shape, _, _ in queries)
+    assert Report.query.count() == 200
+
+
+def test_fields_of_the_wrong_type_fail_only_their_item(client, app, register):
+    app.config['BATCH_SYNC_CHUNK_SIZE'] = 1
+    headers = register('officer')
+    body, content_type = batch_body([
+        ({'client_id': 'a1', 'title': 'Pothole', 'description': 'Deep'}, []),
+        ({'client_id': 'a2', 'title': 5, 'description': 'd'}, [('one.jpg', b'photo')]),
+        ({'client_id': 'a3', 'title': 'Bribe', 'description': {'text': 'At the office'}}, []),
+        ({'client_id': 'a4', 'title': 'Streetlight', 'description': 'Broken'}, []),
+    ])
+
+    response = client.post('/api/v1/reports/batch', data=body, content_type=content_type, headers=headers)
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == ['created', 'error', 'error', 'created']
+    assert [r.get('error') for r in results[1:3]] == ['title must be a string', 'description must be a string']
+    assert Report.query.count() == 2
+    assert os.listdir(app.config['UPLOAD_FOLDER']) == []
+
+
+
+def test_quota_holds_against_uploads_that_land_while_a_batch_streams(client, app, monkeypatch, register):
+    app.config['USER_STORAGE_QUOTA'] = 100
+    headers = register('officer')
+    client.post(
+        '/api/v1/reports',
+        data={'title': 'Earlier', 'description': 'd', 'media': (BytesIO(b'x' * 80), 'big.jpg')},
+        content_type='multipart/form-data', headers=headers,
+    )
+    # The batch took its snapshot before that upload committed.
+    monkeypatch.setattr(report_sync, 'storage_used', lambda user_id: 0)
+    body, content_type = batch_body([
+        ({'client_id': 'a1', 'title': 'One', 'description': 'd'}, [('one.jpg', b'y' * 15)]),
+        ({'client_id': 'a2', 'title': 'Two', 'description': 'd'}, [('two.jpg', b'z' * 15)]),
+    ])
+
+    results = client.post(
+        '/api/v1/reports/batch', data=body, content_type=content_type, headers=headers
+    ).get_json()['results']
+
+    assert [r.get('error') for r in results] == [None, 'Storage quota exceeded']
+    assert db.session.query(UserUsage.storage_bytes).scalar() == 95
+    assert sorted(os.path.getsize(os.path.join(app.config['UPLOAD_FOLDER'], name))
+                  for name in os.listdir(app.config['UPLOAD_FOLDER'])) == [15, 80]
+
+def test_batch_limits(client, app, register):
+    app.config['BATCH_SYNC_MAX_ITEMS'] = 1
+    headers = register('officer')
+    body, content_type = batch_body([
+        ({'title': 'One', 'description': 'd'}, []),
+        ({'title': 'Two', 'description': 'd'}, []),
+    ])
+    results = client.post(
+        '/api/v1/reports/batch', data=body, content_type=content_type, headers=headers
+    ).get_json()['results']
+    assert [r['status'] for r in results] == ['created', 'error']
+
+    truncated = body[:len(body) // 2]
+    response = client.post('/api/v1/reports/batch', data=truncated, content_type=content_type, headers=headers)
+    assert response.status_code == 400
+    assert client.post('/api/v1/reports/batch', json={}, headers=headers).status_code == 400
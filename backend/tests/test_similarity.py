@@ -0,0 +1,111 @@
+import os
+from io import BytesIO
+
+import app as app_module
+from models import db, Report, ReportMedia, ReportSimilarityBucket, User
+from querylog import query_budget
+from similarity import BANDS, buckets_for, find_duplicates, jaccard, rebuild_index, shingles
+
+
+def create(client, headers, title, description, location='Nairobi'):
+    return client.post(
+        '/api/v1/reports',
+        json={'title': title, 'description': description, 'location': location, 'type': 'infrastructure'},
+        headers=headers
+    )
+
+
+def test_similar_text_shares_buckets_and_different_text_does_not():
+    first = shingles('Huge pothole on Moi Avenue', 'A huge pothole near the bus stop is damaging cars', 'Nairobi CBD')
+    second = shingles('Huge pothole, Moi Avenue!', 'Huge pothole near the bus stop is damaging cars daily', 'nairobi cbd')
+    other = shingles('Bribe at county office', 'Clerk demanded cash for a business permit', 'Thika')
+
+    assert jaccard(first, second) > 0.7
+    assert jaccard(first, other) == 0
+    a = buckets_for('Huge pothole on Moi Avenue', 'A huge pothole near the bus stop is damaging cars', 'Nairobi CBD')
+    b = buckets_for('Huge pothole, Moi Avenue!', 'Huge pothole near the bus stop is damaging cars daily', 'nairobi cbd')
+    c = buckets_for('Bribe at county office', 'Clerk demanded cash for a business permit', 'Thika')
+    assert len(a) == BANDS
+    assert set(a) & set(b)
+    assert not set(a) & set(c)
+
+
+def test_create_returns_possible_duplicates(client, app, register):
+    headers = register('ann')
+    first = create(client, headers, 'Huge pothole on Moi Avenue', 'A huge pothole near the bus stop is damaging cars')
+    assert first.status_code == 201
+    assert first.get_json()['possible_duplicates'] == []
+    create(client, headers, 'Bribe at county office', 'Clerk demanded cash for a business permit', 'Thika')
+
+    second = create(client, headers, 'Huge pothole, Moi Avenue', 'Huge pothole near the bus stop is damaging cars daily')
+
+    duplicates = second.get_json()['possible_duplicates']
+    assert [d['id'] for d in duplicates] == [first.get_json()['id']]
+    assert duplicates[0]['score'] >= 0.5
+
+
+def test_failed_duplicate_lookup_keeps_the_committed_report(client, app, monkeypatch, register):
+    headers = register('ann')
+
+    def broken(*args, **kwargs):
+        raise RuntimeError('similarity index unavailable')
+
+    monkeypatch.setattr(app_module, 'find_duplicates', broken)
+    response = client.post(
+        '/api/v1/reports',
+        data={'title': 'Pothole', 'description': 'Deep', 'media': (BytesIO(b'image'), 'photo.jpg')},
+        content_type='multipart/form-data',
+        headers=headers,
+    )
+
+    assert response.status_code == 201
+    assert response.get_json()['possible_duplicates'] == []
+    media = ReportMedia.query.one()
+    assert os.path.exists(os.path.join(app.instance_path, media.file_path))
+    assert Report.query.count() == 1
+
+    # The admin view degrades the same way instead of failing the fetch.
+    admin = register('root', role='admin')
+    view = client.get(f"/api/v1/admin/reports/{response.get_json()['id']}", headers=admin)
+    assert view.status_code == 200
+    assert view.get_json()['possible_duplicates'] == []
+
+
+def test_admin_view_lists_duplicates_and_index_follows_updates(client, app, register):
+    admin = register('root', role='admin')
+    user = register('bob')
+    original = create(client, user, 'Water pipe burst in Kibera', 'Burst water pipe flooding the market road since Monday').get_json()
+    copy = create(client, user, 'Water pipe burst in Kibera', 'Burst water pipe flooding the market road since Monday morning').get_json()
+
+    view = client.get(f"/api/v1/admin/reports/{original['id']}", headers=admin).get_json()
+    assert [d['id'] for d in view['possible_duplicates']] == [copy['id']]
+    assert client.get(f"/api/v1/admin/reports/{original['id']}", headers=user).status_code == 403
+
+    client.put(f"/api/v1/reports/{copy['id']}", json={
+        'title': 'Streetlights out', 'description': 'All streetlights on Ngong Road are off at night'
+    }, headers=user)
+    view = client.get(f"/api/v1/admin/reports/{original['id']}", headers=admin).get_json()
+    assert view['possible_duplicates'] == []
+
+    client.delete(f"/api/v1/reports/{copy['id']}", headers=user)
+    assert ReportSimilarityBucket.query.filter_by(report_id=copy['id']).count() == 0
+
+
+def test_lookup_cost_does_not_grow_with_unrelated_reports(app):
+    user = User(username='agency', email='agency@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    words = ['road', 'school', 'bribe', 'water', 'clinic', 'tender', 'permit', 'market', 'bridge', 'drainage']
+    for i in range(300):
+        db.session.add(Report(
+            type='corruption', title=f'Case {i}', location=f'Ward {i}', created_by=user.id,
+            description=' '.join(words[(i * 7 + j) % 10] + str(i) for j in range(12)),
+        ))
+    db.session.commit()
+    assert rebuild_index(batch_size=64) == 300
+
+    with query_budget(1) as queries:
+        matches = find_duplicates('Case 42', ' '.join(words[(42 * 7 + j) % 10] + '42' for j in range(12)), 'Ward 42')
+
+    assert [m['title'] for m in matches] == ['Case 42']
+    assert len(queries) == 1
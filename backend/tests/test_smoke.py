@@ -4,3 +4,28 @@ from backend import create_app
 def test_app_factory_runs():
     app = create_app()
     assert app.name == 'backend.app'
+
+
+def test_app_factory_has_no_side_effects(tmp_path, monkeypatch):
+    instance_path = tmp_path / 'instance'
+    database_path = tmp_path / 'lazy.db'
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{database_path}')
+
+    app = create_app(str(instance_path))
+
+    assert not instance_path.exists()
+    assert not database_path.exists()
+    with app.app_context():
+        from backend.models import db
+        assert db.engine.pool.checkedin() == 0
+
+
+def test_init_db_command_creates_schema(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'cli.db'}")
+    app = create_app(str(tmp_path / 'instance'))
+
+    result = app.test_cli_runner().invoke(args=['init-db'])
+
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / 'cli.db').exists()
+    assert (tmp_path / 'instance' / 'uploads').is_dir()
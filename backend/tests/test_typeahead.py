@@ -0,0 +1,117 @@
+import threading
+
+from models import db, Report, User
+from querylog import query_budget
+from typeahead import PrefixIndex, TypeaheadIndex, normalize
+
+
+def create(client, headers, title, location):
+    return client.post(
+        '/api/v1/reports', json={'title': title, 'description': 'd', 'location': location}, headers=headers
+    ).get_json()
+
+
+def values(response):
+    return [(s['value'], s['count']) for s in response.get_json()['suggestions']]
+
+
+def test_prefix_index_ranks_by_frequency_and_merges_spelling_variants():
+    index = PrefixIndex(scan_limit=2, cache_size=3)
+    for value, count in [('Main Street, Downtown', 5), ('main street  downtown', 2), ('Mainland', 3),
+                         ('Market Road', 1), ('Moi Avenue', 4)]:
+        index.add(value, count)
+
+    assert normalize('Main St.,  Downtown') == 'main st downtown'
+    assert index.complete('MAIN') == [{'value': 'Main Street, Downtown', 'count': 7}, {'value': 'Mainland', 'count': 3}]
+    # "m" spans more than scan_limit terms and is served from the cache,
+    # which has to follow increments and removals.
+    assert [s['value'] for s in index.complete('m')] == ['Main Street, Downtown', 'Moi Avenue', 'Mainland']
+    index.add('Market Road', 9)
+    assert [s['value'] for s in index.complete('m', 2)] == ['Market Road', 'Main Street, Downtown']
+    index.add('Market Road', -10)
+    assert [s['value'] for s in index.complete('m')] == ['Main Street, Downtown', 'Moi Avenue', 'Mainland']
+    assert len(index) == 3
+
+
+def test_suggest_endpoint_follows_writes_without_querying_per_keystroke(client, app, register):
+    index = app.extensions['typeahead'] = TypeaheadIndex(sync_interval=3600)
+    headers = register('ann')
+    create(client, headers, 'Pothole', 'Main Street, Downtown')
+    create(client, headers, 'Pothole again', 'main street downtown')
+    create(client, headers, 'Burst pipe', 'Mombasa Road')
+    index.build()
+
+    assert values(client.get('/api/v1/reports/suggest?q=ma')) == [('Main Street, Downtown', 2)]
+
+    with query_budget(0):
+        for prefix in ('m', 'mo', 'mom'):
+            assert client.get(f'/api/v1/reports/suggest?q={prefix}').status_code == 200
+        assert values(client.get('/api/v1/reports/suggest?field=title&q=pot')) == [('Pothole', 1), ('Pothole again', 1)]
+
+    report = create(client, headers, 'Streetlights', 'Mombasa Road')
+    assert values(client.get('/api/v1/reports/suggest?q=mo')) == [('Mombasa Road', 2)]
+
+    client.put(f"/api/v1/reports/{report['id']}", json={'location': 'Moi Avenue'}, headers=headers)
+    assert values(client.get('/api/v1/reports/suggest?q=mo')) == [('Moi Avenue', 1), ('Mombasa Road', 1)]
+
+    client.delete(f"/api/v1/reports/{report['id']}", headers=headers)
+    assert values(client.get('/api/v1/reports/suggest?q=mo')) == [('Mombasa Road', 1)]
+    assert client.get('/api/v1/reports/suggest?field=description&q=x').status_code == 400
+
+
+def test_reports_that_commit_out_of_id_order_are_counted_once(app):
+    user = User(username='ann', email='ann@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    index = TypeaheadIndex(sync_interval=0)
+    index.build()
+    db.session.add(Report(id=10, type='infrastructure', title='Pothole', description='d', location='Nairobi', created_by=user.id))
+    db.session.commit()
+    index.sync()
+
+    # An earlier id that only becomes visible now, as when its transaction
+    # commits late on PostgreSQL.
+    db.session.add(Report(id=5, type='infrastructure', title='Pothole', description='d', location='Nairobi', created_by=user.id))
+    db.session.commit()
+    index.sync()
+    index.sync()
+
+    assert index.complete('location', 'nai') == [{'value': 'Nairobi', 'count': 2}]
+
+
+def test_first_keystrokes_start_a_background_build_and_get_nothing(app, monkeypatch):
+    index = TypeaheadIndex()
+    started = []
+    monkeypatch.setattr(index, 'start', started.append)
+    with query_budget(0):
+        assert index.complete('location', 'nai') == []
+    assert started == [app]
+
+
+def test_completions_are_safe_while_reports_change(app):
+    index = TypeaheadIndex(sync_interval=3600)
+    index.build()
+    stop = threading.Event()
+    errors = []
+
+    def churn():
+        # Add and remove many terms sharing a prefix, as edits and deletes do.
+        while not stop.is_set():
+            for i in range(50):
+                index.report_changed(0, {}, {'location': f'Nairobi {i}'})
+            for i in range(50):
+                index.report_deleted(0, {'location': f'Nairobi {i}'})
+
+    writer = threading.Thread(target=churn)
+    writer.start()
+    try:
+        for _ in range(2000):
+            try:
+                index.complete('location', 'nai')
+            except Exception as e:
+                errors.append(e)
+                break
+    finally:
+        stop.set()
+        writer.join()
+    assert errors == []
@@ -0,0 +1,97 @@
+import os
+from io import BytesIO
+
+from sqlalchemy import update
+
+from models import db, Report, UserUsage
+from querylog import query_budget
+from usage import reconcile
+
+
+def upload(client, headers, *sizes, title='Pothole'):
+    return client.post(
+        '/api/v1/reports',
+        data={'title': title, 'description': 'Deep pothole',
+              'media': [(BytesIO(b'x' * size), f'{i}.jpg') for i, size in enumerate(sizes)]},
+        content_type='multipart/form-data',
+        headers=headers,
+    )
+
+
+def usage(client, headers):
+    return client.get('/api/v1/auth/me', headers=headers).get_json()['usage']
+
+
+def test_counters_follow_every_write_and_match_a_recount(client, app, register):
+    admin = register('root', role='admin')
+    headers = register('ann')
+    first = upload(client, headers, 100, 50).get_json()
+    second = upload(client, headers, 10).get_json()
+
+    me = client.get('/api/v1/auth/me', headers=headers).get_json()
+    assert me['username'] == 'ann'
+    assert me['usage']['reports'] == {'pending': 2, 'under-investigation': 0, 'resolved': 0, 'rejected': 0, 'total': 2}
+    assert (me['usage']['media_files'], me['usage']['storage_bytes']) == (3, 160)
+
+    client.put(f"/api/v1/reports/{first['id']}", json={'remove_media_ids': [first['media'][0]['id']]}, headers=headers)
+    client.put(
+        f"/api/v1/reports/{first['id']}", data={'media': (BytesIO(b'x' * 7), 'new.jpg')},
+        content_type='multipart/form-data', headers=headers,
+    )
+    client.put(f"/api/v1/admin/reports/{second['id']}/status", json={'status': 'resolved'}, headers=admin)
+    client.post('/api/v1/reports', json={'title': 'Bribe', 'description': 'At the office'}, headers=headers)
+    client.delete(f"/api/v1/reports/{first['id']}", headers=headers)
+
+    with query_budget(4):
+        current = usage(client, headers)
+    assert current['reports'] == {'pending': 1, 'under-investigation': 0, 'resolved': 1, 'rejected': 0, 'total': 2}
+    assert (current['media_files'], current['storage_bytes']) == (1, 10)
+    assert reconcile()['drifted'] == 0
+
+
+def test_reconcile_repairs_drift(client, app, register):
+    headers = register('ann')
+    upload(client, headers, 100)
+    assert usage(client, headers)['storage_bytes'] == 100
+
+    db.session.execute(update(UserUsage).values(storage_bytes=5, reports_pending=9))
+    db.session.commit()
+    result = reconcile()
+    assert (result['drifted'], result['created']) == (1, 0)
+    assert usage(client, headers)['storage_bytes'] == 100
+    assert usage(client, headers)['reports']['pending'] == 1
+
+
+def test_quota_is_enforced_before_files_are_saved(client, app, register):
+    app.config['USER_STORAGE_QUOTA'] = 1000
+    headers = register('ann')
+    assert upload(client, headers, 600).status_code == 201
+
+    # Too large to fit at all: refused on Content-Length, body unread.
+    response = upload(client, headers, 200 * 1024)
+    assert response.status_code == 413
+    assert response.get_json() == {'message': 'Storage quota exceeded', 'storage_bytes': 600, 'storage_quota': 1000}
+
+    # Fits the form allowance but not the quota: refused before saving.
+    assert upload(client, headers, 600).status_code == 413
+    assert Report.query.count() == 1
+    assert len(os.listdir(app.config['UPLOAD_FOLDER'])) == 1
+    assert usage(client, headers)['storage_bytes'] == 600
+    assert upload(client, headers, 400).status_code == 201
+
+    db.session.execute(update(UserUsage).values(storage_bytes=0))
+    db.session.commit()
+    boundary = 'sync-boundary'
+    body = b''.join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="report"\r\n\r\n'
+        f'{{"title": "Offline {i}", "description": "d"}}\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="media"; filename="{i}.jpg"\r\n\r\n'.encode()
+        + b'x' * 600 + b'\r\n'
+        for i in range(2)
+    ) + f'--{boundary}--\r\n'.encode()
+    results = client.post(
+        '/api/v1/reports/batch', data=body,
+        content_type=f'multipart/form-data; boundary={boundary}', headers=headers,
+    ).get_json()['results']
+    assert [r.get('error') for r in results] == [None, 'Storage quota exceeded']
+    assert usage(client, headers)['storage_bytes'] == 600
@@ -0,0 +1,86 @@
+from io import BytesIO, StringIO
+
+from database import missing_tables
+from models import db, User
+from provisioning import import_users
+
+
+def test_admin_can_import_csv_with_row_errors(client, app, register):
+    app.config['BULK_IMPORT_WORKERS'] = 1
+    headers = register('root', role='admin')
+    csv_body = (
+        "username,email,password\n"
+        "ann,ann@example.com,secret123\n"
+        "root,other@example.com,secret123\n"
+        "bob,bob@example.com,short\n"
+        "ann2,ann@example.com,secret123\n"
+        "cat,cat@example.com,secret123\n"
+    )
+
+    response = client.post(
+        '/api/v1/admin/users/import',
+        data={'file': (BytesIO(csv_body.encode()), 'users.csv')},
+        content_type='multipart/form-data',
+        headers=headers
+    )
+
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert summary['created'] == 2
+    assert {(e['row'], e['error']) for e in summary['errors']} == {
+        (3, 'Username already taken'),
+        (4, 'Password must be at least 6 characters long'),
+        (5, 'Email address already registered'),
+    }
+
+    imported = User.query.filter_by(email='cat@example.com').one()
+    assert imported.check_password('secret123')
+
+
+def test_import_accepts_raw_ndjson_body(client, app, register):
+    app.config['BULK_IMPORT_WORKERS'] = 1
+    headers = register('root', role='admin')
+    body = (
+        '{"username": "dee", "email": "dee@example.com", "password": "secret123"}\n'
+        'not json\n'
+        '{"username": 123, "email": "num@example.com", "password": "secret123"}\n'
+    )
+
+    response = client.post(
+        '/api/v1/admin/users/import',
+        data=body,
+        content_type='application/x-ndjson',
+        headers=headers
+    )
+
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert summary['created'] == 1
+    assert [(e['row'], e['error']) for e in summary['errors']][1:] == [(3, 'username must be a string')]
+    assert summary['errors'][0]['row'] == 2
+
+
+def test_import_requires_admin(client, app, register):
+    response = client.post(
+        '/api/v1/admin/users/import',
+        data='username,email,password\n',
+        content_type='text/csv',
+        headers=register('eve')
+    )
+
+    assert response.status_code == 403
+
+
+def test_passwords_are_hashed_in_worker_processes(app):
+    rows = ''.join(f"user{i},user{i}@example.com,secret{i:03d}\n" for i in range(6))
+    summary = import_users(StringIO("username,email,password\n" + rows), 'csv', batch_size=4, workers=2)
+
+    assert (summary['created'], summary['failed']) == (6, 0)
+    assert User.query.filter_by(username='user5').one().check_password('secret005')
+
+
+def test_missing_tables_are_reported_rather_than_created(app):
+    assert missing_tables(db.engine, db.metadata.tables) == []
+    User.__table__.drop(db.engine)
+    assert missing_tables(db.engine, ['users', 'reports']) == ['users']
+    User.__table__.create(db.engine)
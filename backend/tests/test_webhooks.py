@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import update
+
+from models import db, OutboxEvent, Report, WebhookDelivery
+from webhooks import WebhookDispatcher, sign
+
+
+class Receiver:
+    """Local HTTP stand-in for a partner's webhook endpoint."""
+
+    def __init__(self):
+        self.requests = []
+        self.statuses = []
+        self.delay = 0
+        self.in_flight = self.max_in_flight = 0
+        self.lock = threading.Lock()
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                with receiver.lock:
+                    receiver.in_flight += 1
+                    receiver.max_in_flight = max(receiver.max_in_flight, receiver.in_flight)
+                    status = receiver.statuses.pop(0) if receiver.statuses else 200
+                time.sleep(receiver.delay)
+                with receiver.lock:
+                    receiver.in_flight -= 1
+                    receiver.requests.append((dict(self.headers), body))
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/hook'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def events(self):
+        return [event for _, body in self.requests for event in json.loads(body)['events']]
+
+
+@pytest.fixture
+def receiver():
+    receiver = Receiver()
+    yield receiver
+    receiver.server.shutdown()
+
+
+def setup(client, register, receiver, reports=1, **webhook):
+    admin = register('root', role='admin')
+    owner = register('ann')
+    ids = [
+        client.post('/api/v1/reports', json={'title': f'Report {i}', 'description': 'd'}, headers=owner).get_json()['id']
+        for i in range(reports)
+    ]
+    hook = client.post('/api/v1/admin/webhooks', json={'url': receiver.url, **webhook}, headers=admin).get_json()
+    return admin, ids, hook
+
+
+def test_status_change_is_delivered_signed_and_batched(client, app, receiver, register):
+    admin, ids, hook = setup(client, register, receiver, reports=2)
+
+    for report_id in ids:
+        response = client.put(f'/api/v1/admin/reports/{report_id}/status', json={'status': 'resolved'}, headers=admin)
+        assert response.status_code == 200
+    assert receiver.requests == []
+    assert OutboxEvent.query.count() == 2
+
+    assert WebhookDispatcher().run_once() == {'events': 2, 'delivered': 2, 'failed': 0}
+    assert len(receiver.requests) == 1
+    headers, body = receiver.requests[0]
+    assert headers['X-Jiseti-Signature'] == f"sha256={sign(hook['secret'], headers['X-Jiseti-Timestamp'], body)}"
+    events = receiver.events()
+    assert [(e['type'], e['data']['report_id'], e['data']['status']) for e in events] == [
+        ('report.status_changed', ids[0], 'resolved'), ('report.status_changed', ids[1], 'resolved'),
+    ]
+    assert WebhookDispatcher().run_once() == {'events': 0, 'delivered': 0, 'failed': 0}
+
+
+def test_event_is_written_only_with_the_status_change(client, app, receiver, monkeypatch, register):
+    admin, (report_id,), _ = setup(client, register, receiver)
+
+    def fail():
+        raise RuntimeError('database went away')
+
+    monkeypatch.setattr(db.session, 'commit', fail)
+    with pytest.raises(RuntimeError):
+        client.put(f'/api/v1/admin/reports/{report_id}/status', json={'status': 'resolved'}, headers=admin)
+    monkeypatch.undo()
+    db.session.rollback()
+    assert OutboxEvent.query.count() == 0
+    assert db.session.get(Report, report_id).status == 'pending'
+
+
+def test_failures_back_off_and_retry(client, app, receiver, register):
+    admin, (report_id,), _ = setup(client, register, receiver)
+    receiver.statuses = [503]
+    client.put(f'/api/v1/admin/reports/{report_id}/status', json={'status': 'rejected'}, headers=admin)
+    dispatcher = WebhookDispatcher(backoff_base=60, max_attempts=2)
+
+    assert dispatcher.run_once()['failed'] == 1
+    delivery = WebhookDelivery.query.one()
+    assert (delivery.status, delivery.attempts, delivery.last_error) == ('pending', 1, 'HTTP 503')
+    assert dispatcher.run_once()['delivered'] == 0
+
+    db.session.execute(update(WebhookDelivery).values(next_attempt_at=datetime.now(timezone.utc)))
+    db.session.commit()
+    assert dispatcher.run_once()['delivered'] == 1
+    assert len(receiver.requests) == 2
+    assert WebhookDelivery.query.one().status == 'delivered'
+
+
+def test_per_endpoint_concurrency_and_slow_receivers(client, app, receiver, register):
+    admin, ids, _ = setup(client, register, receiver, reports=6, max_concurrency=2)
+    receiver.delay = 0.2
+
+    for report_id in ids:
+        started = time.perf_counter()
+        client.put(f'/api/v1/admin/reports/{report_id}/status', json={'status': 'resolved'}, headers=admin)
+        # Requests never wait on the receiver.
+        assert time.perf_counter() - started < receiver.delay
+
+    dispatcher = WebhookDispatcher(batch_size=1, workers=8)
+    assert dispatcher.run_once()['delivered'] == 2
+    assert dispatcher.run_once()['delivered'] == 2
+    assert dispatcher.run_once()['delivered'] == 2
+    assert receiver.max_in_flight == 2
+    assert sorted(e['data']['report_id'] for e in receiver.events()) == sorted(ids)
+
+
+def test_a_slow_receiver_does_not_hold_up_the_others(client, app, receiver, register):
+    admin, ids, slow_hook = setup(client, register, receiver, reports=3, max_concurrency=1)
+    fast = Receiver()
+    try:
+        fast_hook = client.post('/api/v1/admin/webhooks', json={'url': fast.url}, headers=admin).get_json()
+        for report_id in ids:
+            client.put(f'/api/v1/admin/reports/{report_id}/status', json={'status': 'resolved'}, headers=admin)
+        receiver.delay = 0.5
+
+        started = time.perf_counter()
+        deadline = time.monotonic() + 2
+        WebhookDispatcher(batch_size=1, workers=4).run(
+            poll_interval=0.01, should_stop=lambda: len(fast.requests) == 3 or time.monotonic() > deadline
+        )
+        # Each of the fast endpoint's batches went out as the one before it
+        # finished, not once per round behind the slow endpoint's batch.
+        assert len(fast.requests) == 3
+        assert time.perf_counter() - started < 2 * receiver.delay
+    finally:
+        fast.server.shutdown()
+
+    # The slow endpoint's batch in flight was recorded on the way out.
+    assert len(receiver.requests) == 1
+    statuses = {
+        hook_id: sorted(d.status for d in WebhookDelivery.query.filter_by(endpoint_id=hook_id))
+        for hook_id in (slow_hook['id'], fast_hook['id'])
+    }
+    assert statuses == {
+        slow_hook['id']: ['delivered', 'pending', 'pending'],
+        fast_hook['id']: ['delivered', 'delivered', 'delivered'],
+    }
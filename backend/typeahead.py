@@ -0,0 +1,288 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import func, or_
+
+try:
+    from .models import db, Report
+except ImportError:  # pragma: no cover - fallback for script execution
+    from models import db, Report
+
+FIELDS = ('location', 'title')
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize(value):
+    """Fold case, punctuation and spacing: "Main St.,  Downtown" -> "main st downtown"."""
+    return _NON_WORD.sub(' ', (value or '').lower()).strip()
+
+
+class PrefixIndex:
+    """Sorted array of normalised terms with a frequency per term.
+
+    A completion bisects to the range of terms starting with the prefix and
+    picks the most frequent. Ranges wider than ``scan_limit`` (one or two
+    letter prefixes over many titles) would be slow to scan on every
+    keystroke, so their top ``cache_size`` are cached and kept current as
+    counts change.
+    """
+
+    def __init__(self, scan_limit=512, cache_size=20):
+        self.scan_limit = scan_limit
+        self.cache_size = cache_size
+        self._keys = []
+        self._counts = {}
+        self._display = {}
+        self._top = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _rank(self, key):
+        return (-self._counts[key], key)
+
+    def add(self, value, delta=1):
+        key = normalize(value)
+        if not key or not delta:
+            return
+        count = self._counts.get(key, 0) + delta
+        if count <= 0:
+            if key in self._counts:
+                del self._keys[bisect.bisect_left(self._keys, key)]
+                del self._counts[key]
+                del self._display[key]
+                self._invalidate(key)
+            return
+
+        if key not in self._counts:
+            bisect.insort(self._keys, key)
+            self._display[key] = value.strip()
+        self._counts[key] = count
+        if delta > 0:
+            self._promote(key)
+        else:
+            self._invalidate(key)
+
+    def load(self, rows):
+        """Bulk-add ``(value, count)`` pairs, sorting once at the end."""
+        for value, count in rows:
+            key = normalize(value)
+            if not key or count <= 0:
+                continue
+            if key not in self._counts:
+                self._counts[key] = 0
+                self._display[key] = value.strip()
+            self._counts[key] += count
+        self._keys = sorted(self._counts)
+        self._top.clear()
+        self._warm()
+
+    def _warm(self, depth=2):
+        # Fill the caches of short, wide prefixes up front so the first
+        # keystroke after a build does not pay for a full range scan.
+        prefixes = sorted({key[:end] for key in self._keys for end in range(1, depth + 1)})
+        for prefix in prefixes:
+            self.complete(prefix)
+
+    def _promote(self, key):
+        for end in range(1, len(key) + 1):
+            top = self._top.get(key[:end])
+            if top is None:
+                continue
+            if key not in top:
+                if len(top) >= self.cache_size and self._rank(key) >= self._rank(top[-1]):
+                    continue
+                top.append(key)
+            top.sort(key=self._rank)
+            del top[self.cache_size:]
+
+    def _invalidate(self, key):
+        # A cached top list that loses a member, or whose member drops,
+        # cannot tell what should replace it; drop it and rescan lazily.
+        for end in range(1, len(key) + 1):
+            top = self._top.get(key[:end])
+            if top is not None and key in top:
+                del self._top[key[:end]]
+
+    def complete(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        lo = bisect.bisect_left(self._keys, prefix)
+        hi = bisect.bisect_left(self._keys, prefix + '\uffff', lo)
+        if hi - lo <= self.scan_limit:
+            keys = heapq.nsmallest(limit, self._keys[lo:hi], key=self._rank)
+        else:
+            top = self._top.get(prefix)
+            if top is None:
+                top = self._top[prefix] = heapq.nsmallest(self.cache_size, self._keys[lo:hi], key=self._rank)
+            keys = top[:limit]
+        return [{'value': self._display[key], 'count': self._counts[key]} for key in keys]
+
+
+class TypeaheadIndex:
+    """Per-worker completion index over report locations and titles.
+
+    Built from the database in a background thread, started when the
+    worker boots or on first use; completions are empty until it is
+    ready. After that, reports created
+    anywhere are pulled in by id at most once per ``sync_interval`` seconds,
+    edits and deletes made by this worker are applied immediately, and the
+    whole index is rebuilt in the background every ``rebuild_interval``
+    seconds to pick up other workers' edits and deletes. Completions never
+    query the database themselves.
+
+    Ids are assigned before a row commits, so a report can become visible
+    after the watermark has passed its id. Ids the watermark skipped are
+    kept as gaps and re-checked on every sync for ``gap_timeout`` seconds;
+    after that they are taken to be rolled back or deleted.
+
+    ``_lock`` guards the index structures and is only held while they are
+    read or updated in memory. ``_sync_lock`` serialises the database
+    reads of syncs and builds, so completions never wait on a query.
+    """
+
+    # Most ids below the watermark that are tracked as gaps at once.
+    GAP_WINDOW = 1000
+
+    def __init__(self, sync_interval=5.0, rebuild_interval=900.0, gap_timeout=60.0):
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.gap_timeout = gap_timeout
+        self._indexes = None
+        self._watermark = 0
+        self._gaps = {}
+        self._last_sync = None
+        self._last_build = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        # Held by the thread that is building the index.
+        self._building = threading.Lock()
+
+    def complete(self, field, prefix, limit=10):
+        self.maybe_sync()
+        indexes = self._indexes
+        if indexes is None:
+            return []
+        with self._lock:
+            return indexes[field].complete(prefix, limit)
+
+    def start(self, app):
+        """Build the index in a background thread, unless a build is running."""
+        if not self._building.acquire(blocking=False):
+            return
+        threading.Thread(target=self._rebuild_in_background, args=(app,), daemon=True).start()
+
+    def maybe_sync(self):
+        now = time.monotonic()
+        if self._indexes is None or now - self._last_build >= self.rebuild_interval:
+            self.start(current_app._get_current_object())
+            if self._indexes is None:
+                return
+        if self._last_sync is not None and now - self._last_sync < self.sync_interval:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._sync(now)
+        finally:
+            self._sync_lock.release()
+
+    def sync(self):
+        if self._indexes is None:
+            return
+        with self._sync_lock:
+            self._sync(time.monotonic())
+
+    def build(self):
+        """Build the index now, in the current app context."""
+        indexes, watermark, gaps = self._build()
+        with self._sync_lock, self._lock:
+            self._indexes, self._watermark, self._gaps = indexes, watermark, gaps
+            self._last_build = time.monotonic()
+            self._last_sync = None
+
+    def _build(self):
+        watermark = db.session.query(func.max(Report.id)).scalar() or 0
+        indexes = {field: PrefixIndex() for field in FIELDS}
+        for field in FIELDS:
+            column = getattr(Report, field)
+            rows = (
+                db.session.query(column, func.count())
+                .filter(Report.id <= watermark)
+                .group_by(column)
+                .order_by(func.count().desc(), func.min(Report.id))
+            )
+            # Most common (then earliest) spelling first, so it becomes the
+            # displayed form.
+            indexes[field].load(rows)
+        # Read after the counts: a row that commits in between is then
+        # missed until the next rebuild rather than counted twice.
+        visible = {
+            report_id for (report_id,) in
+            db.session.query(Report.id).filter(Report.id > watermark - self.GAP_WINDOW, Report.id <= watermark)
+        }
+        return indexes, watermark, self._find_gaps(0, watermark, visible, time.monotonic())
+
+    def _find_gaps(self, low, high, visible, now):
+        """Ids in ``(low, high]`` (at most GAP_WINDOW of them) not in ``visible``."""
+        start = max(low, high - self.GAP_WINDOW) + 1
+        return {report_id: now for report_id in range(start, high + 1) if report_id not in visible}
+
+    def _rebuild_in_background(self, app):
+        try:
+            with app.app_context():
+                try:
+                    self.build()
+                finally:
+                    db.session.remove()
+        finally:
+            self._building.release()
+
+    def _sync(self, now):
+        self._gaps = {report_id: since for report_id, since in self._gaps.items() if now - since < self.gap_timeout}
+        condition = Report.id > self._watermark
+        if self._gaps:
+            condition = or_(condition, Report.id.in_(list(self._gaps)))
+        rows = (
+            db.session.query(Report.id, Report.location, Report.title)
+            .filter(condition)
+            .order_by(Report.id)
+            .all()
+        )
+        previous = self._watermark
+        with self._lock:
+            for report_id, location, title in rows:
+                self._indexes['location'].add(location)
+                self._indexes['title'].add(title)
+                self._gaps.pop(report_id, None)
+                self._watermark = max(self._watermark, report_id)
+            self._gaps.update(self._find_gaps(previous, self._watermark, {row[0] for row in rows}, now))
+        self._last_sync = now
+
+    def report_created(self):
+        """Pull new reports in now rather than at the next sync."""
+        self.sync()
+
+    def report_changed(self, report_id, before, after):
+        """Apply an edit; ``before``/``after`` map field names to values."""
+        if self._indexes is None or report_id > self._watermark or report_id in self._gaps:
+            # Not indexed yet; the next sync reads its current values.
+            return
+        with self._lock:
+            for field in FIELDS:
+                if before.get(field) != after.get(field):
+                    self._indexes[field].add(before.get(field), -1)
+                    self._indexes[field].add(after.get(field), 1)
+
+    def report_deleted(self, report_id, values):
+        self.report_changed(report_id, values, {})
+
+
+def get_typeahead():
+    return current_app.extensions['typeahead']
@@ -0,0 +1,254 @@
+"""Per-user report and storage counters, and storage quotas.
+
+``user_usage`` holds one row per user: reports per status, media files
+and media bytes. Every write path adjusts the row with an ``UPDATE ...
+SET n = n + :delta`` in its own transaction, so the counters commit or
+roll back with the change. ``/auth/me`` reads them with one primary-key
+lookup instead of scanning ``reports`` and summing ``report_media``.
+
+A user without a row yet gets one computed from ``reports`` and
+``report_media`` the first time it is read or a quota is checked.
+Adjustments made before that are no-ops, because the computed row
+already includes them. Counters can still drift: a crash between a file
+delete and its commit, a manual SQL fix, or a row built while another
+write was in flight. ``flask --app wsgi reconcile-usage`` recomputes
+every user and rewrites the rows that differ. It locks each such row
+and recounts it before rewriting, so running it under load is safe.
+
+``USER_STORAGE_QUOTA`` caps a user's media bytes (0 = unlimited). It is
+enforced twice, both times before an upload reaches the upload folder:
+
+* :func:`enforce_storage_quota` rejects a request whose
+  ``Content-Length`` cannot fit before the body is read at all;
+* :func:`add_media` reserves the exact file sizes with a conditional
+  ``UPDATE`` before the files are saved. Concurrent uploads cannot both
+  squeeze under the quota. A failed request rolls the reservation back.
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from .models import db, Report, ReportMedia, User, UserUsage
+except ImportError:  # pragma: no cover - fallback for script execution
+    from models import db, Report, ReportMedia, User, UserUsage
+
+STATUS_COLUMNS = {
+    'pending': 'reports_pending',
+    'under-investigation': 'reports_under_investigation',
+    'resolved': 'reports_resolved',
+    'rejected': 'reports_rejected',
+}
+COUNTER_COLUMNS = (*STATUS_COLUMNS.values(), 'media_count', 'storage_bytes')
+# Room for the non-file form fields of a multipart upload.
+FORM_ALLOWANCE = 64 * 1024
+
+
+class StorageQuotaExceeded(Exception):
+    def __init__(self, used, requested, quota):
+        super().__init__(f"Storage quota exceeded: {used} + {requested} > {quota} bytes")
+        self.used = used
+        self.requested = requested
+        self.quota = quota
+
+    def response(self):
+        return jsonify({
+            'message': 'Storage quota exceeded',
+            'storage_bytes': self.used,
+            'storage_quota': self.quota,
+        }), 413
+
+
+def _computed(user_ids=None):
+    """Counters recomputed from the source tables, keyed by user id."""
+    reports = select(Report.created_by, Report.status, func.count()).group_by(Report.created_by, Report.status)
+    media = (
+        select(Report.created_by, func.count(ReportMedia.id), func.coalesce(func.sum(ReportMedia.file_size), 0))
+        .join(Report, Report.id == ReportMedia.report_id)
+        .group_by(Report.created_by)
+    )
+    users = select(User.id)
+    if user_ids is not None:
+        reports = reports.where(Report.created_by.in_(user_ids))
+        media = media.where(Report.created_by.in_(user_ids))
+        users = users.where(User.id.in_(user_ids))
+    counters = {user_id: dict.fromkeys(COUNTER_COLUMNS, 0) for user_id in db.session.execute(users).scalars()}
+    for user_id, status, count in db.session.execute(reports):
+        if user_id in counters and status in STATUS_COLUMNS:
+            counters[user_id][STATUS_COLUMNS[status]] = count
+    for user_id, count, total in db.session.execute(media):
+        if user_id in counters:
+            counters[user_id].update(media_count=count, storage_bytes=int(total))
+    return counters
+
+
+def _ensure_row(user_id):
+    if db.session.execute(select(UserUsage.user_id).where(UserUsage.user_id == user_id)).first():
+        return
+    counters = _computed([user_id]).get(user_id)
+    if counters is None:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(UserUsage).values(
+                user_id=user_id, reconciled_at=datetime.now(timezone.utc), **counters
+            ))
+    except IntegrityError:
+        # Built by a concurrent request.
+        pass
+
+
+def _adjust(user_id, values, condition=None):
+    statement = update(UserUsage).where(UserUsage.user_id == int(user_id)).values(**{
+        column: getattr(UserUsage, column) + delta for column, delta in values.items() if delta
+    })
+    if condition is not None:
+        statement = statement.where(condition)
+    return db.session.execute(statement, execution_options={'synchronize_session': False}).rowcount
+
+
+def record_reports(user_id, statuses):
+    """Add ``{status: delta}`` to a user's report counters."""
+    values = Counter()
+    for status, delta in statuses.items():
+        if status in STATUS_COLUMNS:
+            values[STATUS_COLUMNS[status]] += delta
+    if any(values.values()):
+        _adjust(user_id, values)
+
+
+def add_media(user_id, sizes, quota=0):
+    """Count new media of ``sizes`` bytes; raises StorageQuotaExceeded."""
+    if not sizes:
+        return
+    user_id = int(user_id)
+    requested = sum(sizes)
+    condition = None
+    if quota:
+        _ensure_row(user_id)
+        condition = UserUsage.storage_bytes + requested <= quota
+    if not _adjust(user_id, {'media_count': len(sizes), 'storage_bytes': requested}, condition) and quota:
+        raise StorageQuotaExceeded(storage_used(user_id), requested, quota)
+
+
+def remove_media(user_id, sizes):
+    if sizes:
+        _adjust(user_id, {'media_count': -len(sizes), 'storage_bytes': -sum(sizes)})
+
+
+def storage_used(user_id):
+    """Media bytes stored by ``user_id``; does not build a missing row."""
+    used = db.session.execute(select(UserUsage.storage_bytes).where(UserUsage.user_id == user_id)).scalar()
+    if used is None:
+        used = int(db.session.execute(
+            select(func.coalesce(func.sum(ReportMedia.file_size), 0))
+            .join(Report, Report.id == ReportMedia.report_id)
+            .where(Report.created_by == user_id)
+        ).scalar())
+    return used
+
+
+def upload_size(storage):
+    """Size in bytes of an uploaded ``FileStorage`` that is not yet saved."""
+    stream = storage.stream
+    position = stream.tell()
+    stream.seek(0, 2)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def get_usage(user_id):
+    _ensure_row(user_id)
+    row = db.session.execute(
+        select(*(getattr(UserUsage, column) for column in COUNTER_COLUMNS)).where(UserUsage.user_id == user_id)
+    ).first()
+    counters = dict(zip(COUNTER_COLUMNS, row or (0,) * len(COUNTER_COLUMNS)))
+    reports = {status: counters[column] for status, column in STATUS_COLUMNS.items()}
+    quota = current_app.config['USER_STORAGE_QUOTA']
+    return {
+        'reports': {**reports, 'total': sum(reports.values())},
+        'media_files': counters['media_count'],
+        'storage_bytes': counters['storage_bytes'],
+        'storage_quota': quota or None,
+    }
+
+
+def enforce_storage_quota(view):
+    """Refuse a multipart upload that cannot fit before reading its body.
+
+    Apply below ``@jwt_required()`` and above anything that reads the
+    body, such as ``@idempotent``.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        quota = current_app.config['USER_STORAGE_QUOTA']
+        length = request.content_length
+        if quota and length is not None and request.mimetype == 'multipart/form-data':
+            used = storage_used(int(get_jwt_identity()))
+            if length > max(quota - used, 0) + FORM_ALLOWANCE:
+                db.session.rollback()
+                return StorageQuotaExceeded(used, length, quota).response()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def reconcile():
+    """Rewrite counters that drifted from the source tables.
+
+    Everything is compared in bulk first. Missing rows are inserted
+    straight from that pass. Rows that differ are locked and recounted,
+    so a write that was in flight during the comparison is not mistaken
+    for drift. Returns
+    ``{'users': checked, 'created': missing rows built, 'drifted': rows rewritten}``.
+    """
+    expected = _computed()
+    stored = {
+        row[0]: dict(zip(COUNTER_COLUMNS, row[1:]))
+        for row in db.session.execute(
+            select(UserUsage.user_id, *(getattr(UserUsage, column) for column in COUNTER_COLUMNS))
+        )
+    }
+    now = datetime.now(timezone.utc)
+    missing = [user_id for user_id in expected if user_id not in stored]
+    suspects = [user_id for user_id, counters in expected.items() if user_id in stored and stored[user_id] != counters]
+
+    created = 0
+    if missing:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(UserUsage), [
+                    {'user_id': user_id, 'reconciled_at': now, **expected[user_id]} for user_id in missing
+                ])
+            created = len(missing)
+        except IntegrityError:
+            # Some were built concurrently; recount those one by one.
+            suspects.extend(missing)
+    db.session.commit()
+
+    drifted = 0
+    for user_id in suspects:
+        # Writers adjust this row before they commit; once we hold the
+        # lock, everything they counted is committed and visible.
+        row = db.session.execute(
+            select(UserUsage).where(UserUsage.user_id == user_id)
+            .with_for_update().execution_options(populate_existing=True)
+        ).scalar_one_or_none()
+        counters = _computed([user_id]).get(user_id)
+        if counters is None:
+            pass
+        elif row is None:
+            db.session.add(UserUsage(user_id=user_id, reconciled_at=datetime.now(timezone.utc), **counters))
+            created += 1
+        elif any(getattr(row, column) != value for column, value in counters.items()):
+            for column, value in counters.items():
+                setattr(row, column, value)
+            row.reconciled_at = datetime.now(timezone.utc)
+            drifted += 1
+        db.session.commit()
+    return {'users': len(expected), 'created': created, 'drifted': drifted}
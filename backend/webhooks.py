@@ -0,0 +1,323 @@
+"""Webhook delivery of report events through a transactional outbox.
+
+A write that partners should hear about calls :func:`enqueue` before its
+own commit. The event is an ``outbox_events`` row inserted in the same
+transaction: it exists if and only if the change does, and the request
+never waits on a receiver.
+
+``flask --app wsgi dispatch-webhooks`` runs :class:`WebhookDispatcher`
+in its own process. Each round it:
+
+1. fans new events out into one ``webhook_deliveries`` row per active
+   endpoint subscribed to the event type;
+2. claims due deliveries for endpoints with free slots and groups them
+   per endpoint into batches of up to ``WEBHOOK_BATCH_SIZE`` events. An
+   endpoint gets at most its ``max_concurrency`` batches in flight at
+   once, and all endpoints share ``WEBHOOK_WORKERS`` sending threads;
+3. POSTs each batch as ``{"events": [...]}`` and signs it with the
+   endpoint's secret::
+
+       X-Jiseti-Timestamp: 1760000000
+       X-Jiseti-Signature: sha256=<hex HMAC-SHA256 of "<timestamp>." + body>
+
+4. marks 2xx batches delivered. Any other outcome schedules a retry with
+   exponential backoff and jitter, capped at ``WEBHOOK_BACKOFF_MAX``
+   seconds. A ``Retry-After`` from the receiver is honoured. A delivery
+   is marked failed after ``WEBHOOK_MAX_ATTEMPTS`` attempts.
+
+Rounds do not wait for every batch in flight. A result is recorded as
+soon as its batch finishes and the endpoint is claimed for again, so a
+receiver that is down or slow only holds up its own deliveries.
+
+Receivers should deduplicate on the event ``id``. Delivery is at least
+once: a dispatcher that dies after a POST but before recording the
+result sends the batch again. Claims are leases on ``next_attempt_at``,
+so several dispatchers can run without sending the same batch twice at
+the same time.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, select, update
+
+try:
+    from .models import db, OutboxEvent, WebhookDelivery, WebhookEndpoint
+except ImportError:  # pragma: no cover - fallback for script execution
+    from models import db, OutboxEvent, WebhookDelivery, WebhookEndpoint
+
+logger = logging.getLogger(__name__)
+
+FAN_OUT_BATCH = 500
+
+
+def enqueue(event_type, payload):
+    """Add an outbox event to the current transaction; the caller commits."""
+    db.session.add(OutboxEvent(event_type=event_type, payload=json.dumps(payload)))
+
+
+def sign(secret, timestamp, body):
+    message = f'{timestamp}.'.encode() + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def _post(url, secret, body, timeout):
+    """Send one batch; returns (ok, error, retry_after seconds or None)."""
+    timestamp = str(int(time.time()))
+    http_request = urllib.request.Request(
+        url,
+        data=body,
+        method='POST',
+        headers={
+            'Content-Type': 'application/json',
+            'User-Agent': 'jiseti-webhooks',
+            'X-Jiseti-Timestamp': timestamp,
+            'X-Jiseti-Signature': f'sha256={sign(secret, timestamp, body)}',
+        },
+    )
+    try:
+        with urllib.request.urlopen(http_request, timeout=timeout) as response:
+            response.read()
+            return True, None, None
+    except urllib.error.HTTPError as e:
+        retry_after = e.headers.get('Retry-After')
+        retry_after = float(retry_after) if retry_after and retry_after.isdigit() else None
+        return False, f'HTTP {e.code}', retry_after
+    except (OSError, ValueError) as e:
+        return False, str(e)[:500], None
+
+
+class WebhookDispatcher:
+    def __init__(self, batch_size=50, timeout=5.0, max_attempts=10, backoff_base=2.0,
+                 backoff_max=3600.0, workers=8, send=None):
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.workers = workers
+        self.send = send or _post
+        self._executor = None
+        # future -> (endpoint, batch), and batches in flight per endpoint id.
+        self._in_flight = {}
+        self._busy = Counter()
+        self._rotation = 0
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        return cls(
+            batch_size=config['WEBHOOK_BATCH_SIZE'],
+            timeout=config['WEBHOOK_TIMEOUT'],
+            max_attempts=config['WEBHOOK_MAX_ATTEMPTS'],
+            backoff_base=config['WEBHOOK_BACKOFF_BASE'],
+            backoff_max=config['WEBHOOK_BACKOFF_MAX'],
+            workers=config['WEBHOOK_WORKERS'],
+            **kwargs,
+        )
+
+    def fan_out(self):
+        """Turn new outbox events into deliveries; returns the event count."""
+        candidates = db.session.execute(
+            select(OutboxEvent.id, OutboxEvent.event_type)
+            .where(OutboxEvent.fanned_out_at.is_(None))
+            .order_by(OutboxEvent.id)
+            .limit(FAN_OUT_BATCH)
+        ).all()
+        if not candidates:
+            db.session.rollback()
+            return 0
+        now = datetime.now(timezone.utc)
+        claimed = set(db.session.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id.in_([event_id for event_id, _ in candidates]), OutboxEvent.fanned_out_at.is_(None))
+            .values(fanned_out_at=now)
+            .returning(OutboxEvent.id)
+        ).scalars())
+        endpoints = WebhookEndpoint.query.filter_by(active=True).all()
+        rows = [
+            {'event_id': event_id, 'endpoint_id': endpoint.id, 'status': 'pending', 'attempts': 0,
+             'next_attempt_at': now}
+            for event_id, event_type in candidates if event_id in claimed
+            for endpoint in endpoints if endpoint.subscribes_to(event_type)
+        ]
+        if rows:
+            db.session.execute(insert(WebhookDelivery), rows)
+        db.session.commit()
+        return len(claimed)
+
+    def _claim(self, now):
+        """Lease due deliveries; returns [((endpoint id, url, secret), rows)].
+
+        Only endpoints with batches to spare are claimed for, up to the
+        free sending threads. Plain tuples, so nothing is reloaded after
+        the commit and the sending threads never touch the session.
+        """
+        endpoints = [
+            (endpoint.id, endpoint.url, endpoint.secret, endpoint.max_concurrency)
+            for endpoint in WebhookEndpoint.query.filter_by(active=True)
+        ]
+        if endpoints:
+            # Start one endpoint further along each time so that free
+            # threads are shared out evenly.
+            offset = self._rotation % len(endpoints)
+            endpoints = endpoints[offset:] + endpoints[:offset]
+            self._rotation += 1
+        free = self.workers - len(self._in_flight)
+        claimed = []
+        lease_until = now + timedelta(seconds=self.timeout * 2 + 30)
+        for endpoint_id, url, secret, max_concurrency in endpoints:
+            slots = min(max(1, max_concurrency) - self._busy[endpoint_id], free)
+            if slots <= 0:
+                continue
+            due = db.session.execute(
+                select(WebhookDelivery.id)
+                .where(WebhookDelivery.endpoint_id == endpoint_id, WebhookDelivery.status == 'pending',
+                       WebhookDelivery.next_attempt_at <= now)
+                .order_by(WebhookDelivery.next_attempt_at, WebhookDelivery.id)
+                .limit(self.batch_size * slots)
+            ).scalars().all()
+            if not due:
+                continue
+            ids = db.session.execute(
+                update(WebhookDelivery)
+                .where(WebhookDelivery.id.in_(due), WebhookDelivery.status == 'pending',
+                       WebhookDelivery.next_attempt_at <= now)
+                .values(next_attempt_at=lease_until)
+                .returning(WebhookDelivery.id)
+            ).scalars().all()
+            if not ids:
+                continue
+            rows = db.session.execute(
+                select(WebhookDelivery.id, WebhookDelivery.attempts, OutboxEvent.id, OutboxEvent.event_type,
+                       OutboxEvent.created_at, OutboxEvent.payload)
+                .join(OutboxEvent, OutboxEvent.id == WebhookDelivery.event_id)
+                .where(WebhookDelivery.id.in_(ids))
+                .order_by(OutboxEvent.id)
+            ).all()
+            claimed.append(((endpoint_id, url, secret), rows))
+            free -= -(-len(rows) // self.batch_size)
+        db.session.commit()
+        return claimed
+
+    def _batches(self, claimed):
+        for endpoint, rows in claimed:
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                body = json.dumps({'events': [
+                    {'id': event_id, 'type': event_type, 'created_at': created_at.isoformat(),
+                     'data': json.loads(payload)}
+                    for _, _, event_id, event_type, created_at, payload in batch
+                ]}).encode()
+                yield endpoint, batch, body
+
+    def _backoff(self, attempts, retry_after):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        delay *= random.uniform(0.5, 1.0)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def _send_due(self):
+        """Claim due deliveries and start sending them; returns the batch count."""
+        claimed = self._claim(datetime.now(timezone.utc))
+        if self._executor is None and claimed:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix='webhook')
+        sent = 0
+        for endpoint, batch, body in self._batches(claimed):
+            _, url, secret = endpoint
+            future = self._executor.submit(self.send, url, secret, body, self.timeout)
+            self._in_flight[future] = (endpoint, batch)
+            self._busy[endpoint[0]] += 1
+            sent += 1
+        return sent
+
+    def _collect(self, timeout):
+        """Record the batches that finish within ``timeout``; returns (delivered, failed attempts).
+
+        Returns as soon as one batch is done. ``None`` waits for it however
+        long it takes.
+        """
+        if not self._in_flight:
+            return 0, 0
+        done, _ = wait(self._in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        delivered = failed = 0
+        finished = datetime.now(timezone.utc)
+        for future in done:
+            endpoint, batch = self._in_flight.pop(future)
+            self._busy[endpoint[0]] -= 1
+            try:
+                ok, error, retry_after = future.result()
+            except Exception as e:
+                ok, error, retry_after = False, str(e)[:500], None
+            if ok:
+                delivered += len(batch)
+                db.session.execute(
+                    update(WebhookDelivery)
+                    .where(WebhookDelivery.id.in_([row[0] for row in batch]))
+                    .values(status='delivered', delivered_at=finished, attempts=WebhookDelivery.attempts + 1,
+                            last_error=None)
+                )
+                continue
+            failed += len(batch)
+            logger.warning("Webhook delivery failed", extra={'endpoint_id': endpoint[0], 'error': error})
+            for delivery_id, attempts, *_ in batch:
+                attempts += 1
+                values = {'attempts': attempts, 'last_error': error}
+                if attempts >= self.max_attempts:
+                    values['status'] = 'failed'
+                else:
+                    values['next_attempt_at'] = finished + timedelta(seconds=self._backoff(attempts, retry_after))
+                db.session.execute(update(WebhookDelivery).where(WebhookDelivery.id == delivery_id).values(**values))
+        db.session.commit()
+        return delivered, failed
+
+    def deliver_due(self):
+        """Send every due delivery once and wait for the results; returns (delivered, failed)."""
+        self._send_due()
+        delivered = failed = 0
+        while self._in_flight:
+            batch_delivered, batch_failed = self._collect(None)
+            delivered += batch_delivered
+            failed += batch_failed
+        return delivered, failed
+
+    def run_once(self):
+        fanned_out = self.fan_out()
+        delivered, failed = self.deliver_due()
+        return {'events': fanned_out, 'delivered': delivered, 'failed': failed}
+
+    def run(self, poll_interval=1.0, should_stop=lambda: False):
+        """Dispatch until ``should_stop()``, claiming for each endpoint as its batches finish."""
+        try:
+            while not should_stop():
+                try:
+                    busy = self.fan_out() + self._send_due()
+                    if self._in_flight:
+                        # Wakes up as soon as any batch finishes, so its
+                        # endpoint's next batch goes out without waiting
+                        # for the slow ones.
+                        busy += sum(self._collect(0 if busy else poll_interval))
+                    elif not busy:
+                        time.sleep(poll_interval)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error("Webhook dispatch round failed", extra={'error': str(e)})
+                    time.sleep(poll_interval)
+        finally:
+            self.close()
+
+    def close(self):
+        """Record the batches still in flight and stop the sending threads."""
+        while self._in_flight:
+            self._collect(None)
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -1,4 +1,13 @@
-from app import app
+from app import create_app
+from logging_setup import configure_logging
+
+# Building the app is side-effect free (no database or filesystem access),
+# so gunicorn can preload it in the master and fork workers from it.
+# Run `flask --app wsgi init-db` once per deploy to create the schema.
+# Logging is process-wide, so it is set up here rather than per app; the
+# writer thread is restarted in each forked worker.
+configure_logging()
+app = create_app()
 
 if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    app.run()
@@ -0,0 +1,41 @@
+"""Cooperative (gevent) entry point for upload- and download-heavy deploys.
+
+The standard library is patched before the app is imported, so socket
+reads and writes, ``time.sleep``, locks and PostgreSQL connections yield
+to other greenlets instead of blocking the process. A client that
+trickles a video upload or reads a media file slowly then costs one
+greenlet, not one worker.
+
+Under gunicorn (preferred; the config patches in the master)::
+
+    GUNICORN_WORKER_CLASS=gevent gunicorn -c gunicorn.conf.py wsgi:app
+
+Standalone, on a single process::
+
+    python wsgi_gevent.py
+
+``PORT`` (10000) and ``GEVENT_MAX_CONNECTIONS`` (1000) configure the
+standalone server. Keep ``DB_POOL_SIZE`` small: greenlets queue for a
+pooled connection, and upload bodies are read before one is taken.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import os  # noqa: E402
+
+from gevent.pool import Pool  # noqa: E402
+from gevent.pywsgi import WSGIServer  # noqa: E402
+
+from wsgi import app  # noqa: E402
+
+
+def serve(host="0.0.0.0", port=None, max_connections=None):
+    port = int(port or os.getenv("PORT", 10000))
+    max_connections = int(max_connections or os.getenv("GEVENT_MAX_CONNECTIONS", 1000))
+    server = WSGIServer((host, port), app, spawn=Pool(max_connections), log=None)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve()